@@ -23,9 +23,9 @@ def add_multiple_questions():
         }
     ]
     
-    for i, q in enumerate(questions, 1):
-        question_id = db.add_financial_question(**q)
-        print(f"✅ Вопрос {i} добавлен с ID: {question_id}")
+    # Все вопросы добавляются одной транзакцией
+    result = db.bulk_import_questions(dict(q, question_type='choice') for q in questions)
+    print(f"✅ Добавлено вопросов: {result['inserted']}")
 
 if __name__ == "__main__":
     add_multiple_questions()
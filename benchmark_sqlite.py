@@ -0,0 +1,59 @@
+# benchmark_sqlite.py
+import argparse
+import os
+import tempfile
+import threading
+import time
+from modules.database import DatabaseManager
+
+def run_profile(directory, name, sqlite_profile, threads, questions):
+    """Каждый поток проходит свое интервью и сохраняет ответы на все вопросы"""
+    db = DatabaseManager(f"sqlite:///{os.path.join(directory, name)}.db", sqlite_profile=sqlite_profile)
+    db.create_tables()
+    db.bulk_import_questions([
+        {'text': f"Вопрос {number}", 'question_type': 'text', 'external_key': f"bench-{number}"}
+        for number in range(questions)
+    ])
+    question_ids = [question.id for question in db.get_active_questions().questions]
+    interviews = [db.start_interview(str(user_id), f"user{user_id}") for user_id in range(threads)]
+
+    errors = []
+
+    def answer_all(interview):
+        for question_id in question_ids:
+            try:
+                db.save_response(interview.id, question_id, "Ответ", selected_option='A')
+            except Exception as e:
+                errors.append(e)
+
+    workers = [threading.Thread(target=answer_all, args=(interview,)) for interview in interviews]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    saved = sum(db.get_interview_progress(interview.id)[0] for interview in interviews)
+    db.dispose()
+    return saved, len(errors), elapsed
+
+def benchmark_sqlite():
+    parser = argparse.ArgumentParser(description="Пропускная способность сохранения ответов на SQLite")
+    parser.add_argument('--threads', type=int, default=8, help="число параллельных потоков-обработчиков")
+    parser.add_argument('--questions', type=int, default=200, help="ответов на одно интервью")
+    args = parser.parse_args()
+
+    print(f"⏱ {args.threads} потоков × {args.questions} ответов")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for label, name, sqlite_profile in (("По умолчанию", 'default', False), ("Профиль WAL", 'wal', True)):
+            saved, errors, elapsed = run_profile(directory, name, sqlite_profile, args.threads, args.questions)
+            print(f"{label}: {saved / elapsed:.0f} ответов/с "
+                  f"(сохранено {saved}, ошибок {errors}, {elapsed:.2f} с)")
+
+    print("=" * 50)
+
+if __name__ == "__main__":
+    benchmark_sqlite()
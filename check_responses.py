@@ -5,7 +5,7 @@ def check_database_responses():
     print("🔍 Проверяем сохраненные ответы в базе данных...")
     
     db = DatabaseManager()
-    session = db.get_session()
+    session = db.get_read_session()
     
     # Проверяем количество записей в каждой таблице
     print("\n📊 Статистика базы данных:")
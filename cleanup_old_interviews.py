@@ -0,0 +1,28 @@
+# cleanup_old_interviews.py
+import argparse
+from modules.database import DatabaseManager
+
+def cleanup_old_interviews():
+    parser = argparse.ArgumentParser(description="Удаление старых завершенных интервью")
+    parser.add_argument('--days', type=int, default=30, help="удалять интервью, завершенные раньше N дней назад")
+    parser.add_argument('--batch-size', type=int, default=1000, help="интервью в одной транзакции")
+    parser.add_argument('--archive-dir', help="перед удалением выгрузить строки в сжатые NDJSON-файлы")
+    args = parser.parse_args()
+
+    def report(deleted, total):
+        print(f"🗑 Удалено {deleted}/{total}")
+
+    print(f"🧹 Очистка интервью старше {args.days} дней...")
+    db = DatabaseManager()
+    deleted = db.cleanup_old_interviews(
+        days_old=args.days,
+        batch_size=args.batch_size,
+        archive_dir=args.archive_dir,
+        progress_callback=report
+    )
+    print(f"✅ Удалено интервью: {deleted}")
+    if args.archive_dir:
+        print(f"📦 Архив сохранен в папке {args.archive_dir}/")
+
+if __name__ == "__main__":
+    cleanup_old_interviews()
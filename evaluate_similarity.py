@@ -0,0 +1,78 @@
+# evaluate_similarity.py
+import argparse
+from collections import defaultdict
+import numpy as np
+from modules.database import DatabaseManager, AIConsultation
+from modules.consultation_cache import normalize_query
+from modules.similarity_index import QueryIndex, answer_from_history
+
+
+def load_history(db):
+    """Успешные консультации по версиям вопросов в порядке сохранения: {(question_id, версия): [(запрос, ответ)]}"""
+    history = defaultdict(list)
+    with db.session_scope() as session:
+        rows = session.query(AIConsultation.question_id, AIConsultation.question_version,
+                             AIConsultation.user_query, AIConsultation.ai_response)\
+            .filter(AIConsultation.question_version.isnot(None))\
+            .order_by(AIConsultation.id).all()
+    for question_id, version, user_query, ai_response in rows:
+        answer = answer_from_history(ai_response)
+        if answer is not None:
+            history[(question_id, version)].append((user_query, answer))
+    return history
+
+
+def best_earlier_matches(consultations):
+    """Для каждой консультации - самый похожий более ранний запрос с другим текстом: [(близость, j)]"""
+    queries = [query for query, _ in consultations]
+    normalized = [normalize_query(query) for query in queries]
+    index = QueryIndex(queries)
+
+    matches = [(None, None)]
+    for i in range(1, len(queries)):
+        scores = index.scores(queries[i])[:i]
+        # Точные повторы обслуживает обычный кэш, здесь оцениваются только перефразировки
+        scores[[j for j in range(i) if normalized[j] == normalized[i]]] = -1
+        j = int(np.argmax(scores))
+        matches.append((float(scores[j]), j) if scores[j] >= 0 else (None, None))
+    return matches
+
+
+def evaluate_similarity():
+    parser = argparse.ArgumentParser(description="Оценка поиска похожих запросов на истории консультаций")
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.5, 0.6, 0.7, 0.8, 0.9],
+                        help="пороги близости запросов")
+    parser.add_argument('--answer-threshold', type=float, default=0.5,
+                        help="близость ответов, при которой выданный из кэша ответ считается верным")
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    history = load_history(db)
+    total = sum(len(consultations) for consultations in history.values())
+    print(f"📊 Консультаций в истории: {total}, версий вопросов: {len(history)}")
+    if not total:
+        return
+
+    # Кандидаты: консультация, самый похожий ранний запрос и близость ответов на них
+    candidates = []
+    for consultations in history.values():
+        answers = QueryIndex([answer for _, answer in consultations])
+        for i, (score, j) in enumerate(best_earlier_matches(consultations)):
+            if score is None:
+                continue
+            answer_score = float(answers.scores(consultations[i][1])[j])
+            candidates.append((score, answer_score >= args.answer_threshold))
+
+    print(f"\n{'Порог':>6} | {'Попаданий':>9} | {'Доля':>6} | {'Точность':>8}")
+    for threshold in sorted(args.thresholds):
+        hits = [correct for score, correct in candidates if score >= threshold]
+        hit_rate = len(hits) / total
+        precision = sum(hits) / len(hits) if hits else 0.0
+        print(f"{threshold:>6.2f} | {len(hits):>9} | {hit_rate:>6.1%} | {precision:>8.1%}")
+
+    print(f"\nТочность - доля попаданий, где ответ из кэша близок (≥ {args.answer_threshold}) "
+          f"к ответу, который GigaChat дал на самом деле")
+
+
+if __name__ == "__main__":
+    evaluate_similarity()
@@ -1,17 +1,28 @@
 # export_data.py
+import argparse
 import csv
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 import os
 from modules.database import DatabaseManager, Interview, Response, Question, AIConsultation
 
-def export_to_csv():
+def export_to_csv(days=None):
     print("📤 Экспорт данных в CSV файлы...")
     
     db = DatabaseManager()
-    session = db.get_session()
+    # Полные выборки идут на реплику (DATABASE_REPLICA_URLS), если она настроена и не отстает
+    session = db.get_read_session()
     moscow_tz = pytz.timezone('Europe/Moscow')
     
+    # Фильтр по времени позволяет PostgreSQL читать только нужные месячные секции
+    responses_query = session.query(Response)
+    consultations_query = session.query(AIConsultation)
+    if days:
+        since = datetime.utcnow() - timedelta(days=days)
+        responses_query = responses_query.filter(Response.timestamp >= since)
+        consultations_query = consultations_query.filter(AIConsultation.timestamp >= since)
+        print(f"📅 Ответы и консультации за последние {days} дн.")
+    
     def utc_to_moscow_str(utc_dt):
         if utc_dt and utc_dt.tzinfo is None:
             utc_dt = pytz.utc.localize(utc_dt)
@@ -49,7 +60,7 @@ def export_to_csv():
     print(f"✅ Интервью экспортированы в {output_dir}/interviews_{timestamp}.csv")
     
     # 2. ЭКСПОРТ ОТВЕТОВ
-    responses = session.query(Response).join(Question).all()
+    responses = responses_query.join(Question).all()
     with open(f'{output_dir}/responses_{timestamp}.csv', 'w', newline='', encoding='utf-8') as file:
         writer = csv.writer(file)
         writer.writerow(['Response_ID', 'Interview_ID', 'Question_ID', 'Question_Text', 'Question_Type', 
@@ -72,7 +83,7 @@ def export_to_csv():
     print(f"✅ Ответы экспортированы в {output_dir}/responses_{timestamp}.csv")
     
     # 3. ЭКСПОРТ КОНСУЛЬТАЦИЙ
-    consultations = session.query(AIConsultation).all()
+    consultations = consultations_query.all()
     with open(f'{output_dir}/consultations_{timestamp}.csv', 'w', newline='', encoding='utf-8') as file:
         writer = csv.writer(file)
         writer.writerow(['Consultation_ID', 'Interview_ID', 'Question_ID', 'User_Query', 
@@ -98,12 +109,12 @@ def export_to_csv():
         
         total_interviews = session.query(Interview).count()
         completed_interviews = session.query(Interview).filter(Interview.status == 'completed').count()
-        total_responses = session.query(Response).count()
-        total_consultations = session.query(AIConsultation).count()
+        total_responses = responses_query.count()
+        total_consultations = consultations_query.count()
         
         # Статистика по выборам
-        choice_a_count = session.query(Response).filter(Response.selected_option == 'A').count()
-        choice_b_count = session.query(Response).filter(Response.selected_option == 'B').count()
+        choice_a_count = responses_query.filter(Response.selected_option == 'A').count()
+        choice_b_count = responses_query.filter(Response.selected_option == 'B').count()
         
         writer.writerow(['Total_Interviews', total_interviews])
         writer.writerow(['Completed_Interviews', completed_interviews])
@@ -122,4 +133,6 @@ def export_to_csv():
     print(f"\n📊 Все файлы сохранены в папке {output_dir}/ с меткой времени: {timestamp}")
 
 if __name__ == "__main__":
-    export_to_csv()
+    parser = argparse.ArgumentParser(description="Экспорт собранных данных в CSV")
+    parser.add_argument('--days', type=int, help="выгрузить ответы и консультации только за последние N дней")
+    export_to_csv(parser.parse_args().days)
@@ -0,0 +1,60 @@
+# import_questions.py
+import argparse
+import csv
+import json
+import os
+from modules.database import DatabaseManager
+
+def read_json_lines(path):
+    """Построчно читает вопросы из JSON Lines (один объект на строку)"""
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def read_json_array(path):
+    """Читает вопросы из JSON-массива"""
+    with open(path, encoding='utf-8') as file:
+        yield from json.load(file)
+
+def read_csv(path):
+    """Построчно читает вопросы из CSV с заголовком (пустые ячейки - None)"""
+    with open(path, newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            yield {key: (value if value != '' else None) for key, value in row.items()}
+
+READERS = {
+    '.jsonl': read_json_lines,
+    '.ndjson': read_json_lines,
+    '.json': read_json_array,
+    '.csv': read_csv,
+}
+
+def import_questions():
+    parser = argparse.ArgumentParser(description="Массовый импорт вопросов из JSON Lines / JSON / CSV")
+    parser.add_argument('path', help="файл с вопросами")
+    parser.add_argument('--format', choices=sorted(ext.lstrip('.') for ext in READERS),
+                        help="формат файла (по умолчанию - по расширению)")
+    parser.add_argument('--batch-size', type=int, default=1000, help="размер пачки вставки")
+    parser.add_argument('--skip-invalid', action='store_true', help="пропускать некорректные строки")
+    args = parser.parse_args()
+
+    extension = f".{args.format}" if args.format else os.path.splitext(args.path)[1].lower()
+    reader = READERS.get(extension)
+    if not reader:
+        print(f"❌ Неизвестный формат файла: {extension}")
+        return
+
+    print(f"📥 Импорт вопросов из {args.path}...")
+    db = DatabaseManager()
+    result = db.bulk_import_questions(reader(args.path), batch_size=args.batch_size,
+                                      skip_invalid=args.skip_invalid)
+
+    print(f"✅ Добавлено: {result['inserted']}")
+    print(f"🔄 Обновлено: {result['updated']}")
+    if result['skipped']:
+        print(f"⚠️ Пропущено: {result['skipped']}")
+
+if __name__ == "__main__":
+    import_questions()
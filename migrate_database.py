@@ -0,0 +1,33 @@
+# migrate_database.py
+import argparse
+from modules.database import DatabaseManager
+from modules.migrations import MigrationRunner
+
+def migrate_database():
+    parser = argparse.ArgumentParser(description="Обновление схемы БД до актуальной версии")
+    parser.add_argument('--status', action='store_true', help="только показать версию и ожидающие миграции")
+    parser.add_argument('--target', type=int, help="версия, до которой нужно обновиться")
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    runner = MigrationRunner(db.engine, db.logger)
+
+    print(f"🗄 Текущая версия схемы: {runner.current_version()}")
+    pending = runner.pending(args.target)
+
+    if not pending:
+        print("✅ Схема актуальна")
+        return
+
+    print("📋 Ожидающие миграции:")
+    for m in pending:
+        print(f"   {m.version}: {m.description}")
+
+    if args.status:
+        return
+
+    applied = runner.upgrade(args.target)
+    print(f"🎉 Применено миграций: {len(applied)}, версия схемы: {runner.current_version()}")
+
+if __name__ == "__main__":
+    migrate_database()
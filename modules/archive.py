@@ -0,0 +1,52 @@
+# modules/archive.py
+from sqlalchemy import select
+from datetime import datetime, date
+import gzip
+import json
+import os
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+class InterviewArchiver:
+    """Потоковая выгрузка удаляемых интервью в сжатые NDJSON-файлы.
+
+    Для каждой таблицы создается отдельный файл <таблица>_<метка>.ndjson.gz,
+    строки пишутся по одной без загрузки всей выборки в память. Каждая пачка
+    записывается отдельным завершенным gzip-членом и сбрасывается на диск (fsync)
+    до того, как ее удаление фиксируется в БД: при падении процесса архив содержит
+    все удаленные строки и читается целиком.
+    """
+
+    def __init__(self, archive_dir, tables, stream_batch=500):
+        self.archive_dir = archive_dir
+        self.tables = tables
+        self.stream_batch = stream_batch
+        self.label = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        self.counts = {table.name: 0 for table in tables}
+        self.paths = {
+            table.name: os.path.join(archive_dir, f"{table.name}_{self.label}.ndjson.gz") for table in tables
+        }
+
+        os.makedirs(archive_dir, exist_ok=True)
+
+    def archive(self, session, interview_ids):
+        """Выгружает интервью из пачки и все их дочерние строки; по возвращении данные уже на диске"""
+        for table in self.tables:
+            key = table.c.id if table.name == 'interviews' else table.c.interview_id
+            result = session.execute(
+                select(table).where(key.in_(interview_ids)).order_by(table.c.id),
+                execution_options={'yield_per': self.stream_batch}
+            )
+            with open(self.paths[table.name], 'ab') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb') as output:
+                    for row in result.mappings():
+                        line = json.dumps(dict(row), ensure_ascii=False, default=_json_default) + '\n'
+                        output.write(line.encode('utf-8'))
+                        self.counts[table.name] += 1
+                raw.flush()
+                os.fsync(raw.fileno())
@@ -0,0 +1,405 @@
+# modules/async_database.py
+from sqlalchemy import select, delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+import asyncio
+import logging
+
+from modules.database import (
+    Base, Question, Interview, Response, AIConsultation,
+    build_financial_question, build_text_question, interview_counters_update, response_insert,
+    partitioned_response_guard, duplicate_response_error,
+    consultation_statements, question_prompt_version, response_counter_increments, interview_statistics,
+    resolve_database_url, pool_options, env_bool
+)
+from modules.question_catalog import get_question_catalog
+from modules.consultation_cache import get_consultation_cache
+from modules.sqlite_profile import is_file_sqlite, apply_sqlite_profile
+
+# Асинхронные драйверы для синхронных схем URL
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+def to_async_url(db_url):
+    """Переводит URL синхронного драйвера на asyncpg/aiosqlite"""
+    scheme, separator, rest = db_url.partition('://')
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{separator}{rest}"
+
+class AsyncDatabaseManager:
+    """Асинхронный аналог DatabaseManager на SQLAlchemy asyncio.
+
+    Методы повторяют интерфейс DatabaseManager, но являются корутинами. Каталог
+    вопросов общий с синхронным менеджером той же базы.
+    """
+
+    def __init__(self, db_url=None, pool_size=None, max_overflow=None, pool_pre_ping=None,
+                 pool_recycle=None, pool_timeout=None):
+        db_url = resolve_database_url(db_url)
+
+        self.db_url = db_url
+        self.async_url = to_async_url(db_url)
+        self.engine = create_async_engine(self.async_url, echo=False, **pool_options(
+            db_url, pool_size, max_overflow, pool_pre_ping, pool_recycle, pool_timeout
+        ))
+        if is_file_sqlite(db_url) and env_bool('DB_SQLITE_PROFILE', True):
+            apply_sqlite_profile(self.engine.sync_engine)
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        # Секционированные таблицы (см. DatabaseManager.setup_partitioning): повторные ответы проверяются явно
+        self.partitioning = env_bool('DB_PARTITIONING', False) and self.engine.dialect.name == 'postgresql'
+        self.question_catalog = get_question_catalog(db_url)
+
+        self.logger = logging.getLogger(__name__)
+        # Кэш ответов GigaChat; уровни в БД работают через синхронные сессии (вызываются через asyncio.to_thread)
+        self.consultation_cache = get_consultation_cache(db_url, logger=self.logger)
+
+    async def create_tables(self):
+        """Создает все таблицы в базе данных и применяет миграции схемы"""
+        try:
+            async with self.engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+            await self.migrate()
+            self.logger.info("✅ Таблицы созданы успешно")
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка создания таблиц: {e}")
+            raise
+
+    async def migrate(self, target_version=None):
+        """Обновляет схему БД (миграции выполняются через синхронный интерфейс соединения)"""
+        from modules.migrations import MigrationRunner
+
+        async with self.engine.connect() as connection:
+            applied = await connection.run_sync(
+                lambda sync_connection: MigrationRunner(sync_connection, self.logger).upgrade(target_version)
+            )
+            await connection.commit()
+            return applied
+
+    @asynccontextmanager
+    async def session_scope(self):
+        """Сессия на одну единицу работы: commit при успехе, rollback при ошибке, затем закрытие"""
+        async with self.session_factory() as session:
+            try:
+                yield session
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+    async def add_financial_question(self, text, market_context, option_a, option_b,
+                                     option_a_details, option_b_details, category="financial_choice"):
+        """Добавляет вопрос с выбором финансовых продуктов"""
+        question = build_financial_question(text, market_context, option_a, option_b,
+                                            option_a_details, option_b_details, category)
+        return await self._add_question(question, "Финансовый вопрос")
+
+    async def add_text_question(self, text, category="general", explanation=None):
+        """Добавляет обычный текстовый вопрос"""
+        return await self._add_question(build_text_question(text, category, explanation), "Текстовый вопрос")
+
+    async def _add_question(self, question, label):
+        try:
+            async with self.session_scope() as session:
+                session.add(question)
+                await session.flush()
+                question_id = question.id
+
+            self.question_catalog.invalidate()
+            self.logger.info(f"✅ {label} добавлен с ID: {question_id}")
+            return question_id
+
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка добавления вопроса: {e}")
+            raise
+
+    async def get_active_questions(self):
+        """Снимок каталога активных вопросов (загружается при первом обращении)"""
+        snapshot = self.question_catalog.snapshot()
+        if snapshot is not None:
+            return snapshot
+
+        generation = self.question_catalog.generation
+        async with self.session_scope() as session:
+            result = await session.execute(
+                select(Question).where(Question.is_active == True).order_by(Question.id)
+            )
+            questions = result.scalars().all()
+        return self.question_catalog.replace(questions, generation)
+
+    async def _get_answered_question_ids(self, interview_id):
+        """ID вопросов, на которые уже ответили в этом интервью"""
+        async with self.session_scope() as session:
+            result = await session.execute(
+                select(Response.question_id).where(Response.interview_id == interview_id)
+            )
+            return set(result.scalars().all())
+
+    async def get_question_progress(self, interview_id):
+        """Следующий вопрос и прогресс интервью за один запрос к БД: (question, answered, total)"""
+        try:
+            catalog = await self.get_active_questions()
+            answered_ids = await self._get_answered_question_ids(interview_id)
+            return catalog.next_question(answered_ids), len(answered_ids), catalog.total
+
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка получения прогресса интервью: {e}")
+            return None, 0, 0
+
+    async def get_next_question_for_interview(self, interview_id):
+        """Получает следующий неотвеченный вопрос для конкретного интервью"""
+        question, _, _ = await self.get_question_progress(interview_id)
+        return question
+
+    async def get_interview_progress(self, interview_id):
+        """Получает прогресс интервью"""
+        _, answered_questions, total_questions = await self.get_question_progress(interview_id)
+        return answered_questions, total_questions
+
+    async def save_consultation(self, interview_id, question_id, user_query, ai_response,
+                                consultation_type="product_advice"):
+        """Сохраняет консультацию с ИИ одной транзакцией и возвращает обновленные счетчики"""
+        if not user_query or not ai_response:
+            raise ValueError("Запрос пользователя и ответ ИИ не могут быть пустыми")
+
+        try:
+            version = question_prompt_version((await self.get_active_questions()).get(question_id))
+            insert_consultation, update_interview, update_response = consultation_statements(
+                interview_id, question_id, user_query, ai_response, consultation_type, version
+            )
+            async with self.session_scope() as session:
+                counters = {
+                    'consultation_id': (await session.execute(insert_consultation)).scalar_one(),
+                    'interview_consultations': (await session.execute(update_interview)).scalar(),
+                    'question_consultations': (await session.execute(update_response)).scalar()
+                }
+
+            self.logger.info(f"✅ Консультация сохранена с ID: {counters['consultation_id']}")
+            return counters
+
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка сохранения консультации: {e}")
+            raise
+
+    async def get_random_question(self, category=None, exclude_ids=None):
+        """Случайный активный вопрос (из категории, кроме exclude_ids) из каталога, без сортировки в БД"""
+        try:
+            return (await self.get_active_questions()).random_question(category or None, exclude_ids)
+
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка получения случайного вопроса: {e}")
+            return None
+
+    async def get_question_by_id(self, question_id):
+        """Получает вопрос по ID"""
+        try:
+            question = (await self.get_active_questions()).get(question_id)
+            if question:
+                return question
+
+            async with self.session_scope() as session:
+                return await session.get(Question, question_id)
+
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка получения вопроса по ID: {e}")
+            return None
+
+    async def get_interview_by_user_id(self, user_id, status='active'):
+        """Получает интервью пользователя по статусу"""
+        try:
+            async with self.session_scope() as session:
+                result = await session.execute(select(Interview).where(
+                    Interview.user_id == user_id,
+                    Interview.status == status
+                ).limit(1))
+                return result.scalars().first()
+
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка получения интервью пользователя: {e}")
+            return None
+
+    async def get_interview_statistics(self, interview_id):
+        """Получает подробную статистику интервью"""
+        try:
+            async with self.session_scope() as session:
+                interview = await session.get(Interview, interview_id)
+                if not interview:
+                    return None
+
+            return await self.build_interview_statistics(interview)
+
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка получения статистики интервью: {e}")
+            return None
+
+    async def build_interview_statistics(self, interview):
+        """Статистика интервью по его счетчикам и каталогу вопросов"""
+        return interview_statistics(interview, (await self.get_active_questions()).total)
+
+    async def deactivate_question(self, question_id):
+        """Деактивирует вопрос (помечает как неактивный)"""
+        try:
+            async with self.session_scope() as session:
+                question = await session.get(Question, question_id)
+
+                if not question:
+                    self.logger.warning(f"⚠️ Вопрос {question_id} не найден")
+                    return False
+
+                question.is_active = False
+
+            self.question_catalog.invalidate()
+            if self.consultation_cache and self.consultation_cache.blocking:
+                await asyncio.to_thread(self.consultation_cache.invalidate_question, question_id)
+            elif self.consultation_cache:
+                self.consultation_cache.invalidate_question(question_id)
+            self.logger.info(f"✅ Вопрос {question_id} деактивирован")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка деактивации вопроса: {e}")
+            return False
+
+    async def get_all_questions(self, active_only=True):
+        """Получает все вопросы"""
+        try:
+            async with self.session_scope() as session:
+                query = select(Question)
+                if active_only:
+                    query = query.where(Question.is_active == True)
+                result = await session.execute(query.order_by(Question.id))
+                return result.scalars().all()
+
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка получения всех вопросов: {e}")
+            return []
+
+    async def cleanup_old_interviews(self, days_old=30, batch_size=1000, archive_dir=None, progress_callback=None):
+        """Удаляет старые завершенные интервью пачками (как DatabaseManager.cleanup_old_interviews).
+
+        Каждая пачка из batch_size интервью удаляется отдельной короткой транзакцией;
+        ответы и консультации удаляет ON DELETE CASCADE. Архив пачки в archive_dir
+        пишется через синхронный интерфейс сессии до фиксации ее удаления.
+        progress_callback(deleted, total) вызывается после каждой пачки
+        """
+        deleted = 0
+        archiver = None
+        try:
+            cutoff_date = datetime.utcnow() - timedelta(days=days_old)
+            old_condition = (
+                Interview.status.in_(['completed', 'restarted']),
+                Interview.completed_at < cutoff_date
+            )
+
+            async with self.session_scope() as session:
+                total = await session.scalar(select(func.count(Interview.id)).where(*old_condition))
+
+            if archive_dir:
+                from modules.archive import InterviewArchiver
+                archiver = InterviewArchiver(archive_dir, [
+                    Interview.__table__, Response.__table__, AIConsultation.__table__
+                ])
+
+            last_id = 0
+            while True:
+                async with self.session_scope() as session:
+                    # Keyset-пагинация по ID: каждая пачка читает только свой диапазон
+                    result = await session.execute(select(Interview.id).where(
+                        *old_condition, Interview.id > last_id
+                    ).order_by(Interview.id).limit(batch_size))
+                    interview_ids = result.scalars().all()
+
+                    if not interview_ids:
+                        break
+
+                    if archiver:
+                        # Архив пачки сбрасывается на диск до фиксации ее удаления
+                        await session.run_sync(archiver.archive, interview_ids)
+
+                    if not self._cascade_deletes_supported():
+                        await session.execute(delete(Response).where(Response.interview_id.in_(interview_ids)))
+                        await session.execute(
+                            delete(AIConsultation).where(AIConsultation.interview_id.in_(interview_ids))
+                        )
+
+                    await session.execute(delete(Interview).where(Interview.id.in_(interview_ids)))
+
+                last_id = interview_ids[-1]
+                deleted += len(interview_ids)
+                self.logger.info(f"🗑 Удалено интервью: {deleted}/{total}")
+                if progress_callback:
+                    progress_callback(deleted, total)
+
+            if archiver:
+                self.logger.info(f"📦 Архив сохранен в {archive_dir}: {archiver.counts}")
+            self.logger.info(f"✅ Удалено {deleted} старых интервью")
+            return deleted
+
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка очистки старых интервью (удалено до ошибки: {deleted}): {e}")
+            return deleted
+
+    def _cascade_deletes_supported(self):
+        """Удаляет ли БД дочерние строки сама (см. DatabaseManager._cascade_deletes_supported)"""
+        return self.engine.dialect.name == 'postgresql'
+
+    # --- Операции обработчиков бота ---
+
+    async def start_interview(self, user_id, username):
+        """Переводит старые активные интервью пользователя в 'restarted' и создает новое"""
+        async with self.session_scope() as session:
+            result = await session.execute(select(Interview).where(
+                Interview.user_id == user_id,
+                Interview.status == 'active'
+            ))
+            for interview in result.scalars().all():
+                interview.status = 'restarted'
+                interview.completed_at = datetime.utcnow()
+
+            new_interview = Interview(
+                user_id=user_id,
+                username=username,
+                started_at=datetime.utcnow()
+            )
+            session.add(new_interview)
+            await session.flush()
+            return new_interview
+
+    async def save_response(self, interview_id, question_id, answer_text, selected_option=None):
+        """Сохраняет ответ на вопрос интервью (None, если ответ уже сохранен)"""
+        try:
+            async with self.session_scope() as session:
+                if self.partitioning:
+                    lock, duplicate = partitioned_response_guard(interview_id, question_id)
+                    await session.execute(lock)
+                    if (await session.execute(duplicate)).first():
+                        raise duplicate_response_error()
+
+                response = (await session.execute(
+                    response_insert(interview_id, question_id, answer_text, selected_option)
+                )).scalar_one()
+
+                await session.execute(interview_counters_update(
+                    interview_id, **response_counter_increments(selected_option)
+                ))
+                return response
+
+        except IntegrityError:
+            self.logger.warning(f"⚠️ Ответ на вопрос {question_id} в интервью {interview_id} уже сохранен")
+            return None
+
+    async def complete_interview(self, interview_id, completed_at=None):
+        """Помечает интервью завершенным и возвращает его вместе со счетчиками"""
+        async with self.session_scope() as session:
+            interview = await session.get(Interview, interview_id)
+            if interview:
+                interview.status = 'completed'
+                interview.completed_at = completed_at or datetime.utcnow()
+            return interview
+
+    async def dispose(self):
+        """Закрывает соединения пула"""
+        await self.engine.dispose()
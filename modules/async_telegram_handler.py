@@ -0,0 +1,313 @@
+# modules/async_telegram_handler.py
+from telebot.async_telebot import AsyncTeleBot
+import asyncio
+import os
+from datetime import datetime
+from dotenv import load_dotenv
+from modules.async_database import AsyncDatabaseManager
+from modules import bot_messages as texts
+from modules.state_store import create_state_store, TEXT_ANSWER, AI_CONSULTATION
+
+load_dotenv()
+
+class AsyncTelegramHandler:
+    """Асинхронный вариант TelegramHandler на AsyncTeleBot.
+
+    Команды и кнопки те же, но каждое обновление обрабатывается корутиной: ожидание
+    БД, Telegram и GigaChat не занимает поток, поэтому тысячи пользователей, ждущих
+    ответа ИИ, обслуживаются одним циклом событий.
+    """
+
+    def __init__(self, db=None, bot=None, giga_handler=None, states=None):
+        self.bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
+        if not self.bot_token and bot is None:
+            raise ValueError("TELEGRAM_BOT_TOKEN не найден в .env файле")
+
+        self.bot = bot or AsyncTeleBot(self.bot_token)
+        self.db = db or AsyncDatabaseManager()
+        self.giga_handler = giga_handler
+
+        # Состояния диалогов с TTL (общее хранилище с синхронным обработчиком)
+        self.states = states or create_state_store(self.db)
+
+        self.setup_handlers()
+
+    async def send_long_message(self, chat_id, text, parse_mode=None, reply_markup=None):
+        """Безопасная отправка длинных сообщений с разбивкой на части"""
+        parts = texts.split_long_message(text)
+        for i, part in enumerate(parts):
+            # Кнопки прикрепляются к последней части
+            markup = reply_markup if i == len(parts) - 1 else None
+            await self.bot.send_message(chat_id, part, parse_mode=parse_mode, reply_markup=markup)
+
+    async def state(self, method, *args):
+        """Вызов хранилища состояний; SQL-хранилище выполняется в потоке, не блокируя цикл событий"""
+        call = getattr(self.states, method)
+        if self.states.blocking:
+            return await asyncio.to_thread(call, *args)
+        return call(*args)
+
+    async def clear_waiting_states(self, user_id):
+        """Сбрасывает ожидание текстового ответа и вопроса для GigaChat"""
+        await self.state('clear', user_id)
+
+    def get_giga_handler(self):
+        """Общий для процесса клиент GigaChat (создается при первой консультации)"""
+        if self.giga_handler is None:
+            from modules.gigachat_handler import GigaChatHandler
+            self.giga_handler = GigaChatHandler.shared()
+        return self.giga_handler
+
+    async def get_gigachat_response(self, user_query, question_id):
+        """Получает ответ от GigaChat, не блокируя цикл событий"""
+        try:
+            question = await self.db.get_question_by_id(question_id)
+
+            if not question:
+                return texts.QUESTION_NOT_FOUND_TEXT
+
+            ai_response = await self.get_giga_handler().aget_financial_advice(
+                user_query, texts.question_context(question), cache=self.db.consultation_cache
+            )
+            return texts.consultation_text(ai_response)
+
+        except Exception as e:
+            print(f"❌ Ошибка получения ответа от GigaChat: {e}")
+            return texts.consultation_error_text(user_query)
+
+    def setup_handlers(self):
+        @self.bot.message_handler(commands=['start'])
+        async def start_interview(message):
+            user_id = str(message.from_user.id)
+            username = message.from_user.username or message.from_user.first_name
+
+            await self.clear_waiting_states(user_id)
+            # Завершаем все старые активные интервью пользователя и создаем новое
+            await self.db.start_interview(user_id, username)
+
+            await self.bot.send_message(message.chat.id, texts.welcome_text(username),
+                                        reply_markup=texts.start_markup(), parse_mode='Markdown')
+
+        @self.bot.callback_query_handler(func=lambda call: call.data == "get_question")
+        async def get_question_callback(call):
+            await self.send_next_question(call.message.chat.id, str(call.from_user.id))
+
+        @self.bot.callback_query_handler(func=lambda call: call.data.startswith('choose_'))
+        async def handle_choice(call):
+            user_id = str(call.from_user.id)
+            _, option, question_id = call.data.split('_')
+            question_id = int(question_id)
+
+            interview = await self.db.get_interview_by_user_id(user_id)
+            if not interview:
+                return
+
+            # Повторный ответ отсекается уникальным индексом (interview_id, question_id)
+            response = await self.db.save_response(
+                interview_id=interview.id,
+                question_id=question_id,
+                answer_text=f"Выбран продукт {option}",
+                selected_option=option
+            )
+            if not response:
+                await self.bot.send_message(call.message.chat.id, texts.ALREADY_ANSWERED_TEXT)
+                return
+
+            question = await self.db.get_question_by_id(question_id)
+            if question:
+                chosen_product = question.option_a if option == 'A' else question.option_b
+                await self.bot.send_message(call.message.chat.id, texts.choice_saved_text(chosen_product),
+                                            parse_mode='Markdown')
+
+            await self.send_next_question(call.message.chat.id, user_id)
+
+        @self.bot.callback_query_handler(func=lambda call: call.data.startswith('skip_'))
+        async def handle_skip(call):
+            user_id = str(call.from_user.id)
+            question_id = int(call.data.split('_')[1])
+
+            interview = await self.db.get_interview_by_user_id(user_id)
+            if not interview:
+                return
+
+            await self.clear_waiting_states(user_id)
+            await self.db.save_response(
+                interview_id=interview.id,
+                question_id=question_id,
+                answer_text=texts.SKIPPED_ANSWER
+            )
+
+            await self.bot.send_message(call.message.chat.id, texts.SKIPPED_TEXT)
+            await self.send_next_question(call.message.chat.id, user_id)
+
+        @self.bot.callback_query_handler(func=lambda call: call.data.startswith('consult_'))
+        async def handle_consultation_request(call):
+            question_id = int(call.data.split('_')[1])
+            await self.state('set', str(call.from_user.id), AI_CONSULTATION, question_id)
+
+            await self.bot.send_message(call.message.chat.id, texts.CONSULT_TEXT,
+                                        reply_markup=texts.cancel_consultation_markup(question_id),
+                                        parse_mode='Markdown')
+
+        @self.bot.callback_query_handler(func=lambda call: call.data.startswith('cancel_consult_'))
+        async def cancel_consultation(call):
+            await self.state('delete', str(call.from_user.id), AI_CONSULTATION)
+            await self.bot.send_message(call.message.chat.id, texts.CONSULTATION_CANCELLED_TEXT)
+
+        @self.bot.callback_query_handler(func=lambda call: call.data == "end_interview")
+        async def confirm_end_interview(call):
+            await self.bot.send_message(call.message.chat.id, texts.CONFIRM_END_TEXT,
+                                        reply_markup=texts.end_confirmation_markup(), parse_mode='Markdown')
+
+        @self.bot.callback_query_handler(func=lambda call: call.data == "confirm_end")
+        async def handle_confirm_end(call):
+            user_id = str(call.from_user.id)
+            await self.clear_waiting_states(user_id)
+
+            interview = await self.db.get_interview_by_user_id(user_id)
+            if not interview:
+                await self.bot.send_message(call.message.chat.id, texts.INTERVIEW_NOT_FOUND_TEXT)
+                return
+
+            completed_at = datetime.utcnow()
+            # Счетчики ответов и консультаций читаются из самой строки интервью
+            interview = await self.db.complete_interview(interview.id, completed_at)
+            stats = await self.db.build_interview_statistics(interview)
+
+            await self.bot.send_message(call.message.chat.id,
+                                        texts.interview_stats_text(interview, stats, completed_at),
+                                        parse_mode='Markdown')
+
+        @self.bot.callback_query_handler(func=lambda call: call.data == "cancel_end")
+        async def handle_cancel_end(call):
+            await self.bot.send_message(call.message.chat.id, texts.CANCEL_END_TEXT, parse_mode='Markdown')
+
+        @self.bot.message_handler(commands=['end'])
+        async def end_command(message):
+            user_id = str(message.from_user.id)
+            await self.clear_waiting_states(user_id)
+
+            if await self.db.get_interview_by_user_id(user_id):
+                await self.bot.send_message(message.chat.id, texts.END_COMMAND_TEXT,
+                                            reply_markup=texts.end_confirmation_markup("❌ Продолжить"),
+                                            parse_mode='Markdown')
+            else:
+                await self.bot.send_message(message.chat.id, texts.NO_INTERVIEW_TO_END_TEXT)
+
+        @self.bot.message_handler(commands=['status'])
+        async def status_command(message):
+            user_id = str(message.from_user.id)
+            interview = await self.db.get_interview_by_user_id(user_id)
+
+            if interview:
+                status_text = texts.status_text(
+                    interview,
+                    (await self.db.get_active_questions()).total,
+                    datetime.utcnow(),
+                    waiting_for_text=await self.state('get', user_id, TEXT_ANSWER) is not None,
+                    waiting_for_consultation=await self.state('get', user_id, AI_CONSULTATION) is not None
+                )
+            else:
+                status_text = texts.NO_ACTIVE_STATUS_TEXT
+            await self.bot.send_message(message.chat.id, status_text, parse_mode='Markdown')
+
+        @self.bot.message_handler(commands=['help'])
+        async def help_command(message):
+            await self.bot.send_message(message.chat.id, texts.HELP_TEXT, parse_mode='Markdown')
+
+        # Текстовые сообщения: ответы на вопросы и консультации с GigaChat
+        @self.bot.message_handler(func=lambda message: True)
+        async def handle_text_message(message):
+            user_id = str(message.from_user.id)
+
+            question_id = await self.state('pop', user_id, TEXT_ANSWER)
+            consultation_question_id = None
+            if question_id is None:
+                # Вопрос к GigaChat забирается сразу: сообщения во время генерации новых консультаций не создают
+                consultation_question_id = await self.state('pop', user_id, AI_CONSULTATION)
+
+            if question_id is not None:
+                interview = await self.db.get_interview_by_user_id(user_id)
+                if not interview:
+                    await self.bot.send_message(message.chat.id, texts.NO_ACTIVE_INTERVIEW_TEXT)
+                    return
+
+                # None - на этот вопрос уже отвечали
+                response = await self.db.save_response(
+                    interview_id=interview.id,
+                    question_id=question_id,
+                    answer_text=message.text
+                )
+                if not response:
+                    await self.bot.send_message(message.chat.id, texts.ALREADY_ANSWERED_TEXT)
+                    return
+
+                await self.bot.send_message(message.chat.id, texts.text_saved_text(message.text),
+                                            parse_mode='Markdown')
+                await self.send_next_question(message.chat.id, user_id)
+
+            elif consultation_question_id is not None:
+                interview = await self.db.get_interview_by_user_id(user_id)
+                if interview:
+                    await self.handle_consultation(message.chat.id, user_id, interview,
+                                                   consultation_question_id, message.text)
+                else:
+                    await self.bot.send_message(message.chat.id, texts.NO_ACTIVE_INTERVIEW_TEXT)
+
+            else:
+                await self.bot.send_message(message.chat.id, texts.UNKNOWN_MESSAGE_TEXT)
+
+    async def handle_consultation(self, chat_id, user_id, interview, question_id, user_query):
+        """Запрашивает GigaChat, сохраняет консультацию и отправляет ответ"""
+        processing_msg = await self.bot.send_message(chat_id, texts.PROCESSING_TEXT)
+        ai_response = await self.get_gigachat_response(user_query, question_id)
+
+        try:
+            await self.db.save_consultation(
+                interview_id=interview.id,
+                question_id=question_id,
+                user_query=user_query,
+                ai_response=ai_response,
+                consultation_type="gigachat_advice"
+            )
+            saved = True
+        except Exception as e:
+            print(f"❌ Ошибка сохранения консультации: {e}")
+            saved = False
+
+        try:
+            await self.bot.delete_message(chat_id, processing_msg.message_id)
+        except Exception:
+            pass  # Игнорируем ошибки удаления сообщения
+
+        if saved:
+            await self.send_long_message(chat_id, ai_response, parse_mode='Markdown')
+            await self.bot.send_message(chat_id, texts.AFTER_CONSULTATION_TEXT,
+                                        reply_markup=texts.after_consultation_markup(question_id))
+        else:
+            await self.send_long_message(chat_id, f"{ai_response}\n\n{texts.CONSULTATION_SAVE_ERROR_TEXT}")
+
+    async def send_next_question(self, chat_id, user_id):
+        interview = await self.db.get_interview_by_user_id(user_id)
+        if not interview:
+            await self.bot.send_message(chat_id, texts.NO_ACTIVE_INTERVIEW_TEXT)
+            return
+
+        question, answered, total = await self.db.get_question_progress(interview.id)
+
+        if question:
+            question_text, markup = texts.question_message(question, answered, total)
+            if question.question_type == 'text':
+                # Ожидаем текстовый ответ следующим сообщением
+                await self.state('set', user_id, TEXT_ANSWER, question.id)
+        else:
+            # Все вопросы пройдены
+            question_text, markup = texts.all_answered_message(answered, total)
+        await self.bot.send_message(chat_id, question_text, reply_markup=markup, parse_mode='Markdown')
+
+    async def start_polling(self):
+        print("🤖 Telegram бот с GigaChat запущен (asyncio)!")
+        try:
+            await self.bot.infinity_polling(timeout=10, request_timeout=15)
+        finally:
+            await self.db.dispose()
@@ -0,0 +1,351 @@
+# modules/bot_messages.py
+from telebot import types
+import pytz
+
+# Тексты и клавиатуры бота, общие для синхронного и асинхронного обработчиков
+
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+MAX_MESSAGE_LENGTH = 4000  # Оставляем запас для форматирования
+
+NO_ACTIVE_INTERVIEW_TEXT = "❌ Активное интервью не найдено. Используйте /start"
+ALREADY_ANSWERED_TEXT = "⚠️ Вы уже отвечали на этот вопрос!"
+SKIPPED_TEXT = "⏭ Вопрос пропущен."
+SKIPPED_ANSWER = "[Вопрос пропущен]"
+CONSULTATION_CANCELLED_TEXT = "❌ Консультация отменена. Выберите один из продуктов или задайте вопрос заново."
+PROCESSING_TEXT = "🤔 Обращаюсь к GigaChat, это может занять несколько секунд..."
+LLM_BUSY_TEXT = "⏳ Сейчас к GigaChat очень много вопросов. Пожалуйста, задайте вопрос еще раз через минуту."
+AFTER_CONSULTATION_TEXT = "Теперь выберите один из продуктов или задайте еще один вопрос:"
+CONSULTATION_SAVE_ERROR_TEXT = "❌ Ошибка сохранения консультации в базу данных."
+INCOMPLETE_ANSWER_TEXT = "⚠️ Ответ прервался: GigaChat не договорил. Задайте вопрос еще раз, чтобы получить полный ответ."
+QUESTION_NOT_FOUND_TEXT = "❌ Не удалось найти информацию о вопросе для консультации."
+UNKNOWN_MESSAGE_TEXT = "🤔 Я не понимаю это сообщение. Используйте /help для справки или /start для начала интервью."
+CONFIRM_END_TEXT = "🤔 **Подтверждение завершения**\n\nВы уверены, что хотите завершить интервью?"
+END_COMMAND_TEXT = "🤔 **Завершение интервью**\n\nВы уверены, что хотите завершить текущее интервью?"
+NO_INTERVIEW_TO_END_TEXT = (
+    "❌ У вас нет активного интервью для завершения.\n\nДля начала нового интервью используйте /start"
+)
+INTERVIEW_NOT_FOUND_TEXT = "❌ Активное интервью не найдено."
+CANCEL_END_TEXT = "👍 **Хорошо!**\n\nВы можете продолжить интервью позже или начать новое с помощью /start"
+
+CONSULT_TEXT = """
+💡 **Консультация с GigaChat**
+
+Задайте свой вопрос о финансовых продуктах, и реальный ИИ GigaChat поможет вам разобраться!
+
+**Примеры вопросов:**
+• "Какой продукт безопаснее?"
+• "Что лучше при высокой инфляции?"
+• "Объясни разницу между продуктами"
+• "Какая доходность более выгодна?"
+• "Как защититься от рисков?"
+• "Рассчитай реальную доходность"
+
+📝 **Напишите ваш вопрос следующим сообщением.**
+            """
+
+NO_ACTIVE_STATUS_TEXT = """
+📊 **Статус интервью:**
+
+🔴 **Нет активного интервью**
+
+Для начала нового интервью используйте /start
+                """
+
+HELP_TEXT = """
+🆘 **Справка по боту-интервьюеру**
+
+**Доступные команды:**
+/start - начать новое интервью
+/end - завершить текущее интервью
+/status - показать прогресс интервью
+/help - показать эту справку
+
+**Как проходит интервью:**
+• Вопросы показываются по порядку
+• Вопросы с выбором: выберите продукт А или Б
+• Текстовые вопросы: напишите ваш ответ текстом
+• 💡 **Консультации с GigaChat:** нажмите кнопку и задайте вопрос
+• Можете пропустить текстовые вопросы
+• Ваши ответы автоматически сохраняются
+
+**Консультации с GigaChat:**
+• Доступны для любого вопроса с выбором
+• Задавайте конкретные вопросы о продуктах
+• GigaChat учитывает рыночный контекст
+• Все консультации сохраняются для анализа
+
+**Завершение интервью:**
+• Команда /end в любой момент
+• Кнопка "Завершить интервью" когда вопросы закончатся
+• Подтверждение перед завершением
+• Подробная статистика включая консультации
+
+**Особенности:**
+• Нельзя ответить на один вопрос дважды
+• Можно начать новое интервью в любой момент
+• Все время отображается по московскому часовому поясу
+• Все данные используются только для исследования
+            """
+
+
+def utc_to_moscow(utc_datetime):
+    if utc_datetime is None:
+        return None
+    if utc_datetime.tzinfo is None:
+        utc_datetime = pytz.utc.localize(utc_datetime)
+    return utc_datetime.astimezone(MOSCOW_TZ)
+
+
+def format_duration(start_time, end_time):
+    duration = end_time - start_time
+    total_seconds = int(duration.total_seconds())
+    if total_seconds < 0:
+        return "0 мин 0 сек"
+    minutes = total_seconds // 60
+    seconds = total_seconds % 60
+    return f"{minutes} мин {seconds} сек"
+
+
+def split_long_message(text, max_length=MAX_MESSAGE_LENGTH):
+    """Разбивает длинный текст на части по абзацам; части после первой помечаются как продолжение"""
+    if len(text) <= max_length:
+        return [text]
+
+    parts = []
+    current_part = ""
+
+    # Разбиваем по абзацам
+    for paragraph in text.split('\n\n'):
+        if len(current_part + paragraph) <= max_length:
+            current_part += paragraph + '\n\n'
+        else:
+            if current_part:
+                parts.append(current_part.strip())
+                current_part = paragraph + '\n\n'
+            else:
+                # Если даже один абзац слишком длинный
+                while len(paragraph) > max_length:
+                    parts.append(paragraph[:max_length])
+                    paragraph = paragraph[max_length:]
+                current_part = paragraph + '\n\n'
+
+    if current_part:
+        parts.append(current_part.strip())
+
+    return [parts[0]] + [f"**Продолжение:**\n\n{part}" for part in parts[1:]]
+
+
+def welcome_text(username):
+    return f"""
+🎤 **Добро пожаловать в финансовое интервью!**
+
+Привет, {username}! Я буду задавать вам вопросы о выборе финансовых продуктов в различных рыночных условиях.
+
+**Как это работает:**
+• Вопросы идут по порядку
+• Вопросы с выбором: выберите продукт А или Б
+• Текстовые вопросы: напишите ваш ответ
+• 💡 **Можете консультироваться с реальным GigaChat по любому вопросу**
+• Ваши ответы сохраняются для исследования
+
+**Команды:**
+/start - начать/перезапустить интервью
+/end - завершить интервью
+/status - показать прогресс
+/help - справка
+
+Готовы начать?
+            """
+
+
+def start_markup():
+    markup = types.InlineKeyboardMarkup()
+    markup.add(types.InlineKeyboardButton("📝 Начать интервью", callback_data="get_question"))
+    return markup
+
+
+def choice_saved_text(chosen_product):
+    return f"✅ **Ваш выбор сохранен!**\n\nВы выбрали: **{chosen_product}**"
+
+
+def text_saved_text(answer):
+    return f"✅ **Ваш ответ сохранен!**\n\nОтвет: _{answer}_"
+
+
+def choice_markup(question_id, consult_label="💡 Консультация с GigaChat"):
+    markup = types.InlineKeyboardMarkup()
+    markup.row(
+        types.InlineKeyboardButton("🅰️ Выбрать А", callback_data=f"choose_A_{question_id}"),
+        types.InlineKeyboardButton("🅱️ Выбрать Б", callback_data=f"choose_B_{question_id}")
+    )
+    markup.add(types.InlineKeyboardButton(consult_label, callback_data=f"consult_{question_id}"))
+    return markup
+
+
+def after_consultation_markup(question_id):
+    return choice_markup(question_id, "💡 Еще вопрос к GigaChat")
+
+
+def cancel_consultation_markup(question_id):
+    markup = types.InlineKeyboardMarkup()
+    markup.add(types.InlineKeyboardButton("❌ Отмена консультации", callback_data=f"cancel_consult_{question_id}"))
+    return markup
+
+
+def end_confirmation_markup(continue_label="❌ Продолжить позже"):
+    markup = types.InlineKeyboardMarkup()
+    markup.row(
+        types.InlineKeyboardButton("✅ Да, завершить", callback_data="confirm_end"),
+        types.InlineKeyboardButton(continue_label, callback_data="cancel_end")
+    )
+    return markup
+
+
+def queue_position_text(position):
+    return f"⏳ Ваш вопрос в очереди к GigaChat, позиция {position}. Ответ придет автоматически."
+
+
+def consultation_text(ai_response):
+    return f"💡 **Консультация GigaChat:**\n\n{ai_response}"
+
+
+def consultation_error_text(user_query):
+    return f"""
+❌ **Ошибка консультации**
+
+К сожалению, сейчас не удается получить ответ от ИИ-консультанта.
+
+Ваш вопрос: "{user_query}"
+
+**Общие рекомендации:**
+• При выборе финансовых продуктов учитывайте свои цели и отношение к риску
+• Сравнивайте реальную доходность (номинальная доходность - инфляция)
+• Диверсифицируйте инвестиции между разными типами активов
+
+Попробуйте задать вопрос позже.
+"""
+
+
+def question_context(question):
+    """Контекст вопроса для промпта GigaChat"""
+    return {
+        'question_id': question.id,
+        'question_text': question.text,
+        'market_context': question.market_context,
+        'option_a': question.option_a,
+        'option_a_details': question.option_a_details,
+        'option_b': question.option_b,
+        'option_b_details': question.option_b_details
+    }
+
+
+def question_message(question, answered, total):
+    """Текст и клавиатура очередного вопроса"""
+    progress_text = f"📊 Прогресс: {answered}/{total} вопросов"
+
+    if question.question_type == 'choice':
+        # Финансовый вопрос с выбором
+        question_text = f"""
+{progress_text}
+
+❓ **Вопрос {answered + 1}:**
+{question.text}
+
+📊 **Рыночная ситуация:**
+{question.market_context}
+
+**Варианты для выбора:**
+
+🅰️ **Продукт А:** {question.option_a}
+_{question.option_a_details}_
+
+🅱️ **Продукт Б:** {question.option_b}
+_{question.option_b_details}_
+                """
+        return question_text, choice_markup(question.id)
+
+    # Текстовый вопрос
+    question_text = f"""
+{progress_text}
+
+❓ **Вопрос {answered + 1}:**
+{question.text}
+
+📝 **Напишите ваш ответ следующим сообщением.**
+                """
+    markup = types.InlineKeyboardMarkup()
+    markup.add(types.InlineKeyboardButton("⏭ Пропустить вопрос", callback_data=f"skip_{question.id}"))
+    return question_text, markup
+
+
+def all_answered_message(answered, total):
+    """Текст и клавиатура после последнего вопроса"""
+    end_text = f"""
+🎉 **Поздравляем!**
+
+Вы ответили на все {total} вопросов в нашем финансовом интервью!
+
+📊 **Ваш результат: {answered}/{total}**
+
+Теперь вы можете завершить интервью и посмотреть подробную статистику ваших финансовых решений и консультаций с GigaChat.
+            """
+    markup = types.InlineKeyboardMarkup()
+    markup.add(types.InlineKeyboardButton("✅ Завершить интервью", callback_data="end_interview"))
+    return end_text, markup
+
+
+def status_text(interview, total, now, waiting_for_text=False, waiting_for_consultation=False):
+    started_msk = utc_to_moscow(interview.started_at)
+    duration_str = format_duration(interview.started_at, now)
+
+    # Состояния ожидания
+    waiting_status = ""
+    if waiting_for_text:
+        waiting_status += "\n⏳ Ожидается ответ на текстовый вопрос"
+    if waiting_for_consultation:
+        waiting_status += "\n💡 Ожидается вопрос для GigaChat"
+
+    return f"""
+📊 **Статус интервью:**
+
+🟢 **Интервью активно**
+📝 Прогресс: {interview.answered_count}/{total} вопросов
+💡 Консультаций с GigaChat: {interview.consultations_count}
+⏱ Длительность: {duration_str}
+🆔 ID интервью: {interview.id}
+📅 Начато: {started_msk.strftime('%d.%m.%Y %H:%M:%S')} (МСК){waiting_status}
+
+Для завершения используйте /end
+                """
+
+
+def interview_stats_text(interview, stats, completed_at):
+    started_msk = utc_to_moscow(interview.started_at)
+    completed_msk = utc_to_moscow(completed_at)
+    duration_str = format_duration(interview.started_at, completed_at)
+
+    return f"""
+🎉 **Интервью успешно завершено!**
+
+📊 **Ваша статистика:**
+
+📝 **Ответы:**
+• Отвечено на вопросов: {stats['responses_count']} из {stats['total_questions']}
+• Выбрано продуктов А: {stats['choice_a_count']}
+• Выбрано продуктов Б: {stats['choice_b_count']}
+
+💡 **Консультации с GigaChat:**
+• Всего консультаций: {stats['consultations_count']}
+
+⏱ **Время (МСК):**
+• Длительность: {duration_str}
+• Начато: {started_msk.strftime('%d.%m.%Y %H:%M:%S')}
+• Завершено: {completed_msk.strftime('%d.%m.%Y %H:%M:%S')}
+
+🙏 **Спасибо за участие в исследовании!**
+
+Ваши ответы и взаимодействие с GigaChat помогут нам лучше понять, как люди принимают финансовые решения.
+
+---
+Для начала нового интервью используйте /start
+                """
@@ -0,0 +1,371 @@
+# modules/call_policy.py
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import asyncio
+import logging
+import math
+import queue
+import threading
+import time
+
+# Меньше успешных вызовов в окне - p95 ненадежен, и дублирующие запросы не отправляются
+HEDGE_MIN_SAMPLES = 20
+
+
+class CircuitOpenError(Exception):
+    """Предохранитель разомкнут: вызов не выполнялся"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Вызов не уложился в отведенное время"""
+
+
+class LatencyWindow:
+    """Длительности последних успешных вызовов и их перцентили"""
+
+    def __init__(self, size=200):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=size)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._samples)
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent):
+        """Перцентиль по ближайшему рангу; None, если вызовов еще не было"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[max(math.ceil(percent / 100 * len(samples)) - 1, 0)]
+
+    def summary(self):
+        return {
+            'samples': len(self),
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+class CircuitBreaker:
+    """Предохранитель: после failure_threshold ошибок или медленных вызовов подряд размыкается.
+
+    В разомкнутом состоянии вызовы сразу отклоняются (вызывающий отдает резервный ответ).
+    Через reset_timeout секунд пропускается один пробный вызов: успех замыкает
+    предохранитель, ошибка снова размыкает его на reset_timeout.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, slow_call_threshold=None, reset_timeout=30.0,
+                 clock=time.monotonic, logger=None):
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def allow(self):
+        """Можно ли выполнять вызов; в полуоткрытом состоянии - только один пробный"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, duration):
+        if self.slow_call_threshold and duration >= self.slow_call_threshold:
+            self.logger.warning(f"⚠️ Медленный ответ GigaChat: {duration:.1f} с")
+            return self.record_failure()
+        with self._lock:
+            self.failures = 0
+            if self._current_state() == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._probing = False
+                self.logger.info("✅ Предохранитель GigaChat замкнут: пробный вызов успешен")
+
+    def release(self):
+        """Вызов прерван вызывающим без результата: не успех и не ошибка, пробный вызов можно повторить"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or (state == self.CLOSED and self.failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = self.clock()
+                self._probing = False
+                self.trips += 1
+                self.logger.warning(
+                    f"⚠️ Предохранитель GigaChat разомкнут после {self.failures} неудачных вызовов, "
+                    f"проверка через {self.reset_timeout:.0f} с"
+                )
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'failures': self.failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+            }
+
+
+class CallPolicy:
+    """Срок, предохранитель и дублирующие запросы для вызовов внешнего сервиса.
+
+    Каждый вызов ограничен deadline секундами (синхронные вызовы выполняются в пуле
+    потоков и дожидаются результата с таймаутом). С hedge=True, если ответа нет дольше
+    p95 последних успешных вызовов или первая попытка завершилась ошибкой, отправляется
+    одна дублирующая попытка; используется первый успешный ответ.
+    """
+
+    def __init__(self, deadline=30.0, breaker=None, hedge=False, hedge_percentile=95,
+                 latency=None, max_workers=8, metrics_interval=0, logger=None):
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker(logger=logger)
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.latency = latency or LatencyWindow()
+        self.metrics_interval = metrics_interval
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-call')
+        self._lock = threading.Lock()
+        self._metrics_logged = time.monotonic()
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self):
+        """Через сколько секунд без ответа отправлять дублирующую попытку; None - не отправлять"""
+        if not self.hedge or len(self.latency) < HEDGE_MIN_SAMPLES:
+            return None
+        delay = self.latency.percentile(self.hedge_percentile)
+        return delay if delay < self.deadline else None
+
+    def _start(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError("GigaChat временно отключен предохранителем")
+        with self._lock:
+            self.calls += 1
+        return time.monotonic()
+
+    def _succeeded(self, started, hedge_won=False, finished=None):
+        duration = (finished or time.monotonic()) - started
+        self.latency.record(duration)
+        self.breaker.record_success(duration)
+        with self._lock:
+            self.hedge_wins += int(hedge_won)
+        self.maybe_log_metrics()
+
+    def _failed(self, error):
+        self.breaker.record_failure()
+        with self._lock:
+            if isinstance(error, DeadlineExceeded):
+                self.timeouts += 1
+            else:
+                self.errors += 1
+        self.maybe_log_metrics()
+
+    def _hedged(self):
+        with self._lock:
+            self.hedges += 1
+        self.logger.info("🔁 GigaChat отвечает дольше обычного - отправлен дублирующий запрос")
+
+    def call(self, func):
+        """Выполняет func() с ограничением по времени; CircuitOpenError, DeadlineExceeded или ошибка func"""
+        started = self._start()
+        try:
+            result, hedge_won = self._run(func, started)
+        except Exception as e:
+            self._failed(e)
+            raise
+        self._succeeded(started, hedge_won)
+        return result
+
+    def _run(self, func, started):
+        deadline_at = started + self.deadline
+        hedge_delay = self.hedge_delay()
+        attempts = [self._executor.submit(func)]
+        pending = set(attempts)
+        error = None
+
+        while True:
+            now = time.monotonic()
+            can_hedge = hedge_delay is not None and len(attempts) == 1
+            if can_hedge and (not pending or now >= started + hedge_delay):
+                self._hedged()
+                attempts.append(self._executor.submit(func))
+                pending.add(attempts[-1])
+                continue
+            if not pending:
+                raise error
+            if now >= deadline_at:
+                for attempt in pending:
+                    attempt.cancel()
+                raise DeadlineExceeded(f"Нет ответа за {self.deadline:.0f} с")
+
+            wake_at = min(deadline_at, started + hedge_delay) if can_hedge else deadline_at
+            done, pending = wait(pending, timeout=wake_at - now, return_when=FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return attempt.result(), attempt is not attempts[0]
+                error = attempt.exception()
+
+    def stream(self, func):
+        """Генератор частей func(); deadline ограничивает ожидание первой части и паузы между частями.
+
+        Длинный ответ, который продолжает приходить, не обрывается. Дублирующие запросы
+        для потока не отправляются.
+        """
+        started = self._start()
+        chunks = queue.Queue()
+        cancelled = threading.Event()
+
+        def produce():
+            try:
+                for chunk in func():
+                    if cancelled.is_set():
+                        return
+                    chunks.put((chunk, None))
+                chunks.put((None, None))
+            except Exception as e:
+                chunks.put((None, e))
+
+        self._executor.submit(produce)
+        first_chunk_at = None
+        try:
+            while True:
+                try:
+                    chunk, error = chunks.get(timeout=self.deadline)
+                except queue.Empty:
+                    raise DeadlineExceeded(f"Нет продолжения ответа за {self.deadline:.0f} с")
+                if error is not None:
+                    raise error
+                if chunk is None:
+                    break
+                first_chunk_at = first_chunk_at or time.monotonic()
+                yield chunk
+        except GeneratorExit:
+            # Вызывающий перестал читать ответ - о состоянии сервиса это ничего не говорит
+            cancelled.set()
+            self.breaker.release()
+            raise
+        except Exception as e:
+            cancelled.set()
+            self._failed(e)
+            raise
+        # Задержка потока - время до первой части: длина ответа не делает вызов медленным
+        self._succeeded(started, finished=first_chunk_at)
+
+    async def acall(self, coro_func):
+        """Асинхронный вариант call: coro_func() создает корутину запроса"""
+        started = self._start()
+        try:
+            result, hedge_won = await self._arun(coro_func, started)
+        except Exception as e:
+            self._failed(e)
+            raise
+        self._succeeded(started, hedge_won)
+        return result
+
+    async def _arun(self, coro_func, started):
+        deadline_at = started + self.deadline
+        hedge_delay = self.hedge_delay()
+        attempts = [asyncio.ensure_future(coro_func())]
+        pending = set(attempts)
+        error = None
+
+        try:
+            while True:
+                now = time.monotonic()
+                can_hedge = hedge_delay is not None and len(attempts) == 1
+                if can_hedge and (not pending or now >= started + hedge_delay):
+                    self._hedged()
+                    attempts.append(asyncio.ensure_future(coro_func()))
+                    pending.add(attempts[-1])
+                    continue
+                if not pending:
+                    raise error
+                if now >= deadline_at:
+                    raise DeadlineExceeded(f"Нет ответа за {self.deadline:.0f} с")
+
+                wake_at = min(deadline_at, started + hedge_delay) if can_hedge else deadline_at
+                done, pending = await asyncio.wait(pending, timeout=wake_at - now, return_when=FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        return attempt.result(), attempt is not attempts[0]
+                    error = attempt.exception()
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    def metrics(self):
+        with self._lock:
+            counters = {
+                'calls': self.calls,
+                'timeouts': self.timeouts,
+                'errors': self.errors,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+            }
+        return {'breaker': self.breaker.metrics(), 'latency': self.latency.summary(), **counters}
+
+    def maybe_log_metrics(self):
+        if not self.metrics_interval:
+            return
+        with self._lock:
+            if time.monotonic() - self._metrics_logged < self.metrics_interval:
+                return
+            self._metrics_logged = time.monotonic()
+        self.log_metrics()
+
+    def log_metrics(self):
+        metrics = self.metrics()
+        latency = metrics['latency']
+        percentiles = ' '.join(
+            f"{name} {latency[name]:.1f} с" for name in ('p50', 'p95', 'p99') if latency[name] is not None
+        )
+        self.logger.info(
+            f"📊 GigaChat: предохранитель {metrics['breaker']['state']} "
+            f"(срабатываний {metrics['breaker']['trips']}, отклонено {metrics['breaker']['rejected']}), "
+            f"вызовов {metrics['calls']}, таймаутов {metrics['timeouts']}, ошибок {metrics['errors']}, "
+            f"дублей {metrics['hedges']} (быстрее {metrics['hedge_wins']}); {percentiles or 'задержек нет'}"
+        )
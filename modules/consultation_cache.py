@@ -0,0 +1,248 @@
+# modules/consultation_cache.py
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+# Поля вопроса, от которых зависит промпт консультации
+PROMPT_FIELDS = ('question_text', 'market_context', 'option_a', 'option_a_details', 'option_b', 'option_b_details')
+
+_PUNCTUATION = re.compile(r'[^\w\s]+')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_query(user_query):
+    """Запрос без регистра, пунктуации и лишних пробелов: «Что выгоднее?» == «что  выгоднее»"""
+    text = user_query.lower().replace('ё', 'е')
+    return _SPACES.sub(' ', _PUNCTUATION.sub(' ', text)).strip()
+
+
+def question_version(question_context):
+    """Версия содержимого вопроса: после правки текста или продуктов старые ответы не подходят"""
+    payload = json.dumps([question_context.get(field) for field in PROMPT_FIELDS], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def cache_key(question_id, question_context, user_query):
+    raw = f"{question_id}:{question_version(question_context)}:{normalize_query(user_query)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class SQLConsultationTier:
+    """Общий уровень кэша в таблице consultation_cache (SQLite или PostgreSQL)"""
+
+    def __init__(self, session_factory, logger=None):
+        self.session_factory = session_factory
+        self.logger = logger or logging.getLogger(__name__)
+
+    def get(self, key):
+        from modules.database import ConsultationCacheEntry
+
+        with self.session_factory() as session:
+            return session.execute(select(ConsultationCacheEntry.answer).where(
+                ConsultationCacheEntry.key == key,
+                ConsultationCacheEntry.expires_at > datetime.utcnow()
+            )).scalar()
+
+    def set(self, key, question_id, answer, ttl):
+        from modules.database import ConsultationCacheEntry
+
+        with self.session_factory() as session:
+            session.merge(ConsultationCacheEntry(
+                key=key, question_id=question_id, answer=answer,
+                created_at=datetime.utcnow(), expires_at=datetime.utcnow() + timedelta(seconds=ttl)
+            ))
+            try:
+                session.commit()
+            except IntegrityError:
+                # Тот же ответ параллельно сохранил другой процесс
+                session.rollback()
+
+    def invalidate_question(self, question_id):
+        from modules.database import ConsultationCacheEntry
+
+        with self.session_factory() as session:
+            removed = session.execute(
+                delete(ConsultationCacheEntry).where(ConsultationCacheEntry.question_id == question_id)
+            ).rowcount
+            session.commit()
+        return removed
+
+    def purge_expired(self):
+        from modules.database import ConsultationCacheEntry
+
+        with self.session_factory() as session:
+            removed = session.execute(
+                delete(ConsultationCacheEntry).where(ConsultationCacheEntry.expires_at <= datetime.utcnow())
+            ).rowcount
+            session.commit()
+        return removed
+
+
+class ConsultationCache:
+    """Кэш ответов GigaChat: LRU с TTL в памяти процесса и необязательный общий уровень в БД.
+
+    Ключ - ID вопроса, версия его содержимого и нормализованный запрос, поэтому
+    правка вопроса сама делает старые ответы недоступными, а деактивация вопроса
+    удаляет их явно (invalidate_question). При промахе similar (SimilarConsultations)
+    ищет ответ на перефразированный прошлый запрос к той же версии вопроса.
+    """
+
+    def __init__(self, ttl=86400, max_entries=1000, shared=None, similar=None, logger=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self.similar = similar
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @property
+    def blocking(self):
+        """Обращения к общему уровню ждут БД (асинхронный код вызывает кэш через asyncio.to_thread)"""
+        return self.shared is not None or (self.similar is not None and self.similar.session_factory is not None)
+
+    def get(self, question_context, user_query):
+        key = cache_key(question_context.get('question_id'), question_context, user_query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+
+        answer = None
+        if self.shared is not None:
+            try:
+                answer = self.shared.get(key)
+            except Exception as e:
+                self.logger.warning(f"⚠️ Общий кэш консультаций недоступен: {e}")
+        counter = 'shared_hits'
+
+        if answer is None and self.similar is not None:
+            try:
+                answer = self.similar.find(question_context, user_query)
+            except Exception as e:
+                self.logger.warning(f"⚠️ Поиск похожих консультаций не удался: {e}")
+            counter = 'similar_hits'
+
+        with self._lock:
+            if answer is None:
+                self.misses += 1
+                return None
+            setattr(self, counter, getattr(self, counter) + 1)
+        self._remember(key, question_context.get('question_id'), answer)
+        return answer
+
+    def set(self, question_context, user_query, answer):
+        question_id = question_context.get('question_id')
+        key = cache_key(question_id, question_context, user_query)
+        self._remember(key, question_id, answer)
+        with self._lock:
+            self.stores += 1
+        if self.similar is not None:
+            self.similar.add(question_context, user_query, answer)
+
+        if self.shared is not None:
+            try:
+                self.shared.set(key, question_id, answer, self.ttl)
+            except Exception as e:
+                self.logger.warning(f"⚠️ Не удалось сохранить ответ в общий кэш: {e}")
+
+    def _remember(self, key, question_id, answer):
+        with self._lock:
+            self._entries[key] = (question_id, answer, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_question(self, question_id):
+        """Удаляет ответы по вопросу (вызывается при деактивации или изменении вопроса)"""
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry[0] == question_id]
+            for key in keys:
+                del self._entries[key]
+        if self.similar is not None:
+            self.similar.invalidate_question(question_id)
+
+        if self.shared is not None:
+            try:
+                self.shared.invalidate_question(question_id)
+            except Exception as e:
+                self.logger.warning(f"⚠️ Не удалось очистить общий кэш консультаций: {e}")
+
+    def metrics(self):
+        with self._lock:
+            found = self.hits + self.shared_hits + self.similar_hits
+            lookups = found + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'hit_rate': found / lookups if lookups else 0.0,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_consultation_cache(db_url, session_factory=None, logger=None):
+    """Общий для процесса кэш консультаций базы данных; None, если CONSULTATION_CACHE_SIZE=0.
+
+    Уровни кэша определяются только настройками: если первым кэш запросил асинхронный
+    менеджер (без синхронных сессий), сессии к db_url создаются здесь же, и кэш
+    получается одинаковым при любом порядке создания менеджеров
+    """
+    with _caches_lock:
+        if db_url in _caches:
+            return _caches[db_url]
+
+        max_entries = int(os.getenv('CONSULTATION_CACHE_SIZE', '1000'))
+        cache = None
+        if max_entries > 0:
+            use_shared = os.getenv('CONSULTATION_CACHE_SHARED', 'False').lower() == 'true'
+            # Ответы на перефразированные запросы (порог близости 0 - поиск отключен)
+            threshold = float(os.getenv('CONSULTATION_SIMILARITY_THRESHOLD', '0'))
+            if session_factory is None and (use_shared or threshold > 0):
+                # Общий профилированный движок процесса (см. database.get_sync_session_factory)
+                from modules.database import get_sync_session_factory
+                session_factory = get_sync_session_factory(db_url)
+
+            shared = SQLConsultationTier(session_factory, logger=logger) if use_shared else None
+            similar = None
+            if threshold > 0:
+                from modules.similarity_index import SimilarConsultations
+                similar = SimilarConsultations(
+                    threshold=threshold,
+                    max_entries=int(os.getenv('CONSULTATION_SIMILARITY_MAX_ENTRIES', '500')),
+                    session_factory=session_factory,
+                    logger=logger
+                )
+            cache = ConsultationCache(
+                ttl=int(os.getenv('CONSULTATION_CACHE_TTL', '86400')),
+                max_entries=max_entries,
+                shared=shared,
+                similar=similar,
+                logger=logger
+            )
+        _caches[db_url] = cache
+        return cache
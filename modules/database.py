@@ -1,9 +1,17 @@
 # modules/database.py
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, func, ForeignKey
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy import (create_engine, Column, Integer, String, Text, DateTime, Boolean, func, ForeignKey, Index,
+                        insert, update, select)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import declarative_base, sessionmaker, scoped_session, relationship
+from contextlib import contextmanager
+from itertools import islice
+from modules.question_catalog import get_question_catalog
+from modules.consultation_cache import get_consultation_cache, question_version
+from modules.sqlite_profile import is_file_sqlite, apply_sqlite_profile
 from datetime import datetime
 import os
 import logging
+import threading
 
 Base = declarative_base()
 
@@ -25,9 +33,20 @@ class Question(Base):
     option_b = Column(Text)
     option_a_details = Column(Text)
     option_b_details = Column(Text)
+    
+    # Стабильный внешний ключ вопроса из банка вопросов (для повторного импорта)
+    external_key = Column(String(100))
+    
+    __table_args__ = (
+        Index('uq_questions_external_key', 'external_key', unique=True),
+    )
 
 class Interview(Base):
     __tablename__ = 'interviews'
+    __table_args__ = (
+        # Каждое обновление бота ищет активное интервью пользователя
+        Index('ix_interviews_user_status', 'user_id', 'status'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(String(50), nullable=False)
@@ -36,15 +55,28 @@ class Interview(Base):
     completed_at = Column(DateTime)
     status = Column(String(20), default='active')
     
+    # Счетчики, обновляемые в одной транзакции со вставкой Response/AIConsultation
+    answered_count = Column(Integer, nullable=False, default=0, server_default='0')
+    choice_a_count = Column(Integer, nullable=False, default=0, server_default='0')
+    choice_b_count = Column(Integer, nullable=False, default=0, server_default='0')
+    consultations_count = Column(Integer, nullable=False, default=0, server_default='0')
+    
     # Связи
-    responses = relationship("Response", back_populates="interview", cascade="all, delete-orphan")
-    consultations = relationship("AIConsultation", back_populates="interview", cascade="all, delete-orphan")
+    # passive_deletes: дочерние строки удаляет сама БД (ON DELETE CASCADE), ORM их не загружает
+    responses = relationship("Response", back_populates="interview", cascade="all, delete-orphan",
+                             passive_deletes=True)
+    consultations = relationship("AIConsultation", back_populates="interview", cascade="all, delete-orphan",
+                                 passive_deletes=True)
 
 class Response(Base):
     __tablename__ = 'responses'
+    __table_args__ = (
+        # Один ответ на вопрос в рамках интервью (защищает от двойного нажатия кнопки)
+        Index('uq_responses_interview_question', 'interview_id', 'question_id', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
-    interview_id = Column(Integer, ForeignKey('interviews.id'), nullable=False)
+    interview_id = Column(Integer, ForeignKey('interviews.id', ondelete='CASCADE'), nullable=False)
     question_id = Column(Integer, ForeignKey('questions.id'), nullable=False)
     answer_text = Column(Text)
     timestamp = Column(DateTime, default=datetime.utcnow)
@@ -61,138 +93,632 @@ class Response(Base):
 
 class AIConsultation(Base):
     __tablename__ = 'ai_consultations'
+    __table_args__ = (
+        Index('ix_ai_consultations_interview_question', 'interview_id', 'question_id'),
+    )
     
     id = Column(Integer, primary_key=True)
-    interview_id = Column(Integer, ForeignKey('interviews.id'), nullable=False)
+    interview_id = Column(Integer, ForeignKey('interviews.id', ondelete='CASCADE'), nullable=False)
     question_id = Column(Integer, ForeignKey('questions.id'), nullable=False)
     user_query = Column(Text, nullable=False)
     ai_response = Column(Text, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
     consultation_type = Column(String(50))
+    # Версия содержимого вопроса на момент консультации (consultation_cache.question_version)
+    question_version = Column(String(16))
     
     # Связи
     interview = relationship("Interview", back_populates="consultations")
     question = relationship("Question")
 
+class BotState(Base):
+    """Состояние диалога пользователя (ожидание ответа, консультации) с временем истечения"""
+    __tablename__ = 'bot_states'
+    __table_args__ = (
+        Index('ix_bot_states_expires_at', 'expires_at'),
+    )
+    
+    user_id = Column(String(50), primary_key=True)
+    key = Column(String(50), primary_key=True)
+    value = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+class ConsultationCacheEntry(Base):
+    """Общий для процессов кэш ответов GigaChat (ключ - вопрос, версия его текста и запрос)"""
+    __tablename__ = 'consultation_cache'
+    __table_args__ = (
+        Index('ix_consultation_cache_question', 'question_id'),
+        Index('ix_consultation_cache_expires_at', 'expires_at'),
+    )
+    
+    key = Column(String(64), primary_key=True)
+    question_id = Column(Integer, nullable=False)
+    answer = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+def _env_int(name, default):
+    """Читает целочисленную настройку из переменных окружения"""
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+def build_financial_question(text, market_context, option_a, option_b,
+                             option_a_details, option_b_details, category="financial_choice"):
+    """Проверяет поля и создает вопрос с выбором финансовых продуктов"""
+    # Валидация данных
+    if not text or not market_context or not option_a or not option_b:
+        raise ValueError("Обязательные поля (text, market_context, option_a, option_b) не могут быть пустыми")
+    
+    return Question(
+        text=text.strip(),
+        category=category,
+        question_type='choice',
+        market_context=market_context.strip(),
+        option_a=option_a.strip(),
+        option_b=option_b.strip(),
+        option_a_details=option_a_details.strip() if option_a_details else None,
+        option_b_details=option_b_details.strip() if option_b_details else None
+    )
+
+def build_text_question(text, category="general", explanation=None):
+    """Проверяет поля и создает обычный текстовый вопрос"""
+    if not text:
+        raise ValueError("Текст вопроса не может быть пустым")
+    
+    return Question(
+        text=text.strip(),
+        category=category,
+        question_type='text',
+        explanation=explanation.strip() if explanation else None
+    )
+
+# Колонки вопроса, которые заполняет массовый импорт
+IMPORTED_QUESTION_FIELDS = (
+    'text', 'category', 'question_type', 'explanation', 'market_context',
+    'option_a', 'option_b', 'option_a_details', 'option_b_details'
+)
+
+def build_question_from_row(row):
+    """Проверяет строку банка вопросов по правилам add_*_question и возвращает значения колонок"""
+    question_type = row.get('question_type') or ('choice' if row.get('option_a') else 'text')
+    
+    if question_type == 'choice':
+        question = build_financial_question(
+            row.get('text'), row.get('market_context'), row.get('option_a'), row.get('option_b'),
+            row.get('option_a_details'), row.get('option_b_details'),
+            row.get('category') or "financial_choice"
+        )
+    elif question_type == 'text':
+        question = build_text_question(row.get('text'), row.get('category') or "general", row.get('explanation'))
+    else:
+        raise ValueError(f"Неизвестный тип вопроса: {question_type}")
+    
+    values = {field: getattr(question, field) for field in IMPORTED_QUESTION_FIELDS}
+    external_key = row.get('external_key')
+    values['external_key'] = str(external_key).strip() if external_key not in (None, '') else None
+    # Активность меняется только явно: повторный импорт не возвращает деактивированные вопросы
+    if row.get('is_active') not in (None, ''):
+        values['is_active'] = parse_flag(row['is_active'])
+    return values
+
+def parse_flag(value):
+    """Флаг из JSON или CSV: true/false, 1/0, да/нет"""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 'yes', 'да'):
+        return True
+    if text in ('0', 'false', 'no', 'нет'):
+        return False
+    raise ValueError(f"Некорректное значение is_active: {value}")
+
+def interview_counters_update(interview_id, **increments):
+    """UPDATE interviews SET x = x + n для счетчиков интервью (None, если увеличивать нечего)"""
+    values = {
+        getattr(Interview, name): getattr(Interview, name) + amount
+        for name, amount in increments.items() if amount
+    }
+    if not values:
+        return None
+    return update(Interview).where(Interview.id == interview_id).values(values)
+
+def response_counter_increments(selected_option):
+    """Приращения счетчиков интервью для нового ответа"""
+    return {
+        'answered_count': 1,
+        'choice_a_count': 1 if selected_option == 'A' else 0,
+        'choice_b_count': 1 if selected_option == 'B' else 0
+    }
+
+def partitioned_response_guard(interview_id, question_id):
+    """Проверка повторного ответа для секционированной таблицы responses.
+
+    В ней нет глобального уникального индекса (interview_id, question_id), поэтому
+    ответы интервью сериализуются блокировкой его строки (первый запрос), а дубликат
+    ищется явно (второй запрос) в той же транзакции, что и вставка
+    """
+    return (
+        select(Interview.id).where(Interview.id == interview_id).with_for_update(),
+        select(Response.id).where(
+            Response.interview_id == interview_id,
+            Response.question_id == question_id
+        ).limit(1)
+    )
+
+def duplicate_response_error():
+    """Та же ошибка, что дает уникальный индекс несекционированной таблицы"""
+    return IntegrityError("duplicate response", None, Exception("responses partition duplicate"))
+
+def response_insert(interview_id, question_id, answer_text, selected_option=None):
+    """INSERT ответа, возвращающий строку; число консультаций по вопросу считается в том же запросе"""
+    consultations_count = 0
+    if selected_option:
+        consultations_count = select(func.count()).select_from(AIConsultation).where(
+            AIConsultation.interview_id == interview_id,
+            AIConsultation.question_id == question_id
+        ).scalar_subquery()
+    
+    return insert(Response).values(
+        interview_id=interview_id,
+        question_id=question_id,
+        selected_option=selected_option,
+        answer_text=answer_text,
+        consultations_count=consultations_count,
+        timestamp=datetime.utcnow()
+    ).returning(Response)
+
+def question_prompt_version(question):
+    """Версия содержимого вопроса из строки questions (как question_version для контекста промпта)"""
+    if question is None:
+        return None
+    return question_version({
+        'question_text': question.text,
+        'market_context': question.market_context,
+        'option_a': question.option_a,
+        'option_a_details': question.option_a_details,
+        'option_b': question.option_b,
+        'option_b_details': question.option_b_details
+    })
+
+def consultation_statements(interview_id, question_id, user_query, ai_response, consultation_type,
+                            question_version=None):
+    """Запросы одной транзакции консультации: вставка и атомарное увеличение счетчиков (с RETURNING)"""
+    return (
+        insert(AIConsultation).values(
+            interview_id=interview_id,
+            question_id=question_id,
+            user_query=user_query.strip(),
+            ai_response=ai_response.strip(),
+            consultation_type=consultation_type,
+            question_version=question_version,
+            timestamp=datetime.utcnow()
+        ).returning(AIConsultation.id),
+        interview_counters_update(interview_id, consultations_count=1).returning(Interview.consultations_count),
+        # Счетчик в ответе увеличивается, только если на вопрос уже ответили
+        update(Response).where(
+            Response.interview_id == interview_id,
+            Response.question_id == question_id
+        ).values(consultations_count=Response.consultations_count + 1).returning(Response.consultations_count)
+    )
+
+def interview_statistics(interview, total_questions):
+    """Статистика интервью по его счетчикам"""
+    responses_count = interview.answered_count or 0
+    
+    return {
+        'interview': interview,
+        'responses_count': responses_count,
+        'choice_a_count': interview.choice_a_count or 0,
+        'choice_b_count': interview.choice_b_count or 0,
+        'consultations_count': interview.consultations_count or 0,
+        'total_questions': total_questions,
+        'completion_rate': responses_count / total_questions if total_questions > 0 else 0
+    }
+
+def resolve_database_url(db_url=None):
+    """URL базы данных: аргумент, DATABASE_URL или локальный PostgreSQL"""
+    if not db_url:
+        db_url = os.getenv('DATABASE_URL')
+    if not db_url:
+        user = os.getenv('USER')
+        db_url = f'postgresql://{user}@localhost/interview_bot_db'
+    return db_url
+
+def env_bool(name, default):
+    """Читает логическую настройку из переменных окружения (общая для синхронного и асинхронного менеджеров)"""
+    value = os.getenv(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+def pool_options(db_url, pool_size=None, max_overflow=None, pool_pre_ping=None,
+                 pool_recycle=None, pool_timeout=None):
+    """Параметры пула соединений (значения по умолчанию берутся из .env)"""
+    options = {
+        'pool_pre_ping': pool_pre_ping if pool_pre_ping is not None else env_bool('DB_POOL_PRE_PING', True)
+    }
+    
+    if db_url.startswith('sqlite'):
+        return options
+    
+    options['pool_size'] = pool_size if pool_size is not None else _env_int('DB_POOL_SIZE', 10)
+    options['max_overflow'] = max_overflow if max_overflow is not None else _env_int('DB_MAX_OVERFLOW', 20)
+    options['pool_recycle'] = pool_recycle if pool_recycle is not None else _env_int('DB_POOL_RECYCLE', 1800)
+    options['pool_timeout'] = pool_timeout if pool_timeout is not None else _env_int('DB_POOL_TIMEOUT', 30)
+    return options
+
+def engine_options(db_url, pool_size=None, max_overflow=None, pool_pre_ping=None,
+                   pool_recycle=None, pool_timeout=None, sqlite_profile=False):
+    """Параметры синхронного движка: пул и настройки драйвера"""
+    options = pool_options(db_url, pool_size, max_overflow, pool_pre_ping, pool_recycle, pool_timeout)
+    if db_url.startswith('sqlite'):
+        # SQLite-соединения используются из разных потоков обработчиков бота
+        options['connect_args'] = {'check_same_thread': False}
+    if sqlite_profile:
+        # В режиме WAL читатели не блокируют друг друга, поэтому пул держит соединение на поток обработчика
+        options['pool_size'] = pool_size if pool_size is not None else _env_int('DB_POOL_SIZE', 10)
+        options['max_overflow'] = max_overflow if max_overflow is not None else _env_int('DB_MAX_OVERFLOW', 20)
+        options['pool_timeout'] = pool_timeout if pool_timeout is not None else _env_int('DB_POOL_TIMEOUT', 30)
+    return options
+
+def create_sync_engine(db_url, pool_size=None, max_overflow=None, pool_pre_ping=None,
+                       pool_recycle=None, pool_timeout=None, sqlite_profile=None):
+    """Синхронный движок: пул из .env и профиль файловой SQLite (отключается DB_SQLITE_PROFILE=False)"""
+    if sqlite_profile is None:
+        sqlite_profile = env_bool('DB_SQLITE_PROFILE', True)
+    sqlite_profile = sqlite_profile and is_file_sqlite(db_url)
+    engine = create_engine(db_url, echo=False, **engine_options(
+        db_url, pool_size, max_overflow, pool_pre_ping, pool_recycle, pool_timeout, sqlite_profile
+    ))
+    if sqlite_profile:
+        apply_sqlite_profile(engine)
+    return engine
+
+_sync_session_factories = {}
+_sync_session_factories_lock = threading.Lock()
+
+def get_sync_session_factory(db_url):
+    """Общая для процесса фабрика синхронных сессий к db_url (один движок на базу).
+
+    Нужна, когда синхронного менеджера нет: хранилищу состояний и уровням кэша
+    консультаций в БД при работе через AsyncDatabaseManager
+    """
+    with _sync_session_factories_lock:
+        factory = _sync_session_factories.get(db_url)
+        if factory is None:
+            factory = sessionmaker(bind=create_sync_engine(db_url), expire_on_commit=False)
+            _sync_session_factories[db_url] = factory
+        return factory
+
 class DatabaseManager:
-    def __init__(self, db_url=None):
-        if not db_url:
-            user = os.getenv('USER')
-            db_url = f'postgresql://{user}@localhost/interview_bot_db'
+    def __init__(self, db_url=None, pool_size=None, max_overflow=None, pool_pre_ping=None,
+                 pool_recycle=None, pool_timeout=None, write_behind=None, replica_urls=None, max_replica_lag=None,
+                 sqlite_profile=None, instrumentation=None):
+        db_url = resolve_database_url(db_url)
         
         self.db_url = db_url
-        self.engine = create_engine(db_url, echo=False)
-        self.session = None
+        # Профиль SQLite (WAL, busy_timeout и др.) для файловой базы, отключается DB_SQLITE_PROFILE=False
+        if sqlite_profile is None:
+            sqlite_profile = env_bool('DB_SQLITE_PROFILE', True)
+        self.sqlite_profile = sqlite_profile and is_file_sqlite(db_url)
+        self.engine = create_sync_engine(
+            db_url, pool_size, max_overflow, pool_pre_ping, pool_recycle, pool_timeout, self.sqlite_profile
+        )
+        
+        # Фабрика сессий: каждая единица работы получает собственную сессию.
+        # expire_on_commit=False позволяет использовать загруженные объекты после закрытия сессии
+        self.session_factory = sessionmaker(bind=self.engine, expire_on_commit=False)
+        # Потокобезопасный реестр сессий для скриптов, работающих через get_session()
+        self.Session = scoped_session(self.session_factory)
+        
+        # Общий для процесса кэш активных вопросов
+        self.question_catalog = get_question_catalog(db_url)
         
         # Настройка логирования
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
         
+        # Общий для процесса кэш ответов GigaChat (CONSULTATION_CACHE_SHARED=True - еще и в таблице БД)
+        self.consultation_cache = get_consultation_cache(db_url, self.session_factory, self.logger)
+        
+        # Помесячное секционирование responses/ai_consultations (только PostgreSQL)
+        self.partitioning = env_bool('DB_PARTITIONING', False) and self.engine.dialect.name == 'postgresql'
+        
+        # Необязательная отложенная запись ответов и консультаций с групповой фиксацией
+        self.write_behind = None
+        self.write_behind_durable = env_bool('DB_WRITE_BEHIND_DURABLE', True)
+        if write_behind if write_behind is not None else env_bool('DB_WRITE_BEHIND', False):
+            from modules.write_behind import WriteBehindQueue
+            self.write_behind = WriteBehindQueue(
+                self.session_factory,
+                max_batch=_env_int('DB_WRITE_BEHIND_BATCH', 100),
+                flush_interval_ms=_env_int('DB_WRITE_BEHIND_INTERVAL_MS', 20),
+                max_queue=_env_int('DB_WRITE_BEHIND_QUEUE', 10000),
+                logger=self.logger
+            )
+        
+        # Реплики только для чтения для отчетов и выгрузок (DATABASE_REPLICA_URLS через запятую)
+        self.read_replicas = None
+        from modules.replicas import ReadReplicaRouter, parse_replica_urls
+        replica_urls = parse_replica_urls(replica_urls or os.getenv('DATABASE_REPLICA_URLS'))
+        if replica_urls:
+            self.read_replicas = ReadReplicaRouter(
+                replica_urls,
+                self.engine,
+                max_lag=max_replica_lag if max_replica_lag is not None else _env_int('DB_REPLICA_MAX_LAG', 30),
+                engine_factory=lambda url: create_engine(url, echo=False, **engine_options(url)),
+                logger=self.logger
+            )
+        
+        # Необязательная статистика SQL-запросов по методам и обновлениям бота
+        self.profiler = None
+        if instrumentation if instrumentation is not None else env_bool('DB_INSTRUMENTATION', False):
+            from modules.sql_instrumentation import QueryProfiler, instrument_methods
+            self.profiler = QueryProfiler(
+                summary_interval=_env_int('DB_INSTRUMENTATION_INTERVAL', 60),
+                logger=self.logger
+            )
+            self.profiler.attach(self.engine)
+            for engine in self.read_replicas.engines if self.read_replicas else []:
+                self.profiler.attach(engine)
+            instrument_methods(self, self.profiler)
+    
     def create_tables(self):
-        """Создает все таблицы в базе данных"""
+        """Создает все таблицы в базе данных и применяет миграции схемы"""
         try:
             Base.metadata.create_all(self.engine)
+            self.migrate()
+            if self.partitioning:
+                self.setup_partitioning()
             self.logger.info("✅ Таблицы созданы успешно")
             print("✅ Таблицы созданы")
         except Exception as e:
             self.logger.error(f"❌ Ошибка создания таблиц: {e}")
             print(f"❌ Ошибка создания таблиц: {e}")
             raise
+    
+    def migrate(self, target_version=None):
+        """Обновляет схему существующей БД до последней (или указанной) версии"""
+        from modules.migrations import MigrationRunner
+        return MigrationRunner(self.engine, self.logger).upgrade(target_version)
+    
+    def setup_partitioning(self, months_ahead=2):
+        """Переводит responses и ai_consultations на помесячные секции и создает секции наперед"""
+        if self.engine.dialect.name != 'postgresql':
+            self.logger.warning("⚠️ Секционирование поддерживается только в PostgreSQL")
+            return []
+        
+        from modules.partitioning import setup_partitioning
+        with self.engine.begin() as connection:
+            created = setup_partitioning(connection, months_ahead)
+        self.logger.info(f"✅ Секции готовы, создано новых: {len(created)}")
+        return created
+    
+    def drop_old_partitions(self, retention_months, detach_only=False):
+        """Удаляет (или только отсоединяет) секции старше retention_months месяцев вместо построчного DELETE"""
+        if self.engine.dialect.name != 'postgresql':
+            self.logger.warning("⚠️ Секционирование поддерживается только в PostgreSQL")
+            return []
+        
+        from modules.partitioning import drop_old_partitions
+        with self.engine.begin() as connection:
+            removed = drop_old_partitions(connection, retention_months, detach_only)
+        action = "Отсоединено" if detach_only else "Удалено"
+        self.logger.info(f"✅ {action} секций: {len(removed)}")
+        return removed
+    
+    def get_schema_version(self):
+        """Текущая версия схемы БД"""
+        from modules.migrations import MigrationRunner
+        return MigrationRunner(self.engine, self.logger).current_version()
+    
+    @contextmanager
+    def session_scope(self):
+        """Сессия на одну единицу работы: commit при успехе, rollback при ошибке, затем закрытие"""
+        session = self.session_factory()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
         
     def get_session(self):
-        """Получает сессию для работы с БД"""
-        if not self.session:
-            try:
-                Session = sessionmaker(bind=self.engine)
-                self.session = Session()
-                self.logger.debug("Сессия базы данных создана")
-            except Exception as e:
-                self.logger.error(f"❌ Ошибка создания сессии: {e}")
-                print(f"❌ Ошибка создания сессии: {e}")
-                raise
-        return self.session
+        """Получает сессию текущего потока (для скриптов и отладки)"""
+        try:
+            return self.Session()
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка создания сессии: {e}")
+            print(f"❌ Ошибка создания сессии: {e}")
+            raise
+    
+    def read_engine(self):
+        """Движок для аналитического чтения: актуальная реплика или основная БД"""
+        if self.read_replicas:
+            engine = self.read_replicas.choose()
+            if engine is not None:
+                return engine
+            self.logger.warning("⚠️ Нет актуальных реплик, читаем с основной БД")
+        return self.engine
+    
+    @contextmanager
+    def read_session_scope(self):
+        """Сессия только для чтения для отчетов: идет на реплику, изменения откатываются"""
+        session = self.session_factory(bind=self.read_engine())
+        try:
+            yield session
+        finally:
+            session.rollback()
+            session.close()
+    
+    def get_read_session(self):
+        """Сессия для аналитических скриптов (полные выборки не нагружают основную БД)"""
+        return self.session_factory(bind=self.read_engine())
     
     def close_session(self):
-        """Закрывает текущую сессию"""
-        if self.session:
-            try:
-                self.session.close()
-                self.session = None
-                self.logger.debug("Сессия базы данных закрыта")
-            except Exception as e:
-                self.logger.error(f"❌ Ошибка закрытия сессии: {e}")
+        """Закрывает сессию текущего потока"""
+        try:
+            self.Session.remove()
+            self.logger.debug("Сессия базы данных закрыта")
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка закрытия сессии: {e}")
     
     def add_financial_question(self, text, market_context, option_a, option_b, 
                               option_a_details, option_b_details, category="financial_choice"):
         """Добавляет вопрос с выбором финансовых продуктов"""
-        # Валидация данных
-        if not text or not market_context or not option_a or not option_b:
-            raise ValueError("Обязательные поля (text, market_context, option_a, option_b) не могут быть пустыми")
+        question = build_financial_question(text, market_context, option_a, option_b,
+                                            option_a_details, option_b_details, category)
         
         try:
-            session = self.get_session()
-            question = Question(
-                text=text.strip(),
-                category=category,
-                question_type='choice',
-                market_context=market_context.strip(),
-                option_a=option_a.strip(),
-                option_b=option_b.strip(),
-                option_a_details=option_a_details.strip() if option_a_details else None,
-                option_b_details=option_b_details.strip() if option_b_details else None
-            )
-            session.add(question)
-            session.commit()
+            with self.session_scope() as session:
+                session.add(question)
+                session.flush()
+                question_id = question.id
             
-            self.logger.info(f"✅ Финансовый вопрос добавлен с ID: {question.id}")
-            return question.id
+            self.question_catalog.invalidate()
+            self.logger.info(f"✅ Финансовый вопрос добавлен с ID: {question_id}")
+            return question_id
             
         except Exception as e:
-            session.rollback()
             self.logger.error(f"❌ Ошибка добавления финансового вопроса: {e}")
             raise
     
     def add_text_question(self, text, category="general", explanation=None):
         """Добавляет обычный текстовый вопрос"""
-        if not text:
-            raise ValueError("Текст вопроса не может быть пустым")
+        question = build_text_question(text, category, explanation)
         
         try:
-            session = self.get_session()
-            question = Question(
-                text=text.strip(),
-                category=category,
-                question_type='text',
-                explanation=explanation.strip() if explanation else None
-            )
-            session.add(question)
-            session.commit()
+            with self.session_scope() as session:
+                session.add(question)
+                session.flush()
+                question_id = question.id
             
-            self.logger.info(f"✅ Текстовый вопрос добавлен с ID: {question.id}")
-            return question.id
+            self.question_catalog.invalidate()
+            self.logger.info(f"✅ Текстовый вопрос добавлен с ID: {question_id}")
+            return question_id
             
         except Exception as e:
-            session.rollback()
             self.logger.error(f"❌ Ошибка добавления текстового вопроса: {e}")
             raise
     
-    def get_next_question_for_interview(self, interview_id):
-        """Получает следующий неотвеченный вопрос для конкретного интервью"""
+    def bulk_import_questions(self, rows, batch_size=1000, skip_invalid=False):
+        """Массово загружает вопросы из итерируемого источника строк (dict).
+        
+        Строки проверяются по правилам add_financial_question/add_text_question и
+        вставляются пачками executemany в одной транзакции. Вопросы с уже известным
+        external_key обновляются (is_active - только если задан в строке). Каталог
+        вопросов сбрасывается один раз в конце, кэш консультаций - по обновленным вопросам.
+        Возвращает словарь с количеством вставленных, обновленных и пропущенных строк
+        """
+        result = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        updated_ids = []
+        rows = iter(rows)
+        row_number = 0
+        
         try:
-            session = self.get_session()
+            with self.session_scope() as session:
+                while True:
+                    chunk = list(islice(rows, batch_size))
+                    if not chunk:
+                        break
+                    
+                    # Проверка и дедупликация по external_key внутри пачки (побеждает последняя строка)
+                    keyed, unkeyed = {}, []
+                    for row in chunk:
+                        row_number += 1
+                        try:
+                            values = build_question_from_row(row)
+                        except ValueError as e:
+                            if not skip_invalid:
+                                raise ValueError(f"Строка {row_number}: {e}") from e
+                            self.logger.warning(f"⚠️ Строка {row_number} пропущена: {e}")
+                            result['skipped'] += 1
+                            continue
+                        
+                        if values['external_key']:
+                            keyed[values['external_key']] = values
+                        else:
+                            unkeyed.append(values)
+                    
+                    existing = {}
+                    if keyed:
+                        existing = dict(session.query(Question.external_key, Question.id).filter(
+                            Question.external_key.in_(list(keyed))
+                        ).all())
+                    
+                    now = datetime.utcnow()
+                    new_rows = unkeyed + [values for key, values in keyed.items() if key not in existing]
+                    for values in new_rows:
+                        values['created_at'] = now
+                        values.setdefault('is_active', True)
+                    changed_rows = [dict(values, id=existing[key]) for key, values in keyed.items() if key in existing]
+                    
+                    if new_rows:
+                        session.execute(insert(Question), new_rows)
+                    # executemany обновляет строки с одинаковым набором колонок (is_active есть не везде)
+                    for has_flag in (False, True):
+                        batch = [values for values in changed_rows if ('is_active' in values) == has_flag]
+                        if batch:
+                            session.execute(update(Question), batch)
+                    
+                    result['inserted'] += len(new_rows)
+                    result['updated'] += len(changed_rows)
+                    updated_ids.extend(values['id'] for values in changed_rows)
+                    self.logger.info(f"📦 Обработано строк: {row_number}")
             
-            # Получаем ID вопросов, на которые уже ответили в этом интервью
-            answered_question_ids = session.query(Response.question_id).filter(
-                Response.interview_id == interview_id
-            ).scalar_subquery()
+            self.question_catalog.invalidate()
+            # Ответы GigaChat на прежний текст обновленных вопросов больше не подходят
+            if self.consultation_cache:
+                for question_id in updated_ids:
+                    self.consultation_cache.invalidate_question(question_id)
+            self.logger.info(
+                f"✅ Импорт вопросов: добавлено {result['inserted']}, "
+                f"обновлено {result['updated']}, пропущено {result['skipped']}"
+            )
+            return result
             
-            # Находим первый неотвеченный вопрос (по порядку ID)
-            next_question = session.query(Question).filter(
-                Question.is_active == True,
-                Question.id.notin_(answered_question_ids)
-            ).order_by(Question.id).first()
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка массового импорта вопросов: {e}")
+            raise
+    
+    def _load_active_questions(self):
+        """Загружает активные вопросы для каталога"""
+        with self.session_scope() as session:
+            return session.query(Question).filter(Question.is_active == True).order_by(Question.id).all()
+    
+    def get_active_questions(self):
+        """Снимок каталога активных вопросов (загружается при первом обращении)"""
+        return self.question_catalog.get_or_load(self._load_active_questions)
+    
+    def _get_answered_question_ids(self, interview_id):
+        """ID вопросов, на которые уже ответили в этом интервью"""
+        with self.session_scope() as session:
+            rows = session.query(Response.question_id).filter(
+                Response.interview_id == interview_id
+            ).all()
+            return {row.question_id for row in rows}
+    
+    def get_question_progress(self, interview_id):
+        """Следующий вопрос и прогресс интервью за один запрос к БД: (question, answered, total)"""
+        try:
+            self._read_your_writes(interview_id)
+            catalog = self.get_active_questions()
+            answered_ids = self._get_answered_question_ids(interview_id)
+            return catalog.next_question(answered_ids), len(answered_ids), catalog.total
             
-            return next_question
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка получения прогресса интервью: {e}")
+            return None, 0, 0
+    
+    def get_next_question_for_interview(self, interview_id):
+        """Получает следующий неотвеченный вопрос для конкретного интервью"""
+        try:
+            # Первый неотвеченный вопрос (по порядку ID) выбирается из каталога в памяти
+            self._read_your_writes(interview_id)
+            catalog = self.get_active_questions()
+            return catalog.next_question(self._get_answered_question_ids(interview_id))
             
         except Exception as e:
             self.logger.error(f"❌ Ошибка получения следующего вопроса: {e}")
@@ -200,66 +726,59 @@ class DatabaseManager:
     
     def get_interview_progress(self, interview_id):
         """Получает прогресс интервью"""
-        try:
-            session = self.get_session()
-            
-            total_questions = session.query(Question).filter(Question.is_active == True).count()
-            answered_questions = session.query(Response).filter(
-                Response.interview_id == interview_id
-            ).count()
-            
-            return answered_questions, total_questions
-            
-        except Exception as e:
-            self.logger.error(f"❌ Ошибка получения прогресса интервью: {e}")
-            return 0, 0
+        _, answered_questions, total_questions = self.get_question_progress(interview_id)
+        return answered_questions, total_questions
     
-    def save_consultation(self, interview_id, question_id, user_query, ai_response, consultation_type="product_advice"):
-        """Сохраняет консультацию с ИИ"""
+    def save_consultation(self, interview_id, question_id, user_query, ai_response, consultation_type="product_advice",
+                          durable=None):
+        """Сохраняет консультацию с ИИ одной транзакцией.
+        
+        Возвращает словарь: consultation_id, interview_consultations (всего в интервью)
+        и question_consultations (в ответе на вопрос, если он уже есть)
+        """
         if not user_query or not ai_response:
             raise ValueError("Запрос пользователя и ответ ИИ не могут быть пустыми")
         
         try:
-            session = self.get_session()
-            consultation = AIConsultation(
-                interview_id=interview_id,
-                question_id=question_id,
-                user_query=user_query.strip(),
-                ai_response=ai_response.strip(),
-                consultation_type=consultation_type
-            )
-            session.add(consultation)
-            session.commit()
+            if self.write_behind:
+                future = self.write_behind.submit(interview_id, lambda session: self._insert_consultation(
+                    session, interview_id, question_id, user_query, ai_response, consultation_type
+                ))
+                return self._await_write(future, durable)
             
-            # Обновляем счетчик консультаций в ответе (если ответ уже существует)
-            response = session.query(Response).filter(
-                Response.interview_id == interview_id,
-                Response.question_id == question_id
-            ).first()
+            with self.session_scope() as session:
+                counters = self._insert_consultation(
+                    session, interview_id, question_id, user_query, ai_response, consultation_type
+                )
             
-            if response:
-                response.consultations_count = session.query(AIConsultation).filter(
-                    AIConsultation.interview_id == interview_id,
-                    AIConsultation.question_id == question_id
-                ).count()
-                session.commit()
-            
-            self.logger.info(f"✅ Консультация сохранена с ID: {consultation.id}")
-            return consultation.id
+            self.logger.info(f"✅ Консультация сохранена с ID: {counters['consultation_id']}")
+            return counters
             
         except Exception as e:
-            session.rollback()
             self.logger.error(f"❌ Ошибка сохранения консультации: {e}")
             raise
     
-    def get_random_question(self, category=None):
-        """Получает случайный вопрос (для совместимости со старым кодом)"""
+    def _insert_consultation(self, session, interview_id, question_id, user_query, ai_response, consultation_type):
+        """Вставляет консультацию и атомарно увеличивает счетчики в текущей транзакции.
+        
+        Возвращает ID консультации и обновленные счетчики интервью и ответа
+        (None, если на вопрос еще не ответили)
+        """
+        # Версия берется из каталога: похожие запросы потом ищутся только среди ответов на тот же текст вопроса
+        version = question_prompt_version(self.get_active_questions().get(question_id))
+        insert_consultation, update_interview, update_response = consultation_statements(
+            interview_id, question_id, user_query, ai_response, consultation_type, version
+        )
+        return {
+            'consultation_id': session.execute(insert_consultation).scalar_one(),
+            'interview_consultations': session.execute(update_interview).scalar(),
+            'question_consultations': session.execute(update_response).scalar()
+        }
+    
+    def get_random_question(self, category=None, exclude_ids=None):
+        """Случайный активный вопрос (из категории, кроме exclude_ids) из каталога, без сортировки в БД"""
         try:
-            session = self.get_session()
-            query = session.query(Question).filter(Question.is_active == True)
-            if category:
-                query = query.filter(Question.category == category)
-            return query.order_by(func.random()).first()
+            return self.get_active_questions().random_question(category or None, exclude_ids)
             
         except Exception as e:
             self.logger.error(f"❌ Ошибка получения случайного вопроса: {e}")
@@ -268,8 +787,13 @@ class DatabaseManager:
     def get_question_by_id(self, question_id):
         """Получает вопрос по ID"""
         try:
-            session = self.get_session()
-            return session.query(Question).filter(Question.id == question_id).first()
+            question = self.get_active_questions().get(question_id)
+            if question:
+                return question
+            
+            # Неактивные вопросы в каталоге не хранятся
+            with self.session_scope() as session:
+                return session.query(Question).filter(Question.id == question_id).first()
             
         except Exception as e:
             self.logger.error(f"❌ Ошибка получения вопроса по ID: {e}")
@@ -278,11 +802,19 @@ class DatabaseManager:
     def get_interview_by_user_id(self, user_id, status='active'):
         """Получает интервью пользователя по статусу"""
         try:
-            session = self.get_session()
-            return session.query(Interview).filter(
-                Interview.user_id == user_id,
-                Interview.status == status
-            ).first()
+            with self.session_scope() as session:
+                interview = session.query(Interview).filter(
+                    Interview.user_id == user_id,
+                    Interview.status == status
+                ).first()
+            
+            if interview and self.write_behind and self.write_behind.has_pending(interview.id):
+                # Счетчики интервью должны учитывать еще не зафиксированные записи
+                self._read_your_writes(interview.id)
+                with self.session_scope() as session:
+                    interview = session.get(Interview, interview.id)
+            
+            return interview
             
         except Exception as e:
             self.logger.error(f"❌ Ошибка получения интервью пользователя: {e}")
@@ -291,108 +823,233 @@ class DatabaseManager:
     def get_interview_statistics(self, interview_id):
         """Получает подробную статистику интервью"""
         try:
-            session = self.get_session()
-            
-            # Основная информация об интервью
-            interview = session.query(Interview).filter(Interview.id == interview_id).first()
-            if not interview:
-                return None
-            
-            # Статистика ответов
-            responses = session.query(Response).filter(Response.interview_id == interview_id).all()
-            
-            # Подсчет выборов
-            choice_a_count = sum(1 for r in responses if r.selected_option == 'A')
-            choice_b_count = sum(1 for r in responses if r.selected_option == 'B')
+            self._read_your_writes(interview_id)
+            with self.session_scope() as session:
+                # Счетчики хранятся в самой строке интервью
+                interview = session.get(Interview, interview_id)
+                if not interview:
+                    return None
             
-            # Статистика консультаций
-            consultations_count = session.query(AIConsultation).filter(
-                AIConsultation.interview_id == interview_id
-            ).count()
-            
-            # Общее количество вопросов
-            total_questions = session.query(Question).filter(Question.is_active == True).count()
-            
-            return {
-                'interview': interview,
-                'responses_count': len(responses),
-                'choice_a_count': choice_a_count,
-                'choice_b_count': choice_b_count,
-                'consultations_count': consultations_count,
-                'total_questions': total_questions,
-                'completion_rate': len(responses) / total_questions if total_questions > 0 else 0
-            }
+            return self.build_interview_statistics(interview)
             
         except Exception as e:
             self.logger.error(f"❌ Ошибка получения статистики интервью: {e}")
             return None
     
+    def build_interview_statistics(self, interview):
+        """Статистика интервью по его счетчикам и каталогу вопросов"""
+        return interview_statistics(interview, self.get_active_questions().total)
+    
     def deactivate_question(self, question_id):
         """Деактивирует вопрос (помечает как неактивный)"""
         try:
-            session = self.get_session()
-            question = session.query(Question).filter(Question.id == question_id).first()
-            
-            if question:
+            with self.session_scope() as session:
+                question = session.query(Question).filter(Question.id == question_id).first()
+                
+                if not question:
+                    self.logger.warning(f"⚠️ Вопрос {question_id} не найден")
+                    return False
+                
                 question.is_active = False
-                session.commit()
-                self.logger.info(f"✅ Вопрос {question_id} деактивирован")
-                return True
-            else:
-                self.logger.warning(f"⚠️ Вопрос {question_id} не найден")
-                return False
+            
+            self.question_catalog.invalidate()
+            if self.consultation_cache:
+                self.consultation_cache.invalidate_question(question_id)
+            self.logger.info(f"✅ Вопрос {question_id} деактивирован")
+            return True
                 
         except Exception as e:
-            session.rollback()
             self.logger.error(f"❌ Ошибка деактивации вопроса: {e}")
             return False
     
     def get_all_questions(self, active_only=True):
         """Получает все вопросы"""
         try:
-            session = self.get_session()
-            query = session.query(Question)
-            
-            if active_only:
-                query = query.filter(Question.is_active == True)
+            with self.session_scope() as session:
+                query = session.query(Question)
                 
-            return query.order_by(Question.id).all()
+                if active_only:
+                    query = query.filter(Question.is_active == True)
+                    
+                return query.order_by(Question.id).all()
             
         except Exception as e:
             self.logger.error(f"❌ Ошибка получения всех вопросов: {e}")
             return []
     
-    def cleanup_old_interviews(self, days_old=30):
-        """Удаляет старые завершенные интервью"""
+    def cleanup_old_interviews(self, days_old=30, batch_size=1000, archive_dir=None, progress_callback=None):
+        """Удаляет старые завершенные интервью пачками.
+        
+        Каждая пачка из batch_size интервью удаляется отдельной короткой транзакцией
+        одним DELETE; ответы и консультации удаляет ON DELETE CASCADE. Если указан
+        archive_dir, строки пачки перед удалением выгружаются в сжатые NDJSON-файлы.
+        progress_callback(deleted, total) вызывается после каждой пачки
+        """
+        deleted = 0
+        archiver = None
         try:
             from datetime import timedelta
-            session = self.get_session()
             cutoff_date = datetime.utcnow() - timedelta(days=days_old)
-            
-            old_interviews = session.query(Interview).filter(
+            old_condition = (
                 Interview.status.in_(['completed', 'restarted']),
                 Interview.completed_at < cutoff_date
-            ).all()
+            )
             
-            count = len(old_interviews)
+            with self.session_scope() as session:
+                total = session.query(func.count(Interview.id)).filter(*old_condition).scalar()
             
-            for interview in old_interviews:
-                session.delete(interview)
+            if archive_dir:
+                from modules.archive import InterviewArchiver
+                archiver = InterviewArchiver(archive_dir, [
+                    Interview.__table__, Response.__table__, AIConsultation.__table__
+                ])
             
-            session.commit()
-            self.logger.info(f"✅ Удалено {count} старых интервью")
-            return count
+            last_id = 0
+            while True:
+                with self.session_scope() as session:
+                    # Keyset-пагинация по ID: каждая пачка читает только свой диапазон
+                    interview_ids = [row.id for row in session.query(Interview.id).filter(
+                        *old_condition, Interview.id > last_id
+                    ).order_by(Interview.id).limit(batch_size)]
+                    
+                    if not interview_ids:
+                        break
+                    
+                    if archiver:
+                        # Архив пачки сбрасывается на диск до фиксации ее удаления
+                        archiver.archive(session, interview_ids)
+                    
+                    if not self._cascade_deletes_supported():
+                        session.query(Response).filter(
+                            Response.interview_id.in_(interview_ids)
+                        ).delete(synchronize_session=False)
+                        session.query(AIConsultation).filter(
+                            AIConsultation.interview_id.in_(interview_ids)
+                        ).delete(synchronize_session=False)
+                    
+                    session.query(Interview).filter(
+                        Interview.id.in_(interview_ids)
+                    ).delete(synchronize_session=False)
+                
+                last_id = interview_ids[-1]
+                deleted += len(interview_ids)
+                self.logger.info(f"🗑 Удалено интервью: {deleted}/{total}")
+                if progress_callback:
+                    progress_callback(deleted, total)
+            
+            if archiver:
+                self.logger.info(f"📦 Архив сохранен в {archive_dir}: {archiver.counts}")
+            self.logger.info(f"✅ Удалено {deleted} старых интервью")
+            return deleted
             
         except Exception as e:
-            if hasattr(self, 'session') and self.session:
-                self.session.rollback()
-            self.logger.error(f"❌ Ошибка очистки старых интервью: {e}")
-            return 0
+            self.logger.error(f"❌ Ошибка очистки старых интервью (удалено до ошибки: {deleted}): {e}")
+            return deleted
+    
+    def _cascade_deletes_supported(self):
+        """Удаляет ли БД дочерние строки сама (ON DELETE CASCADE).
+        
+        В SQLite внешние ключи существующих таблиц нельзя изменить, а их проверка
+        выключена по умолчанию, поэтому там дочерние строки удаляются явно
+        """
+        return self.engine.dialect.name == 'postgresql'
+    
+    # --- Операции обработчиков бота ---
     
-    def __del__(self):
-        """Деструктор - закрывает сессию при удалении объекта"""
+    def start_interview(self, user_id, username):
+        """Переводит старые активные интервью пользователя в 'restarted' и создает новое"""
+        with self.session_scope() as session:
+            active_interviews = session.query(Interview).filter(
+                Interview.user_id == user_id,
+                Interview.status == 'active'
+            ).all()
+            for interview in active_interviews:
+                interview.status = 'restarted'
+                interview.completed_at = datetime.utcnow()
+            
+            new_interview = Interview(
+                user_id=user_id,
+                username=username,
+                started_at=datetime.utcnow()
+            )
+            session.add(new_interview)
+            session.flush()
+            return new_interview
+    
+    def has_response(self, interview_id, question_id):
+        """Проверяет, есть ли уже ответ на вопрос в рамках интервью"""
+        with self.session_scope() as session:
+            return session.query(Response.id).filter(
+                Response.interview_id == interview_id,
+                Response.question_id == question_id
+            ).first() is not None
+    
+    def save_response(self, interview_id, question_id, answer_text, selected_option=None, durable=None):
+        """Сохраняет ответ на вопрос интервью.
+        
+        Возвращает None, если ответ на этот вопрос уже сохранен (уникальный индекс).
+        В режиме отложенной записи с durable=False возвращает Future без ожидания фиксации
+        """
+        def on_duplicate(error):
+            self.logger.warning(f"⚠️ Ответ на вопрос {question_id} в интервью {interview_id} уже сохранен")
+            return None
+        
+        if self.write_behind:
+            future = self.write_behind.submit(interview_id, lambda session: self._insert_response(
+                session, interview_id, question_id, answer_text, selected_option
+            ), on_conflict=on_duplicate)
+            return self._await_write(future, durable)
+        
         try:
-            if hasattr(self, 'session') and self.session:
-                self.session.close()
-        except:
-            pass  # Игнорируем все ошибки в деструкторе
+            with self.session_scope() as session:
+                return self._insert_response(session, interview_id, question_id, answer_text, selected_option)
+                
+        except IntegrityError as e:
+            return on_duplicate(e)
+    
+    def _insert_response(self, session, interview_id, question_id, answer_text, selected_option):
+        """Вставляет ответ и обновляет счетчики интервью в текущей транзакции"""
+        if self.partitioning:
+            lock, duplicate = partitioned_response_guard(interview_id, question_id)
+            session.execute(lock)
+            if session.execute(duplicate).first():
+                raise duplicate_response_error()
+        
+        response = session.execute(
+            response_insert(interview_id, question_id, answer_text, selected_option)
+        ).scalar_one()
+        
+        session.execute(interview_counters_update(
+            interview_id, **response_counter_increments(selected_option)
+        ))
+        return response
+    
+    def _await_write(self, future, durable):
+        """Ждет фиксации отложенной записи, если вызывающему нужно подтверждение"""
+        if durable if durable is not None else self.write_behind_durable:
+            return future.result()
+        return future
+    
+    def _read_your_writes(self, interview_id):
+        """Дожидается фиксации отложенных записей интервью перед чтением"""
+        if self.write_behind:
+            self.write_behind.wait_for_interview(interview_id)
+    
+    def complete_interview(self, interview_id, completed_at=None):
+        """Помечает интервью завершенным и возвращает его вместе со счетчиками"""
+        self._read_your_writes(interview_id)
+        with self.session_scope() as session:
+            interview = session.get(Interview, interview_id)
+            if interview:
+                interview.status = 'completed'
+                interview.completed_at = completed_at or datetime.utcnow()
+            return interview
+    
+    def dispose(self):
+        """Дописывает отложенные записи, закрывает сессии и соединения пула"""
+        if self.write_behind:
+            self.write_behind.close()
+        self.close_session()
+        if self.read_replicas:
+            self.read_replicas.dispose()
+        self.engine.dispose()
@@ -0,0 +1,168 @@
+# modules/dispatcher.py
+from telebot import TeleBot
+import logging
+import queue
+import threading
+import time
+
+# Поля Update, из которых берется пользователь (или чат) для выбора очереди
+UPDATE_FIELDS = (
+    'message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+    'shipping_query', 'pre_checkout_query', 'poll_answer', 'my_chat_member', 'chat_member',
+    'chat_join_request', 'channel_post', 'edited_channel_post',
+)
+
+
+def update_user_key(update):
+    """ID пользователя (или чата), которому принадлежит обновление"""
+    for field in UPDATE_FIELDS:
+        payload = getattr(update, field, None)
+        if payload is None:
+            continue
+        user = getattr(payload, 'from_user', None) or getattr(payload, 'user', None)
+        if user is not None:
+            return user.id
+        chat = getattr(payload, 'chat', None)
+        if chat is not None:
+            return chat.id
+    return update.update_id
+
+
+class Lane:
+    """Очередь и поток, обрабатывающий обновления своих пользователей по одному"""
+
+    def __init__(self, index, max_queue):
+        self.index = index
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.processed = 0
+        self.peak_depth = 0
+        self.thread = None
+
+
+class UserLaneDispatcher:
+    """Раскладывает обновления по очередям (lanes) по ID пользователя.
+
+    Обновления одного пользователя всегда попадают в одну очередь и обрабатываются
+    строго по порядку (двойное нажатие кнопки не обрабатывается параллельно), а
+    разные пользователи распределены по lanes потокам и обслуживаются одновременно.
+    """
+
+    def __init__(self, process, lanes=8, max_queue=100, metrics_interval=0, logger=None):
+        if lanes < 1:
+            raise ValueError("Число очередей должно быть не меньше 1")
+
+        self.process = process
+        self.metrics_interval = metrics_interval
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._metrics_logged = time.monotonic()
+        self.lanes = [Lane(index, max_queue) for index in range(lanes)]
+        for lane in self.lanes:
+            lane.thread = threading.Thread(target=self._run, args=(lane,), daemon=True, name=f"lane-{lane.index}")
+            lane.thread.start()
+
+    def lane_for(self, update):
+        return self.lanes[hash(update_user_key(update)) % len(self.lanes)]
+
+    def submit(self, update, block=True, timeout=None):
+        """Ставит обновление в очередь пользователя; False, если очередь заполнена"""
+        lane = self.lane_for(update)
+        try:
+            lane.queue.put(update, block=block, timeout=timeout)
+        except queue.Full:
+            self.logger.warning(f"⚠️ Очередь {lane.index} переполнена, обновление {update.update_id} отклонено")
+            return False
+
+        depth = lane.queue.qsize()
+        with self._lock:
+            lane.peak_depth = max(lane.peak_depth, depth)
+        return True
+
+    def process_new_updates(self, updates):
+        """Совместим с TeleBot.process_new_updates: при заполненной очереди ждет (притормаживает polling)"""
+        for update in updates:
+            self.submit(update)
+
+    def _run(self, lane):
+        while True:
+            update = lane.queue.get()
+            try:
+                if update is None:
+                    return
+                self.process([update])
+            except Exception as e:
+                self.logger.error(f"❌ Ошибка обработки обновления {update.update_id}: {e}")
+            finally:
+                if update is not None:
+                    with self._lock:
+                        lane.processed += 1
+                lane.queue.task_done()
+
+            if self.metrics_interval:
+                self.maybe_log_metrics()
+
+    def join(self):
+        """Ждет обработки всех поставленных обновлений"""
+        for lane in self.lanes:
+            lane.queue.join()
+
+    def stop(self):
+        """Обрабатывает уже принятые обновления и останавливает потоки"""
+        for lane in self.lanes:
+            lane.queue.put(None)
+        for lane in self.lanes:
+            lane.thread.join()
+
+    def metrics(self):
+        """Глубина очередей сейчас, пиковая глубина и число обработанных обновлений по lanes"""
+        with self._lock:
+            lanes = [{
+                'lane': lane.index,
+                'depth': lane.queue.qsize(),
+                'peak_depth': lane.peak_depth,
+                'processed': lane.processed,
+            } for lane in self.lanes]
+        return {
+            'lanes': lanes,
+            'queued': sum(lane['depth'] for lane in lanes),
+            'max_depth': max(lane['depth'] for lane in lanes),
+            'processed': sum(lane['processed'] for lane in lanes),
+        }
+
+    def maybe_log_metrics(self):
+        with self._lock:
+            if time.monotonic() - self._metrics_logged < self.metrics_interval:
+                return
+            self._metrics_logged = time.monotonic()
+        self.log_metrics()
+
+    def log_metrics(self):
+        """Пишет глубину очередей в лог и сбрасывает пиковые значения"""
+        metrics = self.metrics()
+        with self._lock:
+            for lane in self.lanes:
+                lane.peak_depth = lane.queue.qsize()
+
+        depths = ' '.join(f"{lane['depth']}/{lane['peak_depth']}" for lane in metrics['lanes'])
+        self.logger.info(
+            f"📊 Очереди обновлений: в ожидании {metrics['queued']}, обработано {metrics['processed']}, "
+            f"глубина/пик по lanes: {depths}"
+        )
+
+
+class LaneTeleBot(TeleBot):
+    """TeleBot, который обрабатывает обновления через UserLaneDispatcher вместо общего пула потоков"""
+
+    def __init__(self, token, lanes=8, max_queue=100, metrics_interval=0, **kwargs):
+        super().__init__(token, threaded=False, **kwargs)
+        self.dispatcher = UserLaneDispatcher(
+            super().process_new_updates, lanes=lanes, max_queue=max_queue, metrics_interval=metrics_interval
+        )
+
+    def process_new_updates(self, updates):
+        self.dispatcher.process_new_updates(updates)
+
+    def stop_bot(self):
+        super().stop_bot()
+        self.dispatcher.stop()
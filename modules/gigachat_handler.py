@@ -2,50 +2,252 @@
 import os
 from dotenv import load_dotenv
 from gigachat import GigaChat
+from modules.call_policy import CallPolicy, CircuitBreaker, CircuitOpenError
+import asyncio
 import logging
+import threading
+import time
 
 load_dotenv()
 
+
+class GigaChatLatency:
+    """Сколько времени консультаций ушло на авторизацию (OAuth-токен) и на генерацию ответа"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.consultations = 0
+        self.token_refreshes = 0
+        self.auth_time = 0.0
+        self.generation_time = 0.0
+        self.max_auth_time = 0.0
+
+    def record(self, auth_time, generation_time, refreshed):
+        with self._lock:
+            self.consultations += 1
+            self.token_refreshes += int(refreshed)
+            self.auth_time += auth_time
+            self.generation_time += generation_time
+            self.max_auth_time = max(self.max_auth_time, auth_time)
+
+    def summary(self):
+        with self._lock:
+            total = self.auth_time + self.generation_time
+            return {
+                'consultations': self.consultations,
+                'token_refreshes': self.token_refreshes,
+                'auth_time': self.auth_time,
+                'generation_time': self.generation_time,
+                'max_auth_time': self.max_auth_time,
+                'auth_share': self.auth_time / total if total else 0.0,
+            }
+
+
+class IncompleteAnswerError(Exception):
+    """Поток ответа прервался, когда часть текста уже показана пользователю"""
+
+
 class GigaChatHandler:
+    """Клиент GigaChat. Используйте GigaChatHandler.shared(): один клиент на процесс хранит
+    OAuth-токен до истечения и переиспользует HTTP-соединения (клиент потокобезопасен)"""
+    
+    _shared = None
+    _shared_lock = threading.Lock()
+    
     def __init__(self):
         self.credentials = os.getenv('GIGACHAT_CREDENTIALS')
         if not self.credentials:
             raise ValueError("GIGACHAT_CREDENTIALS не найден в .env файле")
         
+        max_connections = int(os.getenv('GIGACHAT_MAX_CONNECTIONS', '20'))
+        timeout = float(os.getenv('GIGACHAT_TIMEOUT', '30'))
         self.giga = GigaChat(
             credentials=self.credentials,
             scope="GIGACHAT_API_PERS",
             model="GigaChat",
-            verify_ssl_certs=False
+            verify_ssl_certs=False,
+            max_connections=max_connections,
+            timeout=timeout
         )
+        self.latency = GigaChatLatency()
         
         # Настройка логирования
         self.logger = logging.getLogger(__name__)
+        
+        # Срок ответа, предохранитель при сбоях и дублирующие запросы для медленных ответов
+        self.policy = CallPolicy(
+            deadline=timeout,
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv('GIGACHAT_BREAKER_FAILURES', '5')),
+                slow_call_threshold=float(os.getenv('GIGACHAT_BREAKER_SLOW_CALL', '20')) or None,
+                reset_timeout=float(os.getenv('GIGACHAT_BREAKER_RESET', '30')),
+                logger=self.logger
+            ),
+            hedge=os.getenv('GIGACHAT_HEDGE', 'False').lower() == 'true',
+            max_workers=max_connections,
+            metrics_interval=int(os.getenv('GIGACHAT_METRICS_INTERVAL', '0')),
+            logger=self.logger
+        )
+    
+    @classmethod
+    def shared(cls):
+        """Общий для процесса клиент (создается при первой консультации)"""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+        return cls._shared
+    
+    def _authorize(self):
+        """Получает токен (из кэша клиента, пока он не истекает); возвращает время и факт обновления"""
+        started = time.perf_counter()
+        previous = self.giga.token
+        self.giga.get_token()
+        return time.perf_counter() - started, self.giga.token != previous
+    
+    async def _aauthorize(self):
+        started = time.perf_counter()
+        previous = self.giga.token
+        await self.giga.aget_token()
+        return time.perf_counter() - started, self.giga.token != previous
+    
+    def metrics(self):
+        """Состояние предохранителя, перцентили задержек и разбивка времени на авторизацию и генерацию"""
+        return {**self.policy.metrics(), 'timing': self.latency.summary()}
+    
+    def _log_latency(self, user_query, auth_time, generation_time, refreshed):
+        self.latency.record(auth_time, generation_time, refreshed)
+        token_note = "новый токен" if refreshed else "токен из кэша"
+        self.logger.info(
+            f"GigaChat ответил на вопрос: {user_query[:50]}... "
+            f"(авторизация {auth_time:.2f} с, {token_note}; генерация {generation_time:.2f} с)"
+        )
     
-    def get_financial_advice(self, user_query, question_context):
+    def get_financial_advice(self, user_query, question_context, cache=None):
         """
         Получает финансовую консультацию от GigaChat
         
         Args:
             user_query (str): Вопрос пользователя
             question_context (dict): Контекст вопроса с продуктами и рыночной ситуацией
+            cache (ConsultationCache): Кэш ответов на повторяющиеся вопросы (необязательно)
         
         Returns:
             str: Ответ GigaChat
         """
+        cached = self._cached_answer(cache, user_query, question_context)
+        if cached is not None:
+            return cached
+        
         try:
             # Формируем промпт для GigaChat
             prompt = self._build_financial_prompt(user_query, question_context)
             
-            # Отправляем запрос
-            response = self.giga.chat(prompt)
+            # Запрос со сроком ответа и через предохранитель
+            ai_response, auth_time, generation_time, refreshed = self.policy.call(lambda: self._generate(prompt))
             
-            # Извлекаем текст ответа
-            ai_response = response.choices[0].message.content
+            self._log_latency(user_query, auth_time, generation_time, refreshed)
+            if cache is not None:
+                cache.set(question_context, user_query, ai_response)
+            return ai_response
             
-            self.logger.info(f"GigaChat ответил на вопрос: {user_query[:50]}...")
+        except CircuitOpenError:
+            # Предохранитель разомкнут после серии сбоев - не ждем заведомо неудачного ответа
+            return self._get_fallback_response(user_query)
+        except Exception as e:
+            self.logger.error(f"Ошибка GigaChat: {e}")
+            return self._get_fallback_response(user_query)
+    
+    def _generate(self, prompt):
+        """Одна попытка запроса: текст ответа, время авторизации и генерации, факт обновления токена"""
+        # Токен отдельно от генерации, чтобы видеть, на что уходит время
+        auth_time, refreshed = self._authorize()
+        
+        started = time.perf_counter()
+        response = self.giga.chat(prompt)
+        return response.choices[0].message.content, auth_time, time.perf_counter() - started, refreshed
+    
+    async def _agenerate(self, prompt):
+        auth_time, refreshed = await self._aauthorize()
+        
+        started = time.perf_counter()
+        response = await self.giga.achat(prompt)
+        return response.choices[0].message.content, auth_time, time.perf_counter() - started, refreshed
+    
+    def _cached_answer(self, cache, user_query, question_context):
+        if cache is None:
+            return None
+        answer = cache.get(question_context, user_query)
+        if answer is not None:
+            self.logger.info(f"GigaChat: ответ из кэша на вопрос: {user_query[:50]}...")
+        return answer
+    
+    def stream_financial_advice(self, user_query, question_context, cache=None):
+        """Потоковый вариант get_financial_advice: отдает текст ответа частями по мере генерации.
+        
+        Если поток оборвался после первых частей, выбрасывает IncompleteAnswerError
+        (такой ответ не кэшируется)
+        """
+        cached = self._cached_answer(cache, user_query, question_context)
+        if cached is not None:
+            yield cached
+            return
+        
+        received = []
+        try:
+            prompt = self._build_financial_prompt(user_query, question_context)
+            timing = {}
+            for content in self.policy.stream(lambda: self._generate_stream(prompt, timing)):
+                received.append(content)
+                yield content
+            
+            self._log_latency(user_query, timing['auth_time'], time.perf_counter() - timing['started'], timing['refreshed'])
+            if cache is not None and received:
+                cache.set(question_context, user_query, ''.join(received))
+            
+        except CircuitOpenError:
+            yield self._get_fallback_response(user_query)
+        except Exception as e:
+            self.logger.error(f"Ошибка GigaChat: {e}")
+            # Если часть ответа уже показана, резервный текст не дописываем, а сообщаем об обрыве
+            if received:
+                raise IncompleteAnswerError(str(e)) from e
+            yield self._get_fallback_response(user_query)
+    
+    def _generate_stream(self, prompt, timing):
+        timing['auth_time'], timing['refreshed'] = self._authorize()
+        timing['started'] = time.perf_counter()
+        for chunk in self.giga.stream(prompt):
+            content = chunk.choices[0].delta.content
+            if content:
+                yield content
+    
+    async def aget_financial_advice(self, user_query, question_context, cache=None):
+        """Асинхронный вариант get_financial_advice (не блокирует цикл событий на время ответа)"""
+        # Общий уровень кэша ходит в БД синхронно - выносим его в поток
+        if cache is not None and cache.blocking:
+            cached = await asyncio.to_thread(self._cached_answer, cache, user_query, question_context)
+        else:
+            cached = self._cached_answer(cache, user_query, question_context)
+        if cached is not None:
+            return cached
+        
+        try:
+            prompt = self._build_financial_prompt(user_query, question_context)
+            ai_response, auth_time, generation_time, refreshed = await self.policy.acall(
+                lambda: self._agenerate(prompt)
+            )
+            
+            self._log_latency(user_query, auth_time, generation_time, refreshed)
+            if cache is not None and cache.blocking:
+                await asyncio.to_thread(cache.set, question_context, user_query, ai_response)
+            elif cache is not None:
+                cache.set(question_context, user_query, ai_response)
             return ai_response
             
+        except CircuitOpenError:
+            # Предохранитель разомкнут после серии сбоев - не ждем заведомо неудачного ответа
+            return self._get_fallback_response(user_query)
         except Exception as e:
             self.logger.error(f"Ошибка GigaChat: {e}")
             return self._get_fallback_response(user_query)
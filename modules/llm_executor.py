@@ -0,0 +1,107 @@
+# modules/llm_executor.py
+from collections import deque
+from concurrent.futures import Future
+import logging
+import threading
+import time
+
+
+class LLMTicket:
+    """Принятый запрос к LLM: Future с результатом и место в очереди при постановке (0 - выполняется сразу)"""
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.position = 0
+        self.enqueued = time.monotonic()
+
+
+class LLMExecutor:
+    """Отдельный пул для долгих запросов к LLM.
+
+    Одновременно выполняется не больше max_concurrency запросов, еще max_queue ждут
+    в очереди. Обработчики обновлений только ставят запрос и сразу освобождаются,
+    поэтому команды и кнопки отвечают при любой нагрузке на GigaChat. Если очередь
+    заполнена, submit возвращает None.
+    """
+
+    def __init__(self, max_concurrency=4, max_queue=50, logger=None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._cond = threading.Condition()
+        self._waiting = deque()
+        self._stopped = False
+
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_wait = 0.0
+
+        self._workers = [threading.Thread(target=self._run, daemon=True, name=f"llm-{i}")
+                         for i in range(max_concurrency)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, func, *args, **kwargs):
+        """Ставит func(*args, **kwargs) в очередь; LLMTicket или None, если очередь заполнена"""
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Пул LLM остановлен")
+
+            # Запросы сверх max_concurrency (включая еще не взятые потоками) ждут своей очереди
+            position = self.running + len(self._waiting) + 1 - self.max_concurrency
+            if position > self.max_queue:
+                self.rejected += 1
+                self.logger.warning(f"⚠️ Очередь запросов к LLM заполнена ({self.max_queue})")
+                return None
+
+            ticket = LLMTicket(func, args, kwargs)
+            ticket.position = max(position, 0)
+            self._waiting.append(ticket)
+            self._cond.notify()
+            return ticket
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._waiting and not self._stopped:
+                    self._cond.wait()
+                if not self._waiting:
+                    return
+                ticket = self._waiting.popleft()
+                self.running += 1
+                self.max_wait = max(self.max_wait, time.monotonic() - ticket.enqueued)
+
+            try:
+                ticket.future.set_result(ticket.func(*ticket.args, **ticket.kwargs))
+            except Exception as e:
+                self.logger.error(f"❌ Ошибка запроса к LLM: {e}")
+                ticket.future.set_exception(e)
+            finally:
+                with self._cond:
+                    self.running -= 1
+                    self.completed += 1
+                    self._cond.notify_all()
+
+    def shutdown(self, wait=True):
+        """Выполняет принятые запросы и останавливает потоки"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def metrics(self):
+        with self._cond:
+            return {
+                'running': self.running,
+                'waiting': len(self._waiting),
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'max_wait': self.max_wait,
+            }
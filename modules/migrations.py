@@ -0,0 +1,196 @@
+# modules/migrations.py
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, inspect, select, text
+from sqlalchemy.engine import Connection
+from contextlib import contextmanager
+from datetime import datetime
+import logging
+
+# Служебная таблица с примененными версиями схемы (не входит в Base.metadata)
+migrations_metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', migrations_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200)),
+    Column('applied_at', DateTime, default=datetime.utcnow)
+)
+
+MIGRATIONS = []
+
+# Произвольный ключ advisory-блокировки PostgreSQL для миграций
+ADVISORY_LOCK_KEY = 724_530_119
+
+
+class Migration:
+    def __init__(self, version, description, upgrade):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+
+
+def migration(version, description):
+    """Регистрирует функцию миграции схемы.
+
+    Миграции должны быть идемпотентными: на новой БД create_all уже создает
+    актуальную схему, и миграции лишь фиксируют версию.
+    """
+    def decorator(func):
+        MIGRATIONS.append(Migration(version, description, func))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return func
+    return decorator
+
+
+def column_exists(connection, table_name, column_name):
+    """Проверяет наличие колонки в таблице"""
+    return any(column['name'] == column_name for column in inspect(connection).get_columns(table_name))
+
+
+def add_column_if_missing(connection, table_name, column_name, column_ddl):
+    """Добавляет колонку, если ее еще нет (ALTER TABLE ... ADD COLUMN)"""
+    if column_exists(connection, table_name, column_name):
+        return False
+    connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_ddl}"))
+    return True
+
+
+@migration(1, "Индексы для горячих выборок и уникальный ответ на вопрос в интервью")
+def add_lookup_indexes(connection):
+    # Перед созданием уникального индекса убираем дубликаты от двойных нажатий, оставляя первый ответ
+    connection.execute(text(
+        "DELETE FROM responses WHERE id NOT IN ("
+        "SELECT MIN(id) FROM responses GROUP BY interview_id, question_id)"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_interviews_user_status ON interviews (user_id, status)"
+    ))
+    connection.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_responses_interview_question "
+        "ON responses (interview_id, question_id)"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_ai_consultations_interview_question "
+        "ON ai_consultations (interview_id, question_id)"
+    ))
+
+
+@migration(2, "Счетчики ответов, выборов и консультаций в interviews")
+def add_interview_counters(connection):
+    for column_name in ('answered_count', 'choice_a_count', 'choice_b_count', 'consultations_count'):
+        add_column_if_missing(connection, 'interviews', column_name, "INTEGER NOT NULL DEFAULT 0")
+
+    # Заполняем счетчики по уже накопленной истории
+    connection.execute(text(
+        "UPDATE interviews SET "
+        "answered_count = (SELECT COUNT(*) FROM responses r WHERE r.interview_id = interviews.id), "
+        "choice_a_count = (SELECT COUNT(*) FROM responses r "
+        "WHERE r.interview_id = interviews.id AND r.selected_option = 'A'), "
+        "choice_b_count = (SELECT COUNT(*) FROM responses r "
+        "WHERE r.interview_id = interviews.id AND r.selected_option = 'B'), "
+        "consultations_count = (SELECT COUNT(*) FROM ai_consultations c WHERE c.interview_id = interviews.id)"
+    ))
+
+
+@migration(3, "Внешний ключ вопросов для массового импорта")
+def add_question_external_key(connection):
+    add_column_if_missing(connection, 'questions', 'external_key', "VARCHAR(100)")
+    connection.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_questions_external_key ON questions (external_key)"
+    ))
+
+
+@migration(4, "ON DELETE CASCADE для ответов и консультаций интервью")
+def cascade_interview_children(connection):
+    # SQLite не умеет менять внешние ключи: очистка там удаляет дочерние строки явно
+    if connection.dialect.name != 'postgresql':
+        return
+
+    for table_name in ('responses', 'ai_consultations'):
+        for foreign_key in inspect(connection).get_foreign_keys(table_name):
+            if foreign_key['referred_table'] != 'interviews':
+                continue
+            if (foreign_key.get('options') or {}).get('ondelete', '').upper() == 'CASCADE':
+                continue
+            name = foreign_key['name']
+            connection.execute(text(
+                f"ALTER TABLE {table_name} DROP CONSTRAINT {name}, "
+                f"ADD CONSTRAINT {name} FOREIGN KEY (interview_id) "
+                f"REFERENCES interviews (id) ON DELETE CASCADE"
+            ))
+
+
+@migration(5, "Таблица состояний диалогов бота")
+def add_bot_states(connection):
+    from modules.database import BotState
+    BotState.__table__.create(connection, checkfirst=True)
+
+
+@migration(6, "Кэш ответов GigaChat")
+def add_consultation_cache(connection):
+    from modules.database import ConsultationCacheEntry
+    ConsultationCacheEntry.__table__.create(connection, checkfirst=True)
+
+
+@migration(7, "Версия содержимого вопроса в консультациях")
+def add_consultation_question_version(connection):
+    # Для прежних консультаций версия неизвестна: похожие запросы ищутся только среди новых
+    add_column_if_missing(connection, 'ai_consultations', 'question_version', "VARCHAR(16)")
+
+
+class MigrationRunner:
+    def __init__(self, bind, logger=None):
+        # bind - Engine или уже открытое соединение (например, из AsyncConnection.run_sync)
+        self.bind = bind
+        self.logger = logger or logging.getLogger(__name__)
+
+    @contextmanager
+    def _transaction(self):
+        if isinstance(self.bind, Connection):
+            # Транзакцией внешнего соединения управляет вызывающий код
+            yield self.bind
+        else:
+            with self.bind.begin() as connection:
+                yield connection
+
+    def current_version(self):
+        """Последняя примененная версия схемы (0 для неверсионированной БД)"""
+        with self._transaction() as connection:
+            migrations_metadata.create_all(connection)
+            return self._current_version(connection)
+
+    def _current_version(self, connection):
+        version = connection.execute(select(schema_migrations.c.version).order_by(
+            schema_migrations.c.version.desc()
+        ).limit(1)).scalar()
+        return version or 0
+
+    def pending(self, target_version=None):
+        """Миграции, которые еще не применены"""
+        current = self.current_version()
+        return [
+            m for m in MIGRATIONS
+            if m.version > current and (target_version is None or m.version <= target_version)
+        ]
+
+    def upgrade(self, target_version=None):
+        """Применяет недостающие миграции, каждую в отдельной транзакции"""
+        applied = []
+        for m in self.pending(target_version):
+            with self._transaction() as connection:
+                if connection.dialect.name == 'postgresql':
+                    # Несколько процессов бота могут стартовать одновременно
+                    connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': ADVISORY_LOCK_KEY})
+                if self._current_version(connection) >= m.version:
+                    continue
+
+                m.upgrade(connection)
+                connection.execute(schema_migrations.insert().values(
+                    version=m.version,
+                    description=m.description,
+                    applied_at=datetime.utcnow()
+                ))
+
+            applied.append(m.version)
+            self.logger.info(f"✅ Миграция {m.version} применена: {m.description}")
+
+        return applied
@@ -0,0 +1,134 @@
+# modules/partitioning.py
+from sqlalchemy import text
+from datetime import datetime, date
+import logging
+import re
+
+# Таблицы, которые растут только вставками и секционируются по месяцам
+PARTITIONED_TABLES = {
+    'responses': 'ix_responses_interview_question',
+    'ai_consultations': 'ix_ai_consultations_interview_question',
+}
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(value):
+    """Первое число месяца для даты/времени"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    """Сдвигает первое число месяца на months месяцев"""
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table_name, month):
+    return f"{table_name}_p{month.year:04d}{month.month:02d}"
+
+
+def _partition_month(table_name, name):
+    match = re.fullmatch(rf"{table_name}_p(\d{{4}})(\d{{2}})", name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def is_partitioned(connection, table_name):
+    """Является ли таблица секционированной (только PostgreSQL)"""
+    if connection.dialect.name != 'postgresql':
+        return False
+    return connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table_name))"
+    ), {'table_name': table_name}).scalar()
+
+
+def list_partitions(connection, table_name):
+    """Имена секций таблицы"""
+    return [row[0] for row in connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table_name) ORDER BY c.relname"
+    ), {'table_name': table_name})]
+
+
+def ensure_partitions(connection, table_name, first_month, last_month):
+    """Создает месячные секции с first_month по last_month включительно"""
+    created = []
+    existing = set(list_partitions(connection, table_name))
+    month = month_start(first_month)
+    while month <= last_month:
+        name = partition_name(table_name, month)
+        if name not in existing:
+            connection.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {table_name} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def convert_to_partitioned(connection, table_name, months_ahead=2):
+    """Переносит существующую таблицу в секционированную по месяцам поля timestamp.
+
+    Выполняется в транзакции вызывающего кода. Первичный ключ становится (id, timestamp),
+    так как уникальность в секционированной таблице должна включать ключ секционирования.
+    Поэтому уникальный индекс (interview_id, question_id) заменяется обычным, а защиту
+    от повторных ответов обеспечивает DatabaseManager.
+    """
+    legacy = f"{table_name}_unpartitioned"
+    connection.execute(text(f'UPDATE {table_name} SET "timestamp" = now() WHERE "timestamp" IS NULL'))
+    oldest = connection.execute(text(f'SELECT MIN("timestamp") FROM {table_name}')).scalar() or datetime.utcnow()
+
+    connection.execute(text(f"ALTER TABLE {table_name} RENAME TO {legacy}"))
+    connection.execute(text(
+        f'CREATE TABLE {table_name} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")'
+    ))
+    ensure_partitions(connection, table_name, month_start(oldest), add_months(month_start(datetime.utcnow()), months_ahead))
+    # Секция по умолчанию принимает строки вне созданных диапазонов, если обслуживание запоздало
+    connection.execute(text(f"CREATE TABLE {table_name}_default PARTITION OF {table_name} DEFAULT"))
+
+    connection.execute(text(f"INSERT INTO {table_name} SELECT * FROM {legacy}"))
+    sequence = connection.execute(text("SELECT pg_get_serial_sequence(:legacy, 'id')"), {'legacy': legacy}).scalar()
+    if sequence:
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table_name}.id"))
+    connection.execute(text(f"DROP TABLE {legacy}"))
+
+    connection.execute(text(f'ALTER TABLE {table_name} ALTER COLUMN "timestamp" SET NOT NULL'))
+    connection.execute(text(f'ALTER TABLE {table_name} ADD PRIMARY KEY (id, "timestamp")'))
+    connection.execute(text(
+        f"ALTER TABLE {table_name} ADD FOREIGN KEY (interview_id) REFERENCES interviews (id) ON DELETE CASCADE"
+    ))
+    connection.execute(text(f"ALTER TABLE {table_name} ADD FOREIGN KEY (question_id) REFERENCES questions (id)"))
+    connection.execute(text(
+        f"CREATE INDEX {PARTITIONED_TABLES[table_name]} ON {table_name} (interview_id, question_id)"
+    ))
+    logger.info(f"✅ Таблица {table_name} переведена на помесячные секции")
+
+
+def setup_partitioning(connection, months_ahead=2):
+    """Секционирует таблицы (если еще не секционированы) и создает секции на months_ahead месяцев вперед"""
+    created = []
+    current = month_start(datetime.utcnow())
+    for table_name in PARTITIONED_TABLES:
+        if not is_partitioned(connection, table_name):
+            convert_to_partitioned(connection, table_name, months_ahead)
+        created += ensure_partitions(connection, table_name, current, add_months(current, months_ahead))
+    return created
+
+
+def drop_old_partitions(connection, retention_months, detach_only=False):
+    """Отсоединяет (и удаляет) секции, целиком лежащие старше retention_months месяцев"""
+    cutoff = add_months(month_start(datetime.utcnow()), -retention_months)
+    removed = []
+    for table_name in PARTITIONED_TABLES:
+        for name in list_partitions(connection, table_name):
+            month = _partition_month(table_name, name)
+            if month is None or add_months(month, 1) > cutoff:
+                continue
+            connection.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {name}"))
+            if not detach_only:
+                connection.execute(text(f"DROP TABLE {name}"))
+            removed.append(name)
+    return removed
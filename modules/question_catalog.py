@@ -0,0 +1,121 @@
+# modules/question_catalog.py
+import os
+import random
+import threading
+import time
+
+
+class CatalogSnapshot:
+    """Неизменяемый снимок активных вопросов, упорядоченных по ID"""
+
+    def __init__(self, questions):
+        self.questions = tuple(sorted(questions, key=lambda q: q.id))
+        self.by_id = {q.id: q for q in self.questions}
+        # Массивы вопросов по категориям для случайной выборки за O(1)
+        by_category = {}
+        for question in self.questions:
+            by_category.setdefault(question.category, []).append(question)
+        self.by_category = {category: tuple(questions) for category, questions in by_category.items()}
+
+    @property
+    def total(self):
+        return len(self.questions)
+
+    def get(self, question_id):
+        return self.by_id.get(question_id)
+
+    def next_question(self, answered_ids):
+        """Первый по порядку ID вопрос, которого нет среди отвеченных"""
+        for question in self.questions:
+            if question.id not in answered_ids:
+                return question
+        return None
+
+    def random_question(self, category=None, exclude_ids=None, attempts=8, rng=random):
+        """Случайный вопрос (из категории), кроме exclude_ids.
+
+        Сначала несколько случайных попыток, и только если все они попали в исключенные
+        вопросы, выбор идет из отфильтрованного списка.
+        """
+        pool = self.questions if category is None else self.by_category.get(category, ())
+        if not pool:
+            return None
+        if not exclude_ids:
+            return rng.choice(pool)
+
+        for _ in range(attempts):
+            question = rng.choice(pool)
+            if question.id not in exclude_ids:
+                return question
+
+        remaining = [question for question in pool if question.id not in exclude_ids]
+        return rng.choice(remaining) if remaining else None
+
+
+class QuestionCatalog:
+    """Кэш активных вопросов на уровне процесса.
+
+    Вопросы загружаются один раз и хранятся как отсоединенные от сессии объекты,
+    которые нельзя изменять. Кэш сбрасывается при добавлении и деактивации вопросов
+    через DatabaseManager, а ttl ограничивает устаревание при изменениях из других процессов.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._generation = 0
+
+    def snapshot(self):
+        """Текущий снимок или None, если кэш пуст или устарел"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        if self.ttl and time.monotonic() - self._loaded_at > self.ttl:
+            return None
+        return snapshot
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def replace(self, questions, generation=None):
+        """Сохраняет загруженные вопросы, если кэш не сбросили во время загрузки"""
+        snapshot = CatalogSnapshot(questions)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return snapshot
+            self._snapshot = snapshot
+            self._loaded_at = time.monotonic()
+        return snapshot
+
+    def get_or_load(self, loader):
+        """Возвращает снимок, при необходимости загружая вопросы через loader()"""
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            return snapshot
+
+        generation = self._generation
+        return self.replace(loader(), generation)
+
+    def invalidate(self):
+        """Сбрасывает кэш (вызывается при изменении набора вопросов)"""
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_question_catalog(db_url):
+    """Общий для процесса каталог вопросов конкретной базы данных"""
+    with _catalogs_lock:
+        catalog = _catalogs.get(db_url)
+        if catalog is None:
+            ttl = float(os.getenv('QUESTION_CATALOG_TTL', '300'))
+            catalog = QuestionCatalog(ttl=ttl)
+            _catalogs[db_url] = catalog
+        return catalog
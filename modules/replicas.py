@@ -0,0 +1,107 @@
+# modules/replicas.py
+from sqlalchemy import create_engine, select, text
+from datetime import datetime
+import logging
+import threading
+import time
+
+# Отставание реплики PostgreSQL: 0, если все полученные изменения уже применены
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def parse_replica_urls(value):
+    """Список URL реплик из строки через запятую (или из готового списка)"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [url.strip() for url in value if url and url.strip()]
+
+
+def _latest_interview_started_at(connection):
+    from modules.database import Interview
+
+    return connection.execute(
+        select(Interview.started_at).order_by(Interview.id.desc()).limit(1)
+    ).scalar()
+
+
+class ReadReplicaRouter:
+    """Выбор реплики только для чтения для аналитических запросов.
+
+    Реплики перебираются по кругу; реплика, отстающая больше max_lag секунд
+    или недоступная, пропускается. Если подходящей реплики нет, возвращается None,
+    и чтение идет с основной БД.
+    """
+
+    def __init__(self, urls, primary_engine, max_lag=30, check_interval=5, engine_factory=None, logger=None):
+        self.primary_engine = primary_engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.logger = logger or logging.getLogger(__name__)
+
+        engine_factory = engine_factory or create_engine
+        self.engines = [engine_factory(url) for url in urls]
+        self._lock = threading.Lock()
+        self._next = 0
+        self._checked = {}
+
+    def lag_seconds(self, engine):
+        """Отставание реплики в секундах.
+
+        PostgreSQL сообщает его сам; для остальных СУБД (например, копии SQLite-файла)
+        сравнивается время начала последнего интервью на основной БД и на реплике.
+        """
+        with engine.connect() as connection:
+            if engine.dialect.name == 'postgresql':
+                return float(connection.execute(POSTGRES_LAG_QUERY).scalar() or 0)
+            replica_latest = _latest_interview_started_at(connection)
+
+        with self.primary_engine.connect() as connection:
+            primary_latest = _latest_interview_started_at(connection)
+
+        if primary_latest is None:
+            return 0.0
+        if replica_latest is None:
+            replica_latest = datetime.min
+        return max((primary_latest - replica_latest).total_seconds(), 0.0)
+
+    def is_fresh(self, engine):
+        """Доступна ли реплика и укладывается ли ее отставание в max_lag (результат кэшируется)"""
+        now = time.monotonic()
+        checked = self._checked.get(engine)
+        if checked and now - checked[0] < self.check_interval:
+            return checked[1]
+
+        try:
+            lag = self.lag_seconds(engine)
+            fresh = lag <= self.max_lag
+            if not fresh:
+                self.logger.warning(f"⚠️ Реплика {engine.url} отстает на {lag:.1f} с, пропускаем")
+        except Exception as e:
+            self.logger.warning(f"⚠️ Реплика {engine.url} недоступна: {e}")
+            fresh = False
+
+        self._checked[engine] = (now, fresh)
+        return fresh
+
+    def choose(self):
+        """Следующая актуальная реплика или None"""
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % max(len(self.engines), 1)
+
+        for offset in range(len(self.engines)):
+            engine = self.engines[(start + offset) % len(self.engines)]
+            if self.is_fresh(engine):
+                return engine
+        return None
+
+    def dispose(self):
+        for engine in self.engines:
+            engine.dispose()
@@ -0,0 +1,256 @@
+# modules/send_scheduler.py
+from telebot.apihelper import ApiTelegramException
+from collections import deque
+from concurrent.futures import Future
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+# Приоритеты отправки: ответы пользователю раньше массовых рассылок
+INTERACTIVE = 0
+BULK = 1
+
+
+class TokenBucket:
+    """Ведро токенов: rate отправок в секунду с запасом capacity на всплеск"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def is_full(self, now):
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Через сколько секунд появится токен"""
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class SendJob:
+    """Запрос к Telegram API в очереди: вызов func(*args, **kwargs) и Future с результатом"""
+
+    def __init__(self, seq, chat_id, func, args, kwargs, priority):
+        self.seq = seq
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future = Future()
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+
+class ChatQueue:
+    """Очередь одного чата: запросы уходят строго по порядку, не чаще лимита чата"""
+
+    def __init__(self, rate, burst):
+        self.jobs = deque()
+        self.bucket = TokenBucket(rate, burst)
+        self.blocked_until = 0  # до этого момента Telegram просил не писать в чат (retry_after)
+        self.scheduled = False  # чат стоит в очереди планировщика или его запрос выполняется
+
+
+class SendScheduler:
+    """Центральная очередь исходящих запросов к Telegram.
+
+    Ограничивает частоту глобально (global_rate в секунду) и для каждого чата
+    (chat_rate с запасом chat_burst), при ответе 429 ждет retry_after и повторяет
+    запрос. Из готовых к отправке чатов первым обслуживается чат с более высоким
+    приоритетом (INTERACTIVE раньше BULK), внутри чата порядок сохраняется.
+    """
+
+    def __init__(self, global_rate=30, chat_rate=1, chat_burst=3, workers=4, max_retries=3,
+                 latency_window=1000, logger=None):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._global = TokenBucket(global_rate, max(1, global_rate))
+        self._chats = {}
+        self._ready = []  # (приоритет, порядковый номер, chat_id) чатов с запросами
+        self._pending = {INTERACTIVE: 0, BULK: 0}
+        self._stopped = False
+        self._swept = time.monotonic()
+
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.latencies = deque(maxlen=latency_window)
+
+        self._workers = [threading.Thread(target=self._run, daemon=True, name=f"send-{i}") for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, chat_id, func, *args, priority=INTERACTIVE, **kwargs):
+        """Ставит вызов func(*args, **kwargs) в очередь чата и возвращает Future с его результатом"""
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Очередь отправки остановлена")
+
+            job = SendJob(next(self._seq), chat_id, func, args, kwargs, priority)
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = ChatQueue(self.chat_rate, self.chat_burst)
+            chat.jobs.append(job)
+            self._pending[priority] = self._pending.get(priority, 0) + 1
+            self._schedule(chat_id, chat)
+            self._cond.notify()
+        return job.future
+
+    def _schedule(self, chat_id, chat):
+        if chat.jobs and not chat.scheduled:
+            head = chat.jobs[0]
+            heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+            chat.scheduled = True
+
+    def _next_job(self, now):
+        """Первый по приоритету запрос чата, которому уже можно писать; иначе время ожидания"""
+        global_delay = self._global.delay(now)
+        if global_delay:
+            return None, global_delay
+
+        waiting = []
+        job = None
+        wait = None
+        while self._ready:
+            entry = heapq.heappop(self._ready)
+            chat = self._chats[entry[2]]
+            delay = max(chat.blocked_until - now, chat.bucket.delay(now))
+            if delay <= 0:
+                job = chat.jobs.popleft()
+                chat.bucket.take(now)
+                self._global.take(now)
+                break
+            waiting.append(entry)
+            wait = delay if wait is None else min(wait, delay)
+
+        for entry in waiting:
+            heapq.heappush(self._ready, entry)
+        return job, wait
+
+    def _sweep(self, now, interval=60):
+        """Забывает простаивающие чаты, лимиты которых уже полностью восстановились"""
+        if now - self._swept < interval:
+            return
+        self._swept = now
+        idle = [chat_id for chat_id, chat in self._chats.items()
+                if not chat.scheduled and chat.blocked_until <= now and chat.bucket.is_full(now)]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    job, wait = self._next_job(time.monotonic())
+                    if job is not None:
+                        break
+                    if self._stopped and not self._ready:
+                        return
+                    self._cond.wait(wait)
+                self.in_flight += 1
+
+            self._execute(job)
+
+    def _execute(self, job):
+        job.attempts += 1
+        try:
+            result = job.func(*job.args, **job.kwargs)
+        except ApiTelegramException as e:
+            if e.error_code == 429 and job.attempts <= self.max_retries:
+                retry_after = (e.result_json.get('parameters') or {}).get('retry_after', 1)
+                self.logger.warning(f"⚠️ Telegram ограничил отправку в чат {job.chat_id}, повтор через {retry_after} сек")
+                self._requeue(job, retry_after)
+                return
+            self._finish(job, error=e)
+        except Exception as e:
+            self._finish(job, error=e)
+        else:
+            self._finish(job, result=result)
+
+    def _requeue(self, job, retry_after):
+        with self._cond:
+            chat = self._chats[job.chat_id]
+            chat.blocked_until = time.monotonic() + retry_after
+            chat.jobs.appendleft(job)
+            chat.scheduled = False
+            self._schedule(job.chat_id, chat)
+            self.rate_limited += 1
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def _finish(self, job, result=None, error=None):
+        with self._cond:
+            chat = self._chats[job.chat_id]
+            chat.scheduled = False
+            self._schedule(job.chat_id, chat)
+            self._sweep(time.monotonic())
+
+            self._pending[job.priority] -= 1
+            self.in_flight -= 1
+            if error is None:
+                self.sent += 1
+                self.latencies.append(time.monotonic() - job.enqueued)
+            else:
+                self.failed += 1
+            self._cond.notify_all()
+
+        if error is None:
+            job.future.set_result(result)
+        else:
+            self.logger.error(f"❌ Ошибка отправки в чат {job.chat_id}: {error}")
+            job.future.set_exception(error)
+
+    def flush(self, timeout=None):
+        """Ждет отправки всех поставленных запросов"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while sum(self._pending.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Отправляет оставшиеся запросы и останавливает потоки"""
+        self.flush(timeout)
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def metrics(self):
+        """Незавершенные запросы по приоритетам и задержка от постановки до отправки (сек)"""
+        with self._cond:
+            latencies = sorted(self.latencies)
+            return {
+                'pending': {'interactive': self._pending[INTERACTIVE], 'bulk': self._pending[BULK]},
+                'in_flight': self.in_flight,
+                'chats': len(self._chats),
+                'sent': self.sent,
+                'failed': self.failed,
+                'rate_limited': self.rate_limited,
+                'latency_avg': sum(latencies) / len(latencies) if latencies else 0.0,
+                'latency_p95': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+                'latency_max': latencies[-1] if latencies else 0.0,
+            }
@@ -0,0 +1,201 @@
+# modules/similarity_index.py
+from sqlalchemy import select
+from collections import Counter
+from modules.consultation_cache import normalize_query, question_version
+from modules import bot_messages as texts
+import logging
+import math
+import threading
+import numpy as np
+
+# Заголовок, с которым ответ GigaChat сохраняется в ai_consultations
+ANSWER_PREFIX = texts.consultation_text("")
+# Резервный ответ GigaChatHandler при ошибке - такие консультации в индекс не попадают
+FALLBACK_MARKER = "Консультация временно недоступна"
+# Прерванные ответы сохраняются с пометкой и тоже не переиспользуются
+INCOMPLETE_MARKER = texts.INCOMPLETE_ANSWER_TEXT
+
+
+def char_ngrams(text, n_min=3, n_max=5):
+    """Символьные n-граммы нормализованного запроса (с пробелами по краям слов)"""
+    text = f" {normalize_query(text)} "
+    return [text[i:i + n] for n in range(n_min, n_max + 1) for i in range(len(text) - n + 1)]
+
+
+def answer_from_history(ai_response):
+    """Текст ответа GigaChat из сохраненной консультации; None для ошибок, резервных и прерванных ответов"""
+    if not ai_response or not ai_response.startswith(ANSWER_PREFIX):
+        return None
+    if FALLBACK_MARKER in ai_response or INCOMPLETE_MARKER in ai_response:
+        return None
+    return ai_response[len(ANSWER_PREFIX):]
+
+
+class QueryIndex:
+    """TF-IDF по символьным n-граммам запросов к одному вопросу.
+
+    Векторы документов нормированы и хранятся инвертированным индексом в массивах
+    NumPy (для каждой n-граммы - документы и веса), поэтому память растет с числом
+    ненулевых весов, а поиск складывает веса только общих с запросом n-грамм.
+    """
+
+    def __init__(self, queries):
+        self.size = len(queries)
+        grams = [Counter(char_ngrams(query)) for query in queries]
+
+        document_frequency = Counter()
+        for counts in grams:
+            document_frequency.update(counts.keys())
+        self.vocabulary = {gram: column for column, gram in enumerate(document_frequency)}
+        self.idf = np.array([self._idf(document_frequency[gram]) for gram in self.vocabulary], dtype=np.float32)
+
+        columns, documents, weights = [], [], []
+        for document, counts in enumerate(grams):
+            doc_columns = np.array([self.vocabulary[gram] for gram in counts], dtype=np.int32)
+            doc_weights = np.array(list(counts.values()), dtype=np.float32) * self.idf[doc_columns]
+            norm = np.linalg.norm(doc_weights)
+            if norm:
+                doc_weights /= norm
+            columns.append(doc_columns)
+            documents.append(np.full(len(doc_columns), document, dtype=np.int32))
+            weights.append(doc_weights)
+
+        columns = np.concatenate(columns) if columns else np.zeros(0, dtype=np.int32)
+        order = np.argsort(columns, kind='stable')
+        self.documents = np.concatenate(documents)[order] if documents else np.zeros(0, dtype=np.int32)
+        self.weights = np.concatenate(weights)[order] if weights else np.zeros(0, dtype=np.float32)
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(columns, minlength=len(self.vocabulary)))))
+
+    def _idf(self, frequency):
+        return math.log((1 + self.size) / (1 + frequency)) + 1
+
+    def scores(self, query):
+        """Косинусная близость запроса ко всем документам индекса"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        counts = Counter(char_ngrams(query))
+        if not self.size or not counts:
+            return scores
+
+        # Неизвестные индексу n-граммы не совпадают ни с чем, но уменьшают близость через норму запроса
+        norm = math.sqrt(sum(
+            (count * (self.idf[self.vocabulary[gram]] if gram in self.vocabulary else self._idf(0))) ** 2
+            for gram, count in counts.items()
+        ))
+        for gram, count in counts.items():
+            column = self.vocabulary.get(gram)
+            if column is None:
+                continue
+            start, end = self.indptr[column], self.indptr[column + 1]
+            scores[self.documents[start:end]] += count * self.idf[column] / norm * self.weights[start:end]
+        return scores
+
+    def best(self, query):
+        """(близость, номер документа) самого похожего запроса или (0, None)"""
+        scores = self.scores(query)
+        if not len(scores):
+            return 0.0, None
+        document = int(np.argmax(scores))
+        return float(scores[document]), document
+
+
+class SimilarConsultations:
+    """Ответы на похожие прошлые запросы к тому же вопросу.
+
+    Записи хранятся по (ID вопроса, версия его содержимого): после правки текста или
+    продуктов ответы на прежнюю версию не выдаются. История версии (последние
+    max_entries успешных ответов GigaChat) загружается при первом обращении вне общей
+    блокировки, новые ответы добавляются через add; индекс перестраивается лениво
+    при следующем поиске.
+    """
+
+    def __init__(self, threshold=0.8, max_entries=500, session_factory=None, logger=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.session_factory = session_factory
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._entries = {}      # (question_id, версия) -> {нормализованный запрос: (запрос, ответ)}
+        self._indexes = {}
+        self._generations = {}  # изменения записей, чтобы не сохранить индекс, устаревший за время построения
+        self.lookups = 0
+        self.hits = 0
+
+    def _key(self, question_context):
+        return question_context.get('question_id'), question_version(question_context)
+
+    def _load(self, key):
+        from modules.database import AIConsultation
+
+        entries = {}
+        if self.session_factory is not None:
+            question_id, version = key
+            with self.session_factory() as session:
+                rows = session.execute(
+                    select(AIConsultation.user_query, AIConsultation.ai_response)
+                    .where(AIConsultation.question_id == question_id, AIConsultation.question_version == version)
+                    .order_by(AIConsultation.id.desc())
+                    .limit(self.max_entries * 2)
+                ).all()
+            # Идем от старых к новым, чтобы для одинаковых запросов остался последний ответ
+            for user_query, ai_response in reversed(rows):
+                answer = answer_from_history(ai_response)
+                if answer is not None:
+                    entries[normalize_query(user_query)] = (user_query, answer)
+        return entries
+
+    def _question_entries(self, key):
+        """Записи версии вопроса; история из БД читается без блокировки, чтобы не задерживать другие вопросы"""
+        with self._lock:
+            entries = self._entries.get(key)
+        if entries is None:
+            loaded = self._load(key)
+            with self._lock:
+                entries = self._entries.setdefault(key, loaded)
+        return entries
+
+    def find(self, question_context, user_query):
+        """Ответ на самый похожий прошлый запрос к той же версии вопроса, если близость не ниже порога"""
+        key = self._key(question_context)
+        entries = self._question_entries(key)
+        with self._lock:
+            self.lookups += 1
+            index = self._indexes.get(key)
+            generation = self._generations.get(key, 0)
+            items = list(entries.values())[-self.max_entries:] if index is None else None
+
+        if index is None:
+            if not items:
+                return None
+            index = (QueryIndex([query for query, _ in items]), items)
+            with self._lock:
+                if self._generations.get(key, 0) == generation and self._entries.get(key) is entries:
+                    self._indexes[key] = index
+
+        score, document = index[0].best(user_query)
+        if document is None or score < self.threshold:
+            return None
+        with self._lock:
+            self.hits += 1
+        matched_query, answer = index[1][document]
+
+        self.logger.info(f"🔎 Похожий запрос ({score:.2f}): «{user_query[:50]}» ≈ «{matched_query[:50]}»")
+        return answer
+
+    def add(self, question_context, user_query, answer):
+        key = self._key(question_context)
+        entries = self._question_entries(key)
+        with self._lock:
+            entries.pop(normalize_query(user_query), None)
+            entries[normalize_query(user_query)] = (user_query, answer)
+            while len(entries) > self.max_entries:
+                del entries[next(iter(entries))]
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._indexes.pop(key, None)
+
+    def invalidate_question(self, question_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == question_id]:
+                del self._entries[key]
+                self._indexes.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
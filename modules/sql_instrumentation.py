@@ -0,0 +1,217 @@
+# modules/sql_instrumentation.py
+from sqlalchemy import event
+from telebot.handler_backends import BaseMiddleware
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import heapq
+import logging
+import re
+import threading
+import time
+
+# Методы, возвращающие сессии и движки (их запросы выполняются уже после выхода из метода),
+# и разовые операции со схемой, которые только засоряли бы статистику
+NOT_INSTRUMENTED_METHODS = {
+    'session_scope', 'read_session_scope', 'get_session', 'get_read_session', 'close_session',
+    'read_engine', 'dispose', 'create_tables', 'migrate', 'setup_partitioning', 'get_schema_version',
+}
+
+# Хвост callback_data с выбором и ID вопроса: choose_A_12 -> choose
+CALLBACK_SUFFIX = re.compile(r'(_[AB])?_\d+$')
+
+_active_units = ContextVar('sql_instrumentation_units', default=())
+
+
+class UnitStats:
+    """Запросы одной единицы работы: обновления бота или вызова метода DatabaseManager"""
+
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+        self.token = None
+
+    def record(self, statement, duration):
+        self.queries += 1
+        self.db_time += duration
+        self.statements[statement] += 1
+
+
+class QueryProfiler:
+    """Счетчики SQL-запросов по обновлениям бота и методам DatabaseManager.
+
+    Подключается к событиям before/after_cursor_execute движка. Для каждой единицы
+    работы считает число запросов и время в БД, повторяющиеся одинаковые запросы
+    внутри одной единицы помечает как возможный N+1 и раз в summary_interval секунд
+    пишет сводку в лог.
+    """
+
+    def __init__(self, summary_interval=60, slow_top=5, n_plus_one_threshold=3, logger=None):
+        self.summary_interval = summary_interval
+        self.slow_top = slow_top
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._window_started = time.monotonic()
+        self._reset()
+
+    def _reset(self):
+        self.totals = {}
+        self.slowest = []
+        self.n_plus_one = Counter()
+
+    def attach(self, engine):
+        """Подписывается на события выполнения запросов движка"""
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_cursor_execute(self, connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, connection, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - connection.info['query_started'].pop()
+        units = _active_units.get()
+        for unit in units:
+            unit.record(statement, duration)
+
+        owner = units[-1].name if units else '-'
+        with self._lock:
+            entry = (duration, owner, ' '.join(statement.split())[:200])
+            if len(self.slowest) < self.slow_top:
+                heapq.heappush(self.slowest, entry)
+            else:
+                heapq.heappushpop(self.slowest, entry)
+
+    @contextmanager
+    def unit(self, kind, name):
+        """Единица работы, к которой относятся выполненные внутри запросы"""
+        stats = self.begin(kind, name)
+        try:
+            yield stats
+        finally:
+            self.end(stats)
+
+    def begin(self, kind, name):
+        stats = UnitStats(kind, name)
+        stats.token = _active_units.set(_active_units.get() + (stats,))
+        return stats
+
+    def end(self, stats):
+        _active_units.reset(stats.token)
+
+        suspects = [(statement, count) for statement, count in stats.statements.items()
+                    if count >= self.n_plus_one_threshold]
+        for statement, count in suspects:
+            self.logger.warning(f"⚠️ Возможный N+1 в {stats.name}: {count}× {' '.join(statement.split())[:120]}")
+
+        with self._lock:
+            total = self.totals.setdefault((stats.kind, stats.name), {
+                'calls': 0, 'queries': 0, 'db_time': 0.0, 'max_queries': 0
+            })
+            total['calls'] += 1
+            total['queries'] += stats.queries
+            total['db_time'] += stats.db_time
+            total['max_queries'] = max(total['max_queries'], stats.queries)
+            if suspects:
+                self.n_plus_one[stats.name] += 1
+
+        self.maybe_log_summary()
+
+    def summary(self):
+        """Снимок накопленной статистики за текущий период"""
+        with self._lock:
+            return {
+                'units': {key: dict(value) for key, value in self.totals.items()},
+                'slowest': sorted(self.slowest, reverse=True),
+                'n_plus_one': dict(self.n_plus_one),
+            }
+
+    def maybe_log_summary(self):
+        if time.monotonic() - self._window_started >= self.summary_interval:
+            self.log_summary()
+
+    def log_summary(self):
+        """Пишет сводку за период в лог и начинает новый период"""
+        summary = self.summary()
+        with self._lock:
+            self._window_started = time.monotonic()
+            self._reset()
+
+        if not summary['units']:
+            return
+        self.logger.info("📊 SQL-статистика за период:")
+        ranked = sorted(summary['units'].items(), key=lambda item: item[1]['db_time'], reverse=True)
+        for (kind, name), total in ranked:
+            self.logger.info(
+                f"   {kind} {name}: вызовов {total['calls']}, "
+                f"запросов {total['queries'] / total['calls']:.1f} в среднем (макс. {total['max_queries']}), "
+                f"в БД {total['db_time'] * 1000:.1f} мс"
+            )
+        for duration, owner, statement in summary['slowest']:
+            self.logger.info(f"   🐢 {duration * 1000:.1f} мс [{owner}] {statement}")
+        for name, count in summary['n_plus_one'].items():
+            self.logger.info(f"   ⚠️ N+1 в {name}: {count} раз")
+
+
+def instrument_methods(manager, profiler):
+    """Оборачивает публичные методы менеджера БД в единицы работы профилировщика"""
+    prefix = type(manager).__name__
+    for name in dir(type(manager)):
+        if name.startswith('_') or name in NOT_INSTRUMENTED_METHODS:
+            continue
+        method = getattr(manager, name)
+        if not callable(method):
+            continue
+        setattr(manager, name, _instrumented(profiler, f"{prefix}.{name}", method))
+
+
+def _instrumented(profiler, unit_name, method):
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        with profiler.unit('method', unit_name):
+            return method(*args, **kwargs)
+    return wrapper
+
+
+def update_name(update_type, update):
+    """Имя обновления для статистики: команда, 'text' или префикс callback_data"""
+    if update_type == 'callback_query':
+        return f"callback:{CALLBACK_SUFFIX.sub('', update.data or '')}"
+    text = getattr(update, 'text', None) or ''
+    if text.startswith('/'):
+        return f"message:{text.split()[0]}"
+    return 'message:text'
+
+
+class QueryProfilerMiddleware(BaseMiddleware):
+    """Middleware TeleBot: каждое обновление становится единицей работы профилировщика"""
+
+    def __init__(self, profiler):
+        super().__init__()
+        self.profiler = profiler
+        self.update_sensitive = True
+        self.update_types = ['message', 'callback_query']
+
+    def _begin(self, update_type, update, data):
+        data['sql_unit'] = self.profiler.begin('update', update_name(update_type, update))
+
+    def _end(self, data):
+        if 'sql_unit' in data:
+            self.profiler.end(data.pop('sql_unit'))
+
+    def pre_process_message(self, message, data):
+        self._begin('message', message, data)
+
+    def post_process_message(self, message, data, exception):
+        self._end(data)
+
+    def pre_process_callback_query(self, call, data):
+        self._begin('callback_query', call, data)
+
+    def post_process_callback_query(self, call, data, exception):
+        self._end(data)
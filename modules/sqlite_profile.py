@@ -0,0 +1,41 @@
+# modules/sqlite_profile.py
+from sqlalchemy import event
+import os
+
+
+def is_file_sqlite(db_url):
+    """SQLite-база в файле (для :memory: профиль не нужен)"""
+    return db_url.startswith('sqlite') and ':memory:' not in db_url and not db_url.rstrip('/').endswith(':')
+
+
+def sqlite_profile_pragmas():
+    """PRAGMA профиля SQLite для многопоточного бота на одном сервере.
+
+    WAL позволяет читать параллельно с записью, synchronous=NORMAL в режиме WAL
+    не теряет целостность при сбое процесса, busy_timeout заставляет писателей
+    ждать блокировку вместо ошибки "database is locked".
+    """
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.getenv('DB_SQLITE_BUSY_TIMEOUT_MS') or 5000),
+        'mmap_size': int(os.getenv('DB_SQLITE_MMAP_SIZE') or 256 * 1024 * 1024),
+        # Отрицательное значение задает размер кэша страниц в КиБ
+        'cache_size': -int(os.getenv('DB_SQLITE_CACHE_KB') or 64 * 1024),
+    }
+
+
+def apply_sqlite_profile(engine, pragmas=None):
+    """Выполняет PRAGMA профиля на каждом новом соединении движка"""
+    pragmas = pragmas or sqlite_profile_pragmas()
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return pragmas
@@ -0,0 +1,195 @@
+# modules/state_store.py
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import threading
+import time
+
+# Ключи состояний диалога
+TEXT_ANSWER = 'text_answer'          # ID вопроса, на который ожидается текстовый ответ
+AI_CONSULTATION = 'ai_consultation'  # ID вопроса, по которому ожидается вопрос к GigaChat
+
+
+class MemoryStateStore:
+    """Состояния в памяти процесса: LRU по пользователям и TTL для брошенных диалогов"""
+
+    # Обращения не ждут ввода-вывода, асинхронный обработчик может вызывать методы напрямую
+    blocking = False
+
+    def __init__(self, ttl=3600, max_users=10000):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+    def get(self, user_id, key):
+        with self._lock:
+            states = self._users.get(user_id)
+            if not states or key not in states:
+                return None
+            value, expires_at = states[key]
+            if expires_at <= time.monotonic():
+                del states[key]
+                if not states:
+                    del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+            return value
+
+    def set(self, user_id, key, value, ttl=None):
+        with self._lock:
+            states = self._users.setdefault(user_id, {})
+            states[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self._users.move_to_end(user_id)
+            # Вытесняем давно не активных пользователей
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def pop(self, user_id, key):
+        """Возвращает и удаляет состояние за одну операцию: два обработчика не получат одно значение"""
+        with self._lock:
+            states = self._users.get(user_id)
+            if not states or key not in states:
+                return None
+            value, expires_at = states.pop(key)
+            if not states:
+                del self._users[user_id]
+            return value if expires_at > time.monotonic() else None
+
+    def delete(self, user_id, key):
+        with self._lock:
+            states = self._users.get(user_id)
+            if states:
+                states.pop(key, None)
+                if not states:
+                    del self._users[user_id]
+
+    def clear(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def purge_expired(self):
+        """Удаляет истекшие состояния, возвращает их число"""
+        now = time.monotonic()
+        removed = 0
+        with self._lock:
+            for user_id in list(self._users):
+                states = self._users[user_id]
+                for key in [key for key, (_, expires_at) in states.items() if expires_at <= now]:
+                    del states[key]
+                    removed += 1
+                if not states:
+                    del self._users[user_id]
+        return removed
+
+
+class SQLStateStore:
+    """Состояния в таблице bot_states: переживают перезапуск и общие для нескольких процессов"""
+
+    blocking = True
+
+    def __init__(self, session_factory, ttl=3600, purge_interval=300, logger=None):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self._last_purge = time.monotonic()
+
+    def get(self, user_id, key):
+        from modules.database import BotState
+
+        with self.session_factory() as session:
+            value = session.execute(select(BotState.value).where(
+                BotState.user_id == user_id,
+                BotState.key == key,
+                BotState.expires_at > datetime.utcnow()
+            )).scalar()
+        return json.loads(value) if value is not None else None
+
+    def set(self, user_id, key, value, ttl=None):
+        from modules.database import BotState
+
+        values = {
+            'value': json.dumps(value),
+            'expires_at': datetime.utcnow() + timedelta(seconds=ttl or self.ttl)
+        }
+        with self.session_factory() as session:
+            updated = session.execute(
+                update(BotState).where(BotState.user_id == user_id, BotState.key == key).values(**values)
+            ).rowcount
+            if not updated:
+                session.add(BotState(user_id=user_id, key=key, **values))
+            try:
+                session.commit()
+            except IntegrityError:
+                # Строку параллельно вставил другой процесс
+                session.rollback()
+                session.execute(
+                    update(BotState).where(BotState.user_id == user_id, BotState.key == key).values(**values)
+                )
+                session.commit()
+
+        if time.monotonic() - self._last_purge >= self.purge_interval:
+            self.purge_expired()
+
+    def pop(self, user_id, key):
+        """Забирает состояние одним DELETE ... RETURNING (его не получат два процесса сразу)"""
+        from modules.database import BotState
+
+        with self.session_factory() as session:
+            row = session.execute(
+                delete(BotState).where(BotState.user_id == user_id, BotState.key == key)
+                .returning(BotState.value, BotState.expires_at)
+            ).first()
+            session.commit()
+        if row is None or row.expires_at <= datetime.utcnow():
+            return None
+        return json.loads(row.value)
+
+    def delete(self, user_id, key):
+        from modules.database import BotState
+
+        with self.session_factory() as session:
+            session.execute(delete(BotState).where(BotState.user_id == user_id, BotState.key == key))
+            session.commit()
+
+    def clear(self, user_id):
+        from modules.database import BotState
+
+        with self.session_factory() as session:
+            session.execute(delete(BotState).where(BotState.user_id == user_id))
+            session.commit()
+
+    def purge_expired(self):
+        """Удаляет истекшие состояния, возвращает их число"""
+        from modules.database import BotState
+
+        self._last_purge = time.monotonic()
+        with self.session_factory() as session:
+            removed = session.execute(delete(BotState).where(BotState.expires_at <= datetime.utcnow())).rowcount
+            session.commit()
+        if removed:
+            self.logger.info(f"🗑 Удалено истекших состояний диалога: {removed}")
+        return removed
+
+
+def create_state_store(db, backend=None):
+    """Хранилище состояний по настройке STATE_STORE: memory (по умолчанию) или sql"""
+    backend = backend or os.getenv('STATE_STORE', 'memory')
+    ttl = int(os.getenv('STATE_TTL', '3600'))
+
+    if backend == 'memory':
+        return MemoryStateStore(ttl=ttl, max_users=int(os.getenv('STATE_MAX_USERS', '10000')))
+    if backend == 'sql':
+        session_factory = db.session_factory
+        if hasattr(db, 'async_url'):
+            # Асинхронному менеджеру нужны синхронные сессии: обработчик вызывает хранилище через asyncio.to_thread.
+            # Движок общий для процесса и с тем же профилем SQLite (WAL, busy_timeout), что у DatabaseManager
+            from modules.database import get_sync_session_factory
+            session_factory = get_sync_session_factory(db.db_url)
+        return SQLStateStore(session_factory, ttl=ttl, logger=db.logger)
+    raise ValueError(f"Неизвестное хранилище состояний: {backend}")
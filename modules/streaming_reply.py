@@ -0,0 +1,83 @@
+# modules/streaming_reply.py
+from telebot.apihelper import ApiTelegramException
+from modules import bot_messages as texts
+import time
+
+
+class StreamingReply:
+    """Ответ, который показывается по мере генерации.
+
+    Текст дописывается в сообщение-заглушку правками edit_message_text не чаще
+    edit_interval секунд; следующая правка не ставится, пока предыдущая не ушла.
+    Текст делится на сообщения так же, как в send_long_message (по 4000 символов),
+    новые части отправляются отдельными сообщениями. Промежуточные правки идут без
+    разметки (незакрытая ** ломает Markdown), итоговая - с parse_mode.
+    """
+
+    def __init__(self, sender, bot, chat_id, placeholder, edit_interval=1.0):
+        self.sender = sender
+        self.bot = bot
+        self.chat_id = chat_id
+        self.edit_interval = edit_interval
+
+        self.text = ""
+        self.messages = [placeholder]  # Future с отправленными сообщениями частей
+        self.rendered = [None]
+        self.requests = []
+        self.last_flush = 0
+        self.first_content_at = None
+
+    def append(self, piece):
+        self.text += piece
+        now = time.monotonic()
+        if now - self.last_flush >= self.edit_interval and all(request.done() for request in self.requests):
+            self.flush()
+
+    def flush(self, parse_mode=None):
+        """Ставит в очередь отправки правки частей, текст которых изменился"""
+        if not self.text:
+            return
+        self.last_flush = time.monotonic()
+        if self.first_content_at is None:
+            self.first_content_at = self.last_flush
+
+        self.requests = []
+        for i, part in enumerate(texts.split_long_message(self.text)):
+            if i == len(self.messages):
+                self.messages.append(self.sender.submit(
+                    self.chat_id, self._send, part, parse_mode
+                ))
+                self.rendered.append((part, parse_mode))
+                self.requests.append(self.messages[i])
+            elif self.rendered[i] != (part, parse_mode):
+                self.requests.append(self.sender.submit(
+                    self.chat_id, self._edit, self.messages[i], part, parse_mode
+                ))
+                self.rendered[i] = (part, parse_mode)
+
+    def finish(self, parse_mode=None):
+        """Итоговая правка всех частей; возвращает полный текст ответа"""
+        self.flush(parse_mode)
+        return self.text
+
+    def _send(self, text, parse_mode):
+        try:
+            return self.bot.send_message(self.chat_id, text, parse_mode=parse_mode)
+        except ApiTelegramException as e:
+            if not parse_mode or e.error_code != 400:
+                raise
+            # Разметка не разобралась - показываем текст как есть
+            return self.bot.send_message(self.chat_id, text)
+
+    def _edit(self, message_future, text, parse_mode):
+        message = message_future.result()
+        try:
+            return self.bot.edit_message_text(text, self.chat_id, message.message_id, parse_mode=parse_mode)
+        except ApiTelegramException as e:
+            if e.error_code != 400:
+                raise
+            if 'message is not modified' in e.description:
+                return None
+            if not parse_mode:
+                raise
+            return self.bot.edit_message_text(text, self.chat_id, message.message_id)
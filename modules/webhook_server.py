@@ -0,0 +1,117 @@
+# modules/webhook_server.py
+from telebot import types
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hmac
+import logging
+import threading
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    """Принимает POST с обновлением Telegram и передает его в пул обработчиков"""
+
+    def do_POST(self):
+        webhook = self.server.webhook
+
+        if self.path != webhook.path:
+            return self._reply(404)
+        if not hmac.compare_digest(self.headers.get(SECRET_HEADER, ''), webhook.secret_token):
+            return self._reply(403)
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            update = types.Update.de_json(self.rfile.read(length).decode('utf-8'))
+        except Exception as e:
+            webhook.logger.warning(f"⚠️ Некорректное обновление webhook: {e}")
+            return self._reply(400)
+
+        # 503 заставляет Telegram повторить доставку позже, а не терять обновление
+        self._reply(200 if webhook.submit(update) else 503)
+
+    def do_GET(self):
+        self._reply(405)
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        self.server.webhook.logger.debug(format % args)
+
+
+class WebhookServer:
+    """HTTP-сервер для webhook Telegram с ограниченным пулом обработчиков.
+
+    Ответ Telegram отправляется сразу после постановки обновления в пул; если
+    в обработке уже max_pending обновлений, сервер отвечает 503. С dispatcher
+    (UserLaneDispatcher) обновления ставятся прямо в очереди пользователей, и 503
+    возвращается при заполненной очереди.
+    """
+
+    def __init__(self, bot, secret_token, host='0.0.0.0', port=8443, path='/telegram/webhook',
+                 workers=8, max_pending=100, dispatcher=None, logger=None):
+        if not secret_token:
+            raise ValueError("Для webhook нужен секретный токен (WEBHOOK_SECRET)")
+
+        self.bot = bot
+        self.secret_token = secret_token
+        self.path = path
+        self.dispatcher = dispatcher
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='webhook')
+        self.pending = threading.BoundedSemaphore(max_pending)
+        # Каждое соединение в своем потоке: медленный клиент не задерживает прием остальных обновлений
+        self.httpd = ThreadingHTTPServer((host, port), WebhookRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.webhook = self
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def submit(self, update):
+        """Ставит обновление в пул; False, если очередь переполнена"""
+        if self.dispatcher is not None:
+            return self.dispatcher.submit(update, block=False)
+        if not self.pending.acquire(blocking=False):
+            self.logger.warning("⚠️ Очередь обновлений webhook переполнена")
+            return False
+        self.executor.submit(self._process, update)
+        return True
+
+    def _process(self, update):
+        try:
+            self.bot.process_new_updates([update])
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка обработки обновления {update.update_id}: {e}")
+        finally:
+            self.pending.release()
+
+    def register(self, public_url, max_connections=40):
+        """Регистрирует webhook в Telegram (достаточно одного процесса за балансировщиком)"""
+        self.bot.remove_webhook()
+        self.bot.set_webhook(url=public_url.rstrip('/') + self.path, secret_token=self.secret_token,
+                             max_connections=max_connections)
+        self.logger.info(f"✅ Webhook зарегистрирован: {public_url}")
+
+    def serve_forever(self):
+        self.logger.info(f"🌐 Webhook-сервер слушает порт {self.port}")
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.stop()
+
+    def serve_in_background(self):
+        thread = threading.Thread(target=self.httpd.serve_forever, daemon=True, name='webhook-server')
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Останавливает прием и дожидается обработки принятых обновлений"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.executor.shutdown(wait=True)
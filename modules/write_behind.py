@@ -0,0 +1,191 @@
+# modules/write_behind.py
+from concurrent.futures import Future
+from sqlalchemy.exc import IntegrityError
+import atexit
+import logging
+import queue
+import threading
+import time
+
+
+class PendingWrite:
+    """Отложенная запись: функция write(session) и Future для подтверждения"""
+
+    def __init__(self, interview_id, write, on_conflict=None):
+        self.interview_id = interview_id
+        self.write = write
+        # Результат при нарушении уникальности (например, повторный ответ на вопрос)
+        self.on_conflict = on_conflict
+        self.future = Future()
+
+
+class WriteBehindQueue:
+    """Очередь отложенной записи с групповой фиксацией.
+
+    Записи копятся в ограниченной очереди и фиксируются пачками: каждые max_batch
+    записей или flush_interval_ms миллисекунд одной транзакцией. Если пачка
+    падает, записи повторяются по одной, чтобы ошибка одной не отменяла остальные.
+    """
+
+    def __init__(self, session_factory, max_batch=100, flush_interval_ms=20, max_queue=10000, logger=None):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval_ms / 1000
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = {}
+        self._pending_lock = threading.Condition()
+        # Проверка остановки и постановка в очередь атомарны относительно close:
+        # запись не может попасть в очередь после сигнала остановки
+        self._submit_lock = threading.Lock()
+        self._stopped = False
+
+        self.batches_committed = 0
+        self.writes_committed = 0
+
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, interview_id, write, on_conflict=None):
+        """Ставит запись в очередь (блокируется, если очередь заполнена) и возвращает Future"""
+        item = PendingWrite(interview_id, write, on_conflict)
+        with self._submit_lock:
+            if self._stopped:
+                raise RuntimeError("Очередь отложенной записи остановлена")
+            with self._pending_lock:
+                self._pending[interview_id] = self._pending.get(interview_id, 0) + 1
+            self._queue.put(item)
+        return item.future
+
+    def has_pending(self, interview_id):
+        """Есть ли незафиксированные записи интервью"""
+        with self._pending_lock:
+            return bool(self._pending.get(interview_id))
+
+    def wait_for_interview(self, interview_id, timeout=None):
+        """Ждет фиксации всех записей интервью (чтение своих записей)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._pending_lock:
+            while self._pending.get(interview_id):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._pending_lock.wait(remaining)
+        return True
+
+    def flush(self, timeout=None):
+        """Ждет фиксации всех записей в очереди"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._pending_lock:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._pending_lock.wait(remaining)
+        return True
+
+    def metrics(self):
+        """Глубина очереди и число зафиксированных пачек/записей"""
+        return {
+            'queue_depth': self._queue.qsize(),
+            'batches_committed': self.batches_committed,
+            'writes_committed': self.writes_committed,
+        }
+
+    def close(self, timeout=10):
+        """Дописывает очередь и останавливает поток записи"""
+        with self._submit_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._flush(batch)
+            if stop:
+                # Оставшиеся записи после сигнала остановки тоже фиксируем
+                rest = []
+                while not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    if item is not None:
+                        rest.append(item)
+                if rest:
+                    self._flush(rest)
+                return
+
+    def _flush(self, batch):
+        try:
+            results = self._commit(batch)
+            self.batches_committed += 1
+            for item, result in zip(batch, results):
+                self._resolve(item, result=result)
+        except Exception as e:
+            self.logger.warning(f"⚠️ Пачка из {len(batch)} записей не зафиксирована ({e}), повтор по одной")
+            for item in batch:
+                self._flush_one(item)
+
+    def _flush_one(self, item):
+        try:
+            result = self._commit([item])[0]
+            self.batches_committed += 1
+            self._resolve(item, result=result)
+        except IntegrityError as e:
+            if item.on_conflict is not None:
+                self._resolve(item, result=item.on_conflict(e), committed=False)
+            else:
+                self._resolve(item, error=e)
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка отложенной записи: {e}")
+            self._resolve(item, error=e)
+
+    def _commit(self, batch):
+        session = self.session_factory()
+        try:
+            results = [item.write(session) for item in batch]
+            session.commit()
+            return results
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _resolve(self, item, result=None, error=None, committed=True):
+        if error is None:
+            if committed:
+                self.writes_committed += 1
+            item.future.set_result(result)
+        else:
+            item.future.set_exception(error)
+
+        with self._pending_lock:
+            left = self._pending.get(item.interview_id, 1) - 1
+            if left:
+                self._pending[item.interview_id] = left
+            else:
+                self._pending.pop(item.interview_id, None)
+            self._pending_lock.notify_all()
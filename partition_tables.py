@@ -0,0 +1,33 @@
+# partition_tables.py
+import argparse
+from modules.database import DatabaseManager
+
+def partition_tables():
+    parser = argparse.ArgumentParser(description="Помесячные секции responses и ai_consultations (PostgreSQL)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    setup = subparsers.add_parser('setup', help="секционировать таблицы и создать секции наперед")
+    setup.add_argument('--months-ahead', type=int, default=2, help="на сколько месяцев вперед создать секции")
+
+    drop = subparsers.add_parser('drop', help="удалить секции старше срока хранения")
+    drop.add_argument('--retention-months', type=int, required=True, help="срок хранения в месяцах")
+    drop.add_argument('--detach-only', action='store_true', help="только отсоединить секции, не удаляя данные")
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+
+    if args.command == 'setup':
+        # Запускайте раз в месяц (например, из cron), чтобы секции всегда создавались заранее
+        created = db.setup_partitioning(args.months_ahead)
+        print(f"✅ Создано секций: {len(created)}")
+        for name in created:
+            print(f"   + {name}")
+    else:
+        removed = db.drop_old_partitions(args.retention_months, args.detach_only)
+        action = "Отсоединено" if args.detach_only else "Удалено"
+        print(f"✅ {action} секций: {len(removed)}")
+        for name in removed:
+            print(f"   - {name}")
+
+if __name__ == "__main__":
+    partition_tables()
@@ -1,26 +1,38 @@
 # quick_stats.py
+import argparse
+from datetime import datetime, timedelta
 from modules.database import DatabaseManager, Interview, Response, Question, AIConsultation
 
-def quick_stats():
+def quick_stats(days=None):
     print("⚡ БЫСТРАЯ СТАТИСТИКА")
+    if days:
+        print(f"За последние {days} дн.")
     print("=" * 30)
     
     db = DatabaseManager()
-    session = db.get_session()
+    session = db.get_read_session()
+    
+    # Фильтр по времени позволяет PostgreSQL читать только нужные месячные секции
+    responses_query = session.query(Response)
+    consultations_query = session.query(AIConsultation)
+    if days:
+        since = datetime.utcnow() - timedelta(days=days)
+        responses_query = responses_query.filter(Response.timestamp >= since)
+        consultations_query = consultations_query.filter(AIConsultation.timestamp >= since)
     
     # Основные цифры
     interviews = session.query(Interview).count()
     completed = session.query(Interview).filter(Interview.status == 'completed').count()
-    responses = session.query(Response).count()
-    consultations = session.query(AIConsultation).count()
+    responses = responses_query.count()
+    consultations = consultations_query.count()
     
     print(f"🎤 Интервью: {interviews} (завершено: {completed})")
     print(f"📝 Ответов: {responses}")
     print(f"💡 Консультаций: {consultations}")
     
     # Статистика выборов
-    choice_a = session.query(Response).filter(Response.selected_option == 'A').count()
-    choice_b = session.query(Response).filter(Response.selected_option == 'B').count()
+    choice_a = responses_query.filter(Response.selected_option == 'A').count()
+    choice_b = responses_query.filter(Response.selected_option == 'B').count()
     
     if choice_a + choice_b > 0:
         print(f"\n📊 Выборы продуктов:")
@@ -35,4 +47,6 @@ def quick_stats():
     print("=" * 30)
 
 if __name__ == "__main__":
-    quick_stats()
+    parser = argparse.ArgumentParser(description="Быстрая статистика по собранным данным")
+    parser.add_argument('--days', type=int, help="учитывать ответы и консультации только за последние N дней")
+    quick_stats(parser.parse_args().days)
@@ -1,10 +1,22 @@
 # run_bot.py
+import asyncio
+import os
 from modules.telegram_handler import TelegramHandler
 
 def main():
     try:
-        bot_handler = TelegramHandler()
-        bot_handler.start_polling()
+        bot_mode = os.getenv('BOT_MODE', 'polling')
+        # BOT_MODE=webhook принимает обновления через HTTP-сервер вместо long polling
+        if bot_mode == 'webhook':
+            bot_handler = TelegramHandler()
+            bot_handler.start_webhook()
+        # BOT_MODE=async обрабатывает обновления корутинами на AsyncTeleBot
+        elif bot_mode == 'async':
+            from modules.async_telegram_handler import AsyncTelegramHandler
+            asyncio.run(AsyncTelegramHandler().start_polling())
+        else:
+            bot_handler = TelegramHandler()
+            bot_handler.start_polling()
     except KeyboardInterrupt:
         print("\n🛑 Бот остановлен")
     except Exception as e:
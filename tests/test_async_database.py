@@ -0,0 +1,125 @@
+# tests/test_async_database.py
+import asyncio
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from modules.async_database import AsyncDatabaseManager, to_async_url
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'async.db'}"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_to_async_url():
+    assert to_async_url("postgresql://user@localhost/db") == "postgresql+asyncpg://user@localhost/db"
+    assert to_async_url("sqlite:///bot.db") == "sqlite+aiosqlite:///bot.db"
+
+
+def test_async_interview_flow(db_url):
+    async def scenario():
+        db = AsyncDatabaseManager(db_url)
+        await db.create_tables()
+
+        question_id = await db.add_financial_question(
+            "Вопрос", "Ставка ЦБ: 16%", "Депозит", "ОФЗ", "Гарантия АСВ", "Доходность 13%"
+        )
+        text_question_id = await db.add_text_question("Почему?")
+        interview = await db.start_interview("42", "tester")
+
+        assert (await db.get_next_question_for_interview(interview.id)).id == question_id
+        await db.save_consultation(interview.id, question_id, "Что выгоднее?", "Ответ")
+        assert await db.save_response(interview.id, question_id, "Выбран продукт B", selected_option='B')
+        assert await db.save_response(interview.id, question_id, "Выбран продукт A", selected_option='A') is None
+
+        question, answered, total = await db.get_question_progress(interview.id)
+        assert (question.id, answered, total) == (text_question_id, 1, 2)
+
+        await db.complete_interview(interview.id)
+        stats = await db.get_interview_statistics(interview.id)
+        await db.dispose()
+        return stats
+
+    stats = run(scenario())
+    assert stats['interview'].status == 'completed'
+    assert (stats['responses_count'], stats['choice_b_count'], stats['consultations_count']) == (1, 1, 1)
+
+
+def test_concurrent_interviews(db_url):
+    async def scenario():
+        db = AsyncDatabaseManager(db_url)
+        await db.create_tables()
+        question_id = await db.add_text_question("Почему?")
+
+        async def answer(user_id):
+            interview = await db.start_interview(user_id, user_id)
+            await db.save_response(interview.id, question_id, "Ответ")
+            return await db.get_interview_progress(interview.id)
+
+        results = await asyncio.gather(*(answer(str(user_id)) for user_id in range(20)))
+        await db.dispose()
+        return results
+
+    assert run(scenario()) == [(1, 1)] * 20
+
+
+def test_partitioned_mode_rejects_duplicate_answers_without_unique_index(db_url):
+    async def scenario():
+        db = AsyncDatabaseManager(db_url)
+        await db.create_tables()
+        # Как в секционированной responses: уникального индекса (interview_id, question_id) нет
+        async with db.engine.begin() as connection:
+            await connection.exec_driver_sql("DROP INDEX uq_responses_interview_question")
+        db.partitioning = True
+
+        question_id = await db.add_text_question("Почему?")
+        interview = await db.start_interview("42", "tester")
+        assert await db.save_response(interview.id, question_id, "Ответ")
+        assert await db.save_response(interview.id, question_id, "Повтор") is None
+
+        stats = await db.get_interview_statistics(interview.id)
+        await db.dispose()
+        return stats
+
+    stats = run(scenario())
+    assert stats['responses_count'] == 1 and stats['interview'].answered_count == 1
+
+
+def test_async_cleanup_old_interviews_in_chunks_with_archive(db_url, tmp_path):
+    archive_dir = tmp_path / 'archive'
+    progress = []
+
+    async def scenario():
+        db = AsyncDatabaseManager(db_url)
+        await db.create_tables()
+        question_id = await db.add_text_question("Почему?")
+        for user_id in range(3):
+            interview = await db.start_interview(str(user_id), "tester")
+            await db.save_response(interview.id, question_id, "Ответ")
+            await db.save_consultation(interview.id, question_id, "Что выгоднее?", "Ответ")
+            await db.complete_interview(interview.id, datetime.utcnow() - timedelta(days=40))
+        recent = await db.start_interview("recent", "tester")
+        await db.complete_interview(recent.id)
+
+        deleted = await db.cleanup_old_interviews(days_old=30, batch_size=2, archive_dir=str(archive_dir),
+                                                  progress_callback=lambda done, total: progress.append((done, total)))
+        left = await db.get_interview_statistics(recent.id)
+        await db.dispose()
+        return deleted, left
+
+    deleted, left = run(scenario())
+    assert deleted == 3 and progress == [(2, 3), (3, 3)]
+    assert left['interview'].status == 'completed'
+
+    archived = {}
+    for path in archive_dir.iterdir():
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            archived[path.name.rsplit('_', 2)[0]] = [json.loads(line) for line in file]
+    assert [len(archived[name]) for name in ('interviews', 'responses', 'ai_consultations')] == [3, 3, 3]
@@ -0,0 +1,124 @@
+# tests/test_async_telegram_handler.py
+import asyncio
+from types import SimpleNamespace
+
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+from modules import bot_messages as texts
+from modules.async_database import AsyncDatabaseManager
+from modules.async_telegram_handler import AsyncTelegramHandler
+
+USER = {'id': 42, 'is_bot': False, 'first_name': 'Тест', 'username': 'tester'}
+CHAT = {'id': 42, 'type': 'private'}
+
+
+class RecordingBot(AsyncTeleBot):
+    """Бот без сети: запоминает отправленные сообщения"""
+
+    def __init__(self):
+        super().__init__("123456:TEST")
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(text)
+        return SimpleNamespace(message_id=len(self.sent))
+
+    async def delete_message(self, chat_id, message_id, **kwargs):
+        return True
+
+
+class FakeGigaChat:
+    async def aget_financial_advice(self, user_query, question_context, cache=None):
+        await asyncio.sleep(0)
+        return f"Совет по {question_context['option_a']}"
+
+
+def message_update(update_id, text):
+    return types.Update.de_json({'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 1700000000, 'chat': CHAT, 'from': USER, 'text': text,
+    }})
+
+
+def callback_update(update_id, data):
+    return types.Update.de_json({'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'from': USER, 'chat_instance': '1', 'data': data,
+        'message': {'message_id': 1, 'date': 1700000000, 'chat': CHAT, 'text': '...'},
+    }})
+
+
+def test_async_handler_interview_with_consultation(tmp_path):
+    async def scenario():
+        db = AsyncDatabaseManager(f"sqlite:///{tmp_path / 'bot.db'}")
+        await db.create_tables()
+        question_id = await db.add_financial_question(
+            "Вопрос", "Ставка ЦБ: 16%", "Депозит", "ОФЗ", "Гарантия АСВ", "Доходность 13%"
+        )
+        bot = RecordingBot()
+        handler = AsyncTelegramHandler(db=db, bot=bot, giga_handler=FakeGigaChat())
+
+        updates = [
+            message_update(1, "/start"),
+            callback_update(2, "get_question"),
+            callback_update(3, f"consult_{question_id}"),
+            message_update(4, "Что надежнее?"),
+            callback_update(5, f"choose_A_{question_id}"),
+            callback_update(6, f"choose_A_{question_id}"),
+            message_update(7, "/status"),
+        ]
+        for update in updates:
+            await bot.process_new_updates([update])
+
+        interview = await db.get_interview_by_user_id("42")
+        await db.dispose()
+        return bot.sent, interview
+
+    sent, interview = asyncio.run(scenario())
+
+    assert "Добро пожаловать" in sent[0]
+    assert any("Совет по Депозит" in text for text in sent)
+    assert any("Вы выбрали: **Депозит**" in text for text in sent)
+    assert "⚠️ Вы уже отвечали на этот вопрос!" in sent
+    assert "Прогресс: 1/1" in sent[-1]
+    assert (interview.answered_count, interview.consultations_count) == (1, 1)
+
+
+def test_messages_during_generation_do_not_create_more_consultations(tmp_path):
+    async def scenario():
+        db = AsyncDatabaseManager(f"sqlite:///{tmp_path / 'bot.db'}")
+        await db.create_tables()
+        question_id = await db.add_financial_question(
+            "Вопрос", "Ставка ЦБ: 16%", "Депозит", "ОФЗ", "Гарантия АСВ", "Доходность 13%"
+        )
+        bot = RecordingBot()
+        giga = FakeGigaChat()
+        release = asyncio.Event()
+        answer = giga.aget_financial_advice
+
+        async def slow_advice(user_query, question_context, cache=None):
+            await release.wait()
+            return await answer(user_query, question_context, cache)
+
+        giga.aget_financial_advice = slow_advice
+        AsyncTelegramHandler(db=db, bot=bot, giga_handler=giga)
+        await bot.process_new_updates([message_update(1, "/start")])
+        await bot.process_new_updates([callback_update(2, f"consult_{question_id}")])
+
+        # Второе сообщение приходит, пока GigaChat еще генерирует ответ на первое
+        first = asyncio.create_task(bot.process_new_updates([message_update(3, "Что надежнее?")]))
+        while texts.PROCESSING_TEXT not in bot.sent:
+            await asyncio.sleep(0.01)
+        second = asyncio.create_task(bot.process_new_updates([message_update(4, "Ну что там?")]))
+        await asyncio.wait([second], timeout=1)
+        release.set()
+        await asyncio.gather(first, second)
+
+        interview = await db.get_interview_by_user_id("42")
+        await db.dispose()
+        return bot.sent, interview
+
+    sent, interview = asyncio.run(scenario())
+
+    assert interview.consultations_count == 1
+    assert sum("Совет по Депозит" in text for text in sent) == 1
+    assert texts.UNKNOWN_MESSAGE_TEXT in sent
@@ -0,0 +1,174 @@
+# tests/test_call_policy.py
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from modules.call_policy import CallPolicy, CircuitBreaker, CircuitOpenError, DeadlineExceeded, HEDGE_MIN_SAMPLES
+from modules.gigachat_handler import GigaChatHandler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyGiga:
+    """Локальный клиент GigaChat: отвечает с задержкой delays[i] или падает, пока failing=True"""
+
+    def __init__(self, delays=()):
+        self.token = "access-token"
+        self.delays = list(delays)
+        self.failing = False
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_token(self):
+        pass
+
+    def chat(self, prompt):
+        with self._lock:
+            self.calls += 1
+            delay = self.delays.pop(0) if self.delays else 0
+        if self.failing:
+            raise ConnectionError("GigaChat недоступен")
+        time.sleep(delay)
+        message = SimpleNamespace(content=f"Ответ {self.calls}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_breaker_trips_after_failures_and_recovers_after_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now = 31
+    assert breaker.allow()
+    assert not breaker.allow()  # пока идет пробный вызов, остальные отклоняются
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 62
+    assert breaker.allow()
+    breaker.record_success(0.5)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.metrics()['trips'] == 2
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker(failure_threshold=2, slow_call_threshold=1.0)
+    breaker.record_success(5.0)
+    breaker.record_success(0.1)
+    assert breaker.failures == 0
+    breaker.record_success(5.0)
+    breaker.record_success(5.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_deadline_interrupts_waiting_for_a_hung_call():
+    policy = CallPolicy(deadline=0.1)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        policy.call(lambda: time.sleep(1))
+    assert time.monotonic() - started < 0.5
+    assert policy.metrics()['timeouts'] == 1
+
+
+def test_slow_but_live_stream_is_not_cut_off():
+    policy = CallPolicy(deadline=0.2)
+
+    def generate():
+        for piece in ("Депозит", " надежнее", " ОФЗ"):
+            time.sleep(0.1)
+            yield piece
+
+    assert ''.join(policy.stream(generate)) == "Депозит надежнее ОФЗ"
+    metrics = policy.metrics()
+    assert metrics['timeouts'] == 0 and metrics['breaker']['failures'] == 0
+    assert metrics['latency']['p50'] < 0.2
+
+    def stalled():
+        yield "Депозит"
+        time.sleep(1)
+        yield " надежнее"
+
+    with pytest.raises(DeadlineExceeded):
+        list(policy.stream(stalled))
+    assert policy.metrics()['timeouts'] == 1
+
+
+def test_abandoned_stream_does_not_close_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    policy = CallPolicy(deadline=1, breaker=breaker)
+    breaker.record_failure()
+    clock.now = 31
+
+    stream = policy.stream(lambda: iter(["Депозит", " надежнее"]))
+    assert next(stream) == "Депозит"
+    stream.close()
+    assert breaker.state == CircuitBreaker.HALF_OPEN and breaker.failures == 1
+    # Пробный вызов освобожден: следующий запрос снова может проверить сервис
+    assert breaker.allow()
+
+
+def test_hedged_request_wins_over_slow_primary():
+    policy = CallPolicy(deadline=5, hedge=True)
+    for _ in range(HEDGE_MIN_SAMPLES):
+        policy.latency.record(0.05)
+    giga = FlakyGiga(delays=[2, 0])
+
+    started = time.monotonic()
+    assert policy.call(lambda: giga.chat("").choices[0].message.content) == "Ответ 2"
+    assert time.monotonic() - started < 1
+    metrics = policy.metrics()
+    assert metrics['hedges'] == 1 and metrics['hedge_wins'] == 1
+
+
+def test_async_call_respects_deadline_and_hedges():
+    policy = CallPolicy(deadline=0.2, hedge=True)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(policy.acall(slow))
+
+    for _ in range(HEDGE_MIN_SAMPLES):
+        policy.latency.record(0.01)
+    delays = [1, 0]
+
+    async def answer():
+        await asyncio.sleep(delays.pop(0))
+        return "ok"
+
+    assert asyncio.run(policy.acall(answer)) == "ok"
+    assert policy.metrics()['hedge_wins'] == 1
+
+
+def test_handler_falls_back_while_breaker_is_open(monkeypatch):
+    monkeypatch.setenv('GIGACHAT_CREDENTIALS', 'test')
+    monkeypatch.setenv('GIGACHAT_BREAKER_FAILURES', '2')
+    handler = GigaChatHandler()
+    handler.giga = FlakyGiga()
+    handler.giga.failing = True
+
+    for _ in range(3):
+        assert "Консультация временно недоступна" in handler.get_financial_advice("Что выбрать?", {})
+    assert handler.giga.calls == 2
+
+    metrics = handler.metrics()
+    assert metrics['breaker']['state'] == CircuitBreaker.OPEN
+    assert metrics['breaker']['rejected'] == 1 and metrics['errors'] == 2
+    with pytest.raises(CircuitOpenError):
+        handler.policy.call(lambda: None)
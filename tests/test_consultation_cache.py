@@ -0,0 +1,131 @@
+# tests/test_consultation_cache.py
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import text
+
+from modules.consultation_cache import ConsultationCache, SQLConsultationTier, normalize_query
+from modules.database import DatabaseManager, get_sync_session_factory
+
+CONTEXT = {
+    'question_id': 1,
+    'question_text': "Куда вложить деньги?",
+    'market_context': "Ставка ЦБ: 16%",
+    'option_a': "Депозит",
+    'option_a_details': "Гарантия АСВ",
+    'option_b': "ОФЗ",
+    'option_b_details': "Доходность 13%",
+}
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(f"sqlite:///{tmp_path / 'test.db'}")
+    manager.create_tables()
+    yield manager
+    manager.dispose()
+
+
+def test_normalized_query_hits_and_question_edit_misses():
+    cache = ConsultationCache(ttl=60, max_entries=10)
+    assert normalize_query("  Что ВЫГОДНЕЕ?! ") == normalize_query("что выгоднее") == "что выгоднее"
+
+    assert cache.get(CONTEXT, "Что выгоднее?") is None
+    cache.set(CONTEXT, "Что выгоднее?", "Депозит")
+    assert cache.get(CONTEXT, "что  выгоднее") == "Депозит"
+
+    # Правка вопроса меняет версию содержимого
+    edited = dict(CONTEXT, market_context="Ставка ЦБ: 21%")
+    assert cache.get(edited, "Что выгоднее?") is None
+    assert cache.get(dict(CONTEXT, question_id=2), "Что выгоднее?") is None
+
+    metrics = cache.metrics()
+    assert metrics['hits'] == 1 and metrics['misses'] == 3 and metrics['stores'] == 1
+
+
+def test_lru_ttl_and_invalidation():
+    cache = ConsultationCache(ttl=60, max_entries=2)
+    cache.set(CONTEXT, "первый", "1")
+    cache.set(CONTEXT, "второй", "2")
+    cache.get(CONTEXT, "первый")
+    cache.set(CONTEXT, "третий", "3")
+    assert cache.get(CONTEXT, "второй") is None
+    assert cache.get(CONTEXT, "первый") == "1"
+
+    cache.invalidate_question(1)
+    assert cache.get(CONTEXT, "первый") is None and cache.metrics()['entries'] == 0
+
+    short = ConsultationCache(ttl=0.01)
+    short.set(CONTEXT, "вопрос", "ответ")
+    time.sleep(0.02)
+    assert short.get(CONTEXT, "вопрос") is None
+
+
+def test_shared_tier_between_processes(db):
+    first = ConsultationCache(shared=SQLConsultationTier(db.session_factory))
+    second = ConsultationCache(shared=SQLConsultationTier(db.session_factory))
+
+    first.set(CONTEXT, "Какие риски у ОФЗ?", "Процентный риск")
+    first.set(CONTEXT, "Какие риски у ОФЗ?", "Процентный риск")
+    assert second.get(CONTEXT, "какие риски у офз") == "Процентный риск"
+    assert second.metrics()['shared_hits'] == 1
+    assert second.get(CONTEXT, "какие риски у офз") == "Процентный риск"
+    assert second.metrics()['hits'] == 1
+
+    first.invalidate_question(1)
+    assert ConsultationCache(shared=SQLConsultationTier(db.session_factory)).get(CONTEXT, "Какие риски у ОФЗ?") is None
+
+
+def test_async_manager_first_still_gets_database_tiers(tmp_path, monkeypatch):
+    from modules.async_database import AsyncDatabaseManager
+
+    monkeypatch.setenv('CONSULTATION_CACHE_SHARED', 'True')
+    monkeypatch.setenv('CONSULTATION_SIMILARITY_THRESHOLD', '0.8')
+    async_db = AsyncDatabaseManager(f"sqlite:///{tmp_path / 'async-first.db'}")
+    asyncio.run(async_db.create_tables())
+
+    cache = async_db.consultation_cache
+    assert cache.shared is not None and cache.similar.session_factory is cache.shared.session_factory
+    assert cache.blocking
+    # Один профилированный движок на базу: запись ждет блокировку вместо "database is locked"
+    assert cache.shared.session_factory is get_sync_session_factory(async_db.db_url)
+    with cache.shared.session_factory() as session:
+        assert session.execute(text("PRAGMA journal_mode")).scalar() == 'wal'
+
+    cache.set(CONTEXT, "Какие риски у ОФЗ?", "Процентный риск")
+    assert ConsultationCache(shared=cache.shared).get(CONTEXT, "какие риски у офз") == "Процентный риск"
+
+
+def test_deactivation_invalidates_cached_answers(db):
+    question_id = db.add_text_question("Вопрос")
+    context = dict(CONTEXT, question_id=question_id)
+    db.consultation_cache.set(context, "Что выгоднее?", "Депозит")
+
+    assert db.deactivate_question(question_id)
+    assert db.consultation_cache.get(context, "Что выгоднее?") is None
+
+
+def test_gigachat_answers_repeat_question_from_cache(monkeypatch):
+    from types import SimpleNamespace
+    from modules.gigachat_handler import GigaChatHandler
+
+    monkeypatch.setenv('GIGACHAT_CREDENTIALS', 'test')
+    handler = GigaChatHandler()
+    calls = []
+
+    def chat(prompt):
+        calls.append(prompt)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Депозит надежнее"))])
+
+    handler.giga = SimpleNamespace(token="t", get_token=lambda: None, chat=chat)
+    cache = ConsultationCache()
+
+    assert handler.get_financial_advice("Что выгоднее?", CONTEXT, cache=cache) == "Депозит надежнее"
+    assert handler.get_financial_advice("что выгоднее", CONTEXT, cache=cache) == "Депозит надежнее"
+    assert len(calls) == 1
+
+    # Резервный ответ при ошибке не кэшируется
+    handler.giga = SimpleNamespace(token="t", get_token=lambda: None, chat=lambda prompt: 1 / 0)
+    handler.get_financial_advice("Другой вопрос", CONTEXT, cache=cache)
+    assert cache.get(CONTEXT, "Другой вопрос") is None
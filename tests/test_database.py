@@ -0,0 +1,347 @@
+# tests/test_database.py
+import gzip
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import inspect, text
+
+from modules.database import Base, DatabaseManager
+from modules.migrations import MIGRATIONS
+from modules.partitioning import add_months, partition_name
+from modules.write_behind import WriteBehindQueue
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(f"sqlite:///{tmp_path / 'test.db'}")
+    manager.create_tables()
+    yield manager
+    manager.dispose()
+
+
+def add_choice_question(db, text="Вопрос"):
+    return db.add_financial_question(
+        text=text,
+        market_context="Ставка ЦБ: 16%",
+        option_a="Депозит",
+        option_b="ОФЗ",
+        option_a_details="Гарантия АСВ",
+        option_b_details="Доходность 13%"
+    )
+
+
+def test_interview_flow(db):
+    first_id = add_choice_question(db, "Первый")
+    second_id = db.add_text_question("Второй")
+
+    interview = db.start_interview("42", "tester")
+    assert db.get_interview_by_user_id("42").id == interview.id
+    assert db.get_next_question_for_interview(interview.id).id == first_id
+
+    db.save_response(interview.id, first_id, "Выбран продукт A", selected_option='A')
+    assert db.has_response(interview.id, first_id)
+    assert db.get_next_question_for_interview(interview.id).id == second_id
+    assert db.get_interview_progress(interview.id) == (1, 2)
+
+    stats = db.get_interview_statistics(interview.id)
+    assert stats['choice_a_count'] == 1
+    assert stats['choice_b_count'] == 0
+
+
+def test_restart_closes_previous_interview(db):
+    old = db.start_interview("42", "tester")
+    new = db.start_interview("42", "tester")
+
+    assert db.get_interview_by_user_id("42").id == new.id
+    assert db.get_interview_by_user_id("42", status='restarted').id == old.id
+
+
+def test_sessions_are_isolated_between_threads(db):
+    question_id = add_choice_question(db)
+    interviews = [db.start_interview(str(user_id), f"user{user_id}") for user_id in range(8)]
+    errors = []
+
+    def answer(interview):
+        try:
+            db.save_response(interview.id, question_id, "Выбран продукт B", selected_option='B')
+            db.save_consultation(interview.id, question_id, "Что выгоднее?", "Ответ")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=answer, args=(interview,)) for interview in interviews]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    for interview in interviews:
+        assert db.get_interview_progress(interview.id) == (1, 1)
+        assert db.get_interview_statistics(interview.id)['consultations_count'] == 1
+
+
+def test_duplicate_response_is_rejected(db):
+    question_id = add_choice_question(db)
+    interview = db.start_interview("42", "tester")
+
+    assert db.save_response(interview.id, question_id, "Выбран продукт A", selected_option='A')
+    assert db.save_response(interview.id, question_id, "Выбран продукт B", selected_option='B') is None
+    assert db.get_interview_progress(interview.id) == (1, 1)
+
+
+def test_migrations_upgrade_legacy_schema(tmp_path):
+    legacy = DatabaseManager(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(legacy.engine)
+    with legacy.engine.begin() as connection:
+        connection.execute(text("DROP INDEX uq_responses_interview_question"))
+        connection.execute(text("DROP INDEX ix_interviews_user_status"))
+        connection.execute(text("INSERT INTO interviews (id, user_id, status) VALUES (1, '42', 'active')"))
+        connection.execute(text("INSERT INTO questions (id, text) VALUES (1, 'Вопрос')"))
+        for _ in range(2):
+            connection.execute(text("INSERT INTO responses (interview_id, question_id) VALUES (1, 1)"))
+
+    assert legacy.get_schema_version() == 0
+    assert legacy.migrate() == [m.version for m in MIGRATIONS]
+    assert legacy.get_schema_version() == MIGRATIONS[-1].version
+    assert legacy.migrate() == []
+
+    index_names = {index['name'] for index in inspect(legacy.engine).get_indexes('responses')}
+    assert 'uq_responses_interview_question' in index_names
+    assert legacy.get_interview_progress(1)[0] == 1
+    assert legacy.get_interview_statistics(1)['responses_count'] == 1
+    legacy.dispose()
+
+
+def test_question_catalog_is_invalidated_on_changes(db):
+    first_id = add_choice_question(db, "Первый")
+    interview = db.start_interview("42", "tester")
+    assert db.get_question_progress(interview.id) == (db.get_question_by_id(first_id), 0, 1)
+
+    second_id = db.add_text_question("Второй")
+    db.save_response(interview.id, first_id, "Выбран продукт A", selected_option='A')
+    question, answered, total = db.get_question_progress(interview.id)
+    assert (question.id, answered, total) == (second_id, 1, 2)
+
+    db.deactivate_question(second_id)
+    assert db.get_question_progress(interview.id) == (None, 1, 1)
+    assert db.get_question_by_id(second_id).is_active is False
+
+
+def test_interview_counters_follow_inserts(db):
+    first_id = add_choice_question(db, "Первый")
+    second_id = add_choice_question(db, "Второй")
+    interview = db.start_interview("42", "tester")
+
+    first = db.save_consultation(interview.id, first_id, "Что выгоднее?", "Ответ")
+    assert (first['interview_consultations'], first['question_consultations']) == (1, None)
+    response = db.save_response(interview.id, first_id, "Выбран продукт A", selected_option='A')
+    assert response.consultations_count == 1
+    second = db.save_consultation(interview.id, first_id, "А если подробнее?", "Ответ")
+    assert (second['interview_consultations'], second['question_consultations']) == (2, 2)
+    db.save_response(interview.id, second_id, "Выбран продукт B", selected_option='B')
+    db.save_response(interview.id, second_id, "Выбран продукт A", selected_option='A')
+
+    completed = db.complete_interview(interview.id)
+    assert completed.status == 'completed'
+    assert (completed.answered_count, completed.choice_a_count, completed.choice_b_count,
+            completed.consultations_count) == (2, 1, 1, 2)
+    assert db.get_interview_statistics(interview.id)['completion_rate'] == 1
+
+
+def test_write_behind_group_commit(tmp_path):
+    db = DatabaseManager(f"sqlite:///{tmp_path / 'write_behind.db'}", write_behind=True)
+    db.create_tables()
+    question_ids = [add_choice_question(db, f"Вопрос {i}") for i in range(3)]
+    interview = db.start_interview("42", "tester")
+
+    # Без ожидания фиксации: запись подтверждается позже, но чтение видит свои записи
+    futures = [
+        db.save_response(interview.id, question_id, "Выбран продукт A", selected_option='A', durable=False)
+        for question_id in question_ids[:2]
+    ]
+    assert db.get_question_progress(interview.id)[1:] == (2, 3)
+    assert all(future.result() for future in futures)
+
+    # С подтверждением: дубликат отсекается уникальным индексом
+    assert db.save_response(interview.id, question_ids[0], "Выбран продукт B", selected_option='B') is None
+    assert db.save_consultation(interview.id, question_ids[2], "Что выгоднее?", "Ответ")
+
+    stats = db.get_interview_statistics(interview.id)
+    assert (stats['responses_count'], stats['choice_a_count'], stats['consultations_count']) == (2, 2, 1)
+    assert db.write_behind.metrics()['writes_committed'] == 3
+    db.dispose()
+
+
+def test_write_behind_submit_racing_close_is_committed():
+    session = SimpleNamespace(commit=lambda: None, rollback=lambda: None, close=lambda: None)
+    queue = WriteBehindQueue(lambda: session)
+    put = queue._queue.put
+    entered = threading.Event()
+
+    def slow_put(item, *args, **kwargs):
+        # submit уже прошел проверку остановки, но запись еще не в очереди
+        if item is not None:
+            entered.set()
+            time.sleep(0.2)
+        put(item, *args, **kwargs)
+
+    queue._queue.put = slow_put
+    futures = []
+    submitter = threading.Thread(target=lambda: futures.append(queue.submit(1, lambda s: "ok")))
+    submitter.start()
+    entered.wait(5)
+    queue.close()
+    submitter.join(5)
+
+    assert futures[0].result(timeout=5) == "ok"
+    assert queue.flush(timeout=1)
+    with pytest.raises(RuntimeError):
+        queue.submit(1, lambda s: "ok")
+
+
+def test_bulk_import_upserts_by_external_key(db):
+    rows = [
+        {'external_key': 'deposit-vs-ofz', 'text': "Вопрос", 'market_context': "Ставка ЦБ: 16%",
+         'option_a': "Депозит", 'option_b': "ОФЗ"},
+        {'external_key': 'why', 'question_type': 'text', 'text': "Почему?"},
+    ]
+    assert db.bulk_import_questions(rows, batch_size=1) == {'inserted': 2, 'updated': 0, 'skipped': 0}
+    assert db.get_active_questions().total == 2
+
+    rows[0]['text'] = "Обновленный вопрос"
+    rows.append({'external_key': 'broken', 'text': "Без вариантов", 'question_type': 'choice'})
+    assert db.bulk_import_questions(rows, skip_invalid=True) == {'inserted': 0, 'updated': 2, 'skipped': 1}
+    assert [q.text for q in db.get_active_questions().questions] == ["Обновленный вопрос", "Почему?"]
+
+    with pytest.raises(ValueError):
+        db.bulk_import_questions(rows)
+
+
+def test_bulk_import_keeps_deactivation_and_invalidates_consultations(db):
+    rows = [{'external_key': 'why', 'question_type': 'text', 'text': "Почему?"}]
+    db.bulk_import_questions(rows)
+    question_id = db.get_all_questions(active_only=False)[0].id
+    db.deactivate_question(question_id)
+
+    context = {'question_id': question_id}
+    db.consultation_cache.set(context, "Зачем?", "Старый ответ")
+    rows[0]['text'] = "Почему именно так?"
+    assert db.bulk_import_questions(rows)['updated'] == 1
+    assert db.get_active_questions().total == 0
+    assert db.consultation_cache.get(context, "Зачем?") is None
+
+    rows[0]['is_active'] = 'true'
+    db.bulk_import_questions(rows)
+    assert db.get_active_questions().total == 1
+
+
+def test_cleanup_old_interviews_in_chunks_with_archive(db, tmp_path):
+    question_id = add_choice_question(db)
+    old_ids = []
+    for user_id in range(5):
+        interview = db.start_interview(str(user_id), "tester")
+        db.save_response(interview.id, question_id, "Выбран продукт A", selected_option='A')
+        db.save_consultation(interview.id, question_id, "Что выгоднее?", "Ответ")
+        db.complete_interview(interview.id, datetime.utcnow() - timedelta(days=40))
+        old_ids.append(interview.id)
+    recent = db.start_interview("recent", "tester")
+    db.save_response(recent.id, question_id, "Выбран продукт B", selected_option='B')
+    db.complete_interview(recent.id)
+
+    progress = []
+    archive_dir = tmp_path / 'archive'
+
+    def on_progress(done, total):
+        # Удаленные пачки уже целиком в архиве, даже если процесс упадет до конца очистки
+        with gzip.open(next(archive_dir.glob('interviews_*')), 'rt', encoding='utf-8') as file:
+            progress.append((done, total, sum(1 for _ in file)))
+
+    deleted = db.cleanup_old_interviews(days_old=30, batch_size=2, archive_dir=str(archive_dir),
+                                        progress_callback=on_progress)
+
+    assert deleted == 5
+    assert progress == [(2, 5, 2), (4, 5, 4), (5, 5, 5)]
+    assert all(db.get_interview_statistics(interview_id) is None for interview_id in old_ids)
+    assert db.get_interview_progress(recent.id)[0] == 1
+
+    archived = {}
+    for path in archive_dir.iterdir():
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            archived[path.name.rsplit('_', 2)[0]] = [json.loads(line) for line in file]
+    assert sorted(row['id'] for row in archived['interviews']) == old_ids
+    assert len(archived['responses']) == 5
+    assert len(archived['ai_consultations']) == 5
+
+
+def test_partitioning_helpers_and_sqlite_fallback(db):
+    assert add_months(datetime(2024, 11, 1).date(), 3) == datetime(2025, 2, 1).date()
+    assert add_months(datetime(2024, 1, 1).date(), -1) == datetime(2023, 12, 1).date()
+    assert partition_name('responses', datetime(2024, 3, 1)) == 'responses_p202403'
+
+    # На SQLite таблицы остаются обычными
+    assert db.partitioning is False
+    assert db.setup_partitioning() == []
+    assert db.drop_old_partitions(12) == []
+
+
+def test_read_replica_routing_and_staleness(db, tmp_path):
+    primary_path = tmp_path / 'test.db'
+    replica_path = tmp_path / 'replica.db'
+    assert db.read_engine() is db.engine
+
+    db.start_interview("1", "first")
+    with sqlite3.connect(primary_path) as source, sqlite3.connect(replica_path) as target:
+        source.backup(target)
+    db.start_interview("2", "second")
+
+    routed = DatabaseManager(f"sqlite:///{primary_path}", replica_urls=f"sqlite:///{replica_path}",
+                             max_replica_lag=60)
+    try:
+        # Реплика отстает на доли секунды: отчеты читают с нее
+        with routed.read_session_scope() as session:
+            assert session.execute(text("SELECT COUNT(*) FROM interviews")).scalar() == 1
+
+        with routed.session_scope() as session:
+            session.execute(text("UPDATE interviews SET started_at = :later WHERE user_id = '2'"),
+                            {'later': datetime.utcnow() + timedelta(hours=1)})
+        routed.read_replicas.check_interval = 0
+
+        # Отставание больше допустимого: чтение возвращается на основную БД
+        assert routed.read_engine() is routed.engine
+        assert routed.get_read_session().execute(text("SELECT COUNT(*) FROM interviews")).scalar() == 2
+    finally:
+        routed.dispose()
+
+
+def test_sqlite_profile_pragmas(db, tmp_path):
+    with db.engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == 'wal'
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+    plain = DatabaseManager(f"sqlite:///{tmp_path / 'plain.db'}", sqlite_profile=False)
+    with plain.engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == 'delete'
+    plain.dispose()
+
+
+def test_random_question_sampling_from_catalog(db):
+    choice_ids = {add_choice_question(db, f"Выбор {number}") for number in range(5)}
+    text_id = db.add_text_question("Текстовый", category="general")
+
+    assert db.get_random_question(category="general").id == text_id
+    assert db.get_random_question(category="missing") is None
+    assert all(db.get_random_question(category="financial_choice").id in choice_ids for _ in range(20))
+
+    answered = choice_ids - {max(choice_ids)}
+    assert all(db.get_random_question("financial_choice", exclude_ids=answered).id == max(choice_ids)
+               for _ in range(20))
+    assert db.get_random_question("financial_choice", exclude_ids=choice_ids) is None
+
+    db.deactivate_question(text_id)
+    assert db.get_random_question(category="general") is None
@@ -0,0 +1,80 @@
+# tests/test_dispatcher.py
+import threading
+import time
+
+from telebot import types
+
+from modules.dispatcher import LaneTeleBot, UserLaneDispatcher, update_user_key
+
+_update_ids = iter(range(1, 10 ** 6))
+
+
+def callback_update(user_id, data):
+    return types.Update.de_json({
+        'update_id': next(_update_ids),
+        'callback_query': {
+            'id': str(next(_update_ids)),
+            'chat_instance': '1',
+            'data': data,
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Тест'},
+            'message': {
+                'message_id': 1,
+                'date': 1700000000,
+                'chat': {'id': user_id, 'type': 'private'},
+                'text': 'Вопрос',
+            },
+        },
+    })
+
+
+def test_updates_of_one_user_run_in_order_and_users_in_parallel():
+    bot = LaneTeleBot("123456:TEST", lanes=4)
+    handled = []
+    running = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith('choose_'))
+    def handle_choice(call):
+        with lock:
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+        time.sleep(0.02)
+        with lock:
+            running['now'] -= 1
+            handled.append((call.from_user.id, call.data))
+
+    # Двойное нажатие пользователя 1 и одновременные нажатия пользователей 2 и 3
+    updates = [callback_update(1, 'choose_A_5'), callback_update(1, 'choose_B_5'),
+               callback_update(2, 'choose_A_5'), callback_update(3, 'choose_B_5')]
+    bot.process_new_updates(updates)
+    bot.dispatcher.join()
+
+    assert [data for user_id, data in handled if user_id == 1] == ['choose_A_5', 'choose_B_5']
+    assert len(handled) == 4
+    assert running['max'] > 1
+
+    metrics = bot.dispatcher.metrics()
+    assert metrics['processed'] == 4 and metrics['queued'] == 0
+    assert len(metrics['lanes']) == 4
+    bot.stop_bot()
+
+
+def test_full_lane_rejects_without_blocking():
+    release = threading.Event()
+    dispatcher = UserLaneDispatcher(lambda updates: release.wait(5), lanes=1, max_queue=1)
+
+    assert dispatcher.submit(callback_update(1, 'a'), block=False)
+    time.sleep(0.05)  # первое обновление уже в обработке
+    assert dispatcher.submit(callback_update(2, 'b'), block=False)
+    assert not dispatcher.submit(callback_update(3, 'c'), block=False)
+    assert dispatcher.metrics()['lanes'][0]['peak_depth'] == 1
+
+    release.set()
+    dispatcher.stop()
+    assert dispatcher.metrics()['processed'] == 2
+
+
+def test_update_user_key():
+    assert update_user_key(callback_update(77, 'x')) == 77
+    update = types.Update.de_json({'update_id': 5})
+    assert update_user_key(update) == 5
@@ -0,0 +1,57 @@
+# tests/test_gigachat_handler.py
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from modules.gigachat_handler import GigaChatHandler
+
+
+class FakeGiga:
+    """Клиент, который получает токен один раз и дальше берет его из кэша"""
+
+    def __init__(self):
+        self.token = None
+        self.auth_requests = 0
+
+    def get_token(self):
+        if self.token is None:
+            self.auth_requests += 1
+            self.token = "access-token"
+
+    def chat(self, prompt):
+        message = SimpleNamespace(content="Депозит надежнее")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def shared_handler(monkeypatch):
+    monkeypatch.setenv('GIGACHAT_CREDENTIALS', 'test')
+    monkeypatch.setattr(GigaChatHandler, '_shared', None)
+    yield
+    GigaChatHandler._shared = None
+
+
+def test_shared_client_is_created_once(shared_handler):
+    handlers = []
+    threads = [threading.Thread(target=lambda: handlers.append(GigaChatHandler.shared())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(handler) for handler in handlers}) == 1
+
+
+def test_token_is_reused_and_latency_split(shared_handler):
+    handler = GigaChatHandler.shared()
+    handler.giga = FakeGiga()
+
+    for _ in range(3):
+        assert handler.get_financial_advice("Что выбрать?", {}) == "Депозит надежнее"
+
+    assert handler.giga.auth_requests == 1
+    summary = handler.latency.summary()
+    assert summary['consultations'] == 3
+    assert summary['token_refreshes'] == 1
+    assert summary['generation_time'] >= 0 and 0 <= summary['auth_share'] <= 1
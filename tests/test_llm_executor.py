@@ -0,0 +1,71 @@
+# tests/test_llm_executor.py
+import threading
+import time
+
+import pytest
+
+from modules.llm_executor import LLMExecutor
+
+
+def test_runs_at_most_max_concurrency_and_reports_queue_positions():
+    executor = LLMExecutor(max_concurrency=2, max_queue=5)
+    release = threading.Event()
+    running = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+
+    def generate(answer):
+        with lock:
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+        release.wait(5)
+        with lock:
+            running['now'] -= 1
+        return answer
+
+    tickets = [executor.submit(generate, i) for i in range(5)]
+    assert [ticket.position for ticket in tickets] == [0, 0, 1, 2, 3]
+
+    for _ in range(100):
+        if executor.metrics()['running'] == 2:
+            break
+        time.sleep(0.01)
+    assert executor.metrics()['waiting'] == 3
+    release.set()
+    assert [ticket.future.result(5) for ticket in tickets] == [0, 1, 2, 3, 4]
+    assert running['max'] == 2
+    executor.shutdown()
+
+    metrics = executor.metrics()
+    assert metrics['completed'] == 5
+    assert metrics['running'] == 0 and metrics['waiting'] == 0
+
+
+def test_full_queue_rejects_immediately():
+    executor = LLMExecutor(max_concurrency=1, max_queue=1)
+    release = threading.Event()
+
+    first = executor.submit(release.wait, 5)
+    second = executor.submit(release.wait, 5)
+    assert second.position == 1
+    assert executor.submit(release.wait, 5) is None
+    assert executor.metrics()['rejected'] == 1
+
+    release.set()
+    assert first.future.result(5) and second.future.result(5)
+    executor.shutdown()
+
+
+def test_errors_are_returned_through_the_future():
+    executor = LLMExecutor(max_concurrency=1)
+
+    def fail():
+        raise ValueError("GigaChat недоступен")
+
+    ticket = executor.submit(fail)
+    with pytest.raises(ValueError):
+        ticket.future.result(5)
+    assert executor.submit(lambda: "ok").future.result(5) == "ok"
+
+    executor.shutdown()
+    with pytest.raises(RuntimeError):
+        executor.submit(lambda: None)
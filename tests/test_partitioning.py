@@ -0,0 +1,74 @@
+# tests/test_partitioning.py
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from modules.database import DatabaseManager
+from modules.partitioning import (add_months, drop_old_partitions, ensure_partitions, is_partitioned,
+                                  list_partitions, month_start, partition_name)
+
+POSTGRES_URL = os.getenv('TEST_POSTGRES_URL')
+
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL не задан")
+
+
+@pytest.fixture
+def db():
+    # Отдельная схема на тест: секции и таблицы не пересекаются с данными базы
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    admin = create_engine(POSTGRES_URL)
+    with admin.begin() as connection:
+        connection.execute(text(f"CREATE SCHEMA {schema}"))
+
+    separator = '&' if '?' in POSTGRES_URL else '?'
+    manager = DatabaseManager(f"{POSTGRES_URL}{separator}options=-csearch_path%3D{schema}")
+    manager.create_tables()
+    yield manager
+    manager.dispose()
+    with admin.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+    admin.dispose()
+
+
+def test_convert_keeps_rows_and_guards_duplicates(db):
+    question_id = db.add_text_question("Почему?")
+    interview = db.start_interview("42", "tester")
+    assert db.save_response(interview.id, question_id, "Ответ")
+    db.save_consultation(interview.id, question_id, "Что выгоднее?", "Ответ")
+
+    db.setup_partitioning(months_ahead=1)
+    db.partitioning = True
+
+    current = month_start(datetime.utcnow())
+    with db.engine.connect() as connection:
+        for table_name in ('responses', 'ai_consultations'):
+            assert is_partitioned(connection, table_name)
+            partitions = list_partitions(connection, table_name)
+            assert partition_name(table_name, current) in partitions
+            assert partition_name(table_name, add_months(current, 1)) in partitions
+            assert f"{table_name}_default" in partitions
+        assert connection.execute(text("SELECT COUNT(*) FROM responses")).scalar() == 1
+
+    # Повторный ответ отклоняется явной проверкой вместо уникального индекса
+    assert db.save_response(interview.id, question_id, "Повтор") is None
+    assert db.get_interview_statistics(interview.id)['responses_count'] == 1
+
+    # Повторный вызов не пересоздает таблицы
+    assert db.setup_partitioning(months_ahead=1) == []
+
+
+def test_drop_old_partitions(db):
+    db.setup_partitioning(months_ahead=0)
+    old_month = add_months(month_start(datetime.utcnow()), -24)
+
+    with db.engine.begin() as connection:
+        assert ensure_partitions(connection, 'responses', old_month, old_month) == [
+            partition_name('responses', old_month)
+        ]
+        assert drop_old_partitions(connection, 12, detach_only=True) == [partition_name('responses', old_month)]
+        assert partition_name('responses', old_month) not in list_partitions(connection, 'responses')
+        # Отсоединенная секция остается отдельной таблицей
+        assert connection.execute(text(f"SELECT COUNT(*) FROM {partition_name('responses', old_month)}")).scalar() == 0
@@ -0,0 +1,66 @@
+# tests/test_send_scheduler.py
+import threading
+import time
+
+from telebot.apihelper import ApiTelegramException
+
+from modules.send_scheduler import BULK, INTERACTIVE, SendScheduler
+
+
+def too_many_requests(retry_after):
+    return ApiTelegramException('sendMessage', None, {
+        'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+        'parameters': {'retry_after': retry_after}
+    })
+
+
+def test_chat_rate_limit_keeps_order():
+    scheduler = SendScheduler(global_rate=100, chat_rate=20, chat_burst=1)
+    sent = []
+
+    started = time.monotonic()
+    futures = [scheduler.submit(1, sent.append, i) for i in range(4)]
+    for future in futures:
+        future.result(timeout=5)
+
+    assert sent == [0, 1, 2, 3]
+    assert time.monotonic() - started >= 0.14  # 3 отправки сверх запаса по 1/20 сек
+    scheduler.close()
+
+
+def test_retry_after_429():
+    scheduler = SendScheduler(global_rate=100, chat_rate=100)
+    attempts = []
+
+    def send(text):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise too_many_requests(0.1)
+        return text
+
+    assert scheduler.submit(1, send, "ответ").result(timeout=5) == "ответ"
+    assert attempts[1] - attempts[0] >= 0.1
+
+    metrics = scheduler.metrics()
+    assert metrics['rate_limited'] == 1 and metrics['sent'] == 1 and metrics['failed'] == 0
+    assert metrics['pending'] == {'interactive': 0, 'bulk': 0}
+    scheduler.close()
+
+
+def test_interactive_replies_go_before_bulk():
+    scheduler = SendScheduler(global_rate=100, chat_rate=100, workers=1)
+    gate = threading.Event()
+    sent = []
+
+    scheduler.submit(0, gate.wait, 5)
+    time.sleep(0.05)  # единственный поток занят первым запросом
+    bulk = [scheduler.submit(chat_id, sent.append, f"рассылка {chat_id}", priority=BULK) for chat_id in (1, 2)]
+    reply = scheduler.submit(3, sent.append, "ответ", priority=INTERACTIVE)
+    assert scheduler.metrics()['pending'] == {'interactive': 2, 'bulk': 2}
+
+    gate.set()
+    assert scheduler.flush(timeout=5)
+    assert sent == ["ответ", "рассылка 1", "рассылка 2"]
+    assert reply.done() and all(future.done() for future in bulk)
+    assert scheduler.metrics()['latency_max'] > 0
+    scheduler.close()
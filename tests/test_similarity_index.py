@@ -0,0 +1,69 @@
+# tests/test_similarity_index.py
+import pytest
+
+from modules import bot_messages as texts
+from modules.consultation_cache import ConsultationCache
+from modules.database import DatabaseManager
+from modules.similarity_index import QueryIndex, SimilarConsultations, answer_from_history
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(f"sqlite:///{tmp_path / 'test.db'}")
+    manager.create_tables()
+    yield manager
+    manager.dispose()
+
+
+def test_char_ngram_tfidf_scores():
+    index = QueryIndex(["Какие риски у ОФЗ?", "Что выгоднее при высокой инфляции?", "Как работает страховка АСВ?"])
+
+    score, document = index.best("какие риски у офз")
+    assert document == 0 and score == pytest.approx(1.0, abs=1e-4)
+
+    paraphrase = index.scores("риски ОФЗ")
+    assert paraphrase.argmax() == 0 and paraphrase[0] > 2 * max(paraphrase[1:])
+    assert index.best("")[0] == 0.0
+    assert QueryIndex([]).best("риски") == (0.0, None)
+
+
+def test_similar_consultations_from_history(db):
+    question_id = db.add_text_question("Вопрос")
+    context = texts.question_context(db.get_question_by_id(question_id))
+    interview = db.start_interview("42", "tester")
+    history = [
+        ("Какие риски у ОФЗ?", texts.consultation_text("Процентный риск")),
+        ("Что выгоднее?", texts.consultation_error_text("Что выгоднее?")),
+        ("Что лучше?", texts.consultation_text("💡 **Консультация временно недоступна**")),
+    ]
+    for user_query, ai_response in history:
+        db.save_consultation(interview_id=interview.id, question_id=question_id, user_query=user_query,
+                             ai_response=ai_response, consultation_type="gigachat_advice")
+    assert answer_from_history(history[1][1]) is None
+
+    similar = SimilarConsultations(threshold=0.6, session_factory=db.session_factory)
+    assert similar.find(context, "какие риски у ОФЗ сейчас") == "Процентный риск"
+    assert similar.find(context, "Что выгоднее?") is None
+    assert similar.find(dict(context, question_id=question_id + 1), "Какие риски у ОФЗ?") is None
+
+    cache = ConsultationCache(similar=similar)
+    cache.set(context, "Что выгоднее при инфляции?", "ОФЗ с плавающим купоном")
+    assert cache.get(context, "что выгоднее при высокой инфляции") == "ОФЗ с плавающим купоном"
+    assert cache.metrics()['similar_hits'] == 1
+
+    cache.invalidate_question(question_id)
+    similar.session_factory = None
+    assert similar.find(context, "Какие риски у ОФЗ?") is None
+
+
+def test_edited_question_does_not_reuse_old_answers(db):
+    question_id = db.add_text_question("Вопрос про ОФЗ")
+    old_context = texts.question_context(db.get_question_by_id(question_id))
+    interview = db.start_interview("42", "tester")
+    db.save_consultation(interview.id, question_id, "Какие риски у ОФЗ?", texts.consultation_text("Процентный риск"))
+
+    # Правка текста вопроса (как при повторном импорте) меняет его версию
+    edited_context = dict(old_context, question_text="Вопрос про корпоративные облигации")
+    similar = SimilarConsultations(threshold=0.6, session_factory=db.session_factory)
+    assert similar.find(edited_context, "какие риски у ОФЗ") is None
+    assert similar.find(old_context, "какие риски у ОФЗ") == "Процентный риск"
@@ -0,0 +1,49 @@
+# tests/test_sql_instrumentation.py
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from modules.database import DatabaseManager
+from modules.sql_instrumentation import QueryProfilerMiddleware, update_name
+
+
+def test_profiler_counts_queries_per_method_and_update(tmp_path, caplog):
+    db = DatabaseManager(f"sqlite:///{tmp_path / 'profiled.db'}", instrumentation=True)
+    db.create_tables()
+    question_id = db.add_text_question("Вопрос")
+
+    middleware = QueryProfilerMiddleware(db.profiler)
+    message = SimpleNamespace(text="/status")
+    data = {}
+    middleware.pre_process_message(message, data)
+    interview = db.start_interview("42", "tester")
+    db.save_response(interview.id, question_id, "Ответ")
+    middleware.post_process_message(message, data, None)
+
+    with db.profiler.unit('update', 'loop'):
+        for _ in range(3):
+            with db.session_scope() as session:
+                session.execute(text("SELECT COUNT(*) FROM responses WHERE interview_id = :id"), {'id': interview.id})
+
+    summary = db.profiler.summary()
+    update = summary['units'][('update', 'message:/status')]
+    start = summary['units'][('method', 'DatabaseManager.start_interview')]
+    save = summary['units'][('method', 'DatabaseManager.save_response')]
+    assert update['calls'] == 1
+    assert update['queries'] == start['queries'] + save['queries'] > 0
+    assert summary['n_plus_one'] == {'loop': 1}
+    assert "Возможный N+1 в loop" in caplog.text
+
+    with caplog.at_level('INFO'):
+        db.profiler.log_summary()
+    assert "SQL-статистика" in caplog.text
+    assert db.profiler.summary()['units'] == {}
+    db.dispose()
+
+
+def test_update_names():
+    assert update_name('callback_query', SimpleNamespace(data="choose_A_12")) == 'callback:choose'
+    assert update_name('callback_query', SimpleNamespace(data="consult_7")) == 'callback:consult'
+    assert update_name('callback_query', SimpleNamespace(data="get_question")) == 'callback:get_question'
+    assert update_name('message', SimpleNamespace(text="/start now")) == 'message:/start'
+    assert update_name('message', SimpleNamespace(text="мой ответ")) == 'message:text'
@@ -0,0 +1,93 @@
+# tests/test_state_store.py
+import asyncio
+import threading
+import time
+
+from sqlalchemy import text
+
+from modules.async_database import AsyncDatabaseManager
+from modules.database import BotState, DatabaseManager
+from modules.state_store import AI_CONSULTATION, TEXT_ANSWER, MemoryStateStore, SQLStateStore, create_state_store
+
+
+def test_memory_store_ttl_and_lru_eviction():
+    store = MemoryStateStore(ttl=60, max_users=2)
+    store.set("1", TEXT_ANSWER, 10)
+    store.set("2", TEXT_ANSWER, 20)
+    assert store.get("1", TEXT_ANSWER) == 10  # "1" становится самым свежим
+    store.set("3", AI_CONSULTATION, 30)
+
+    assert store.get("2", TEXT_ANSWER) is None
+    assert store.pop("1", TEXT_ANSWER) == 10
+    assert store.get("1", TEXT_ANSWER) is None
+
+    store.set("3", TEXT_ANSWER, 31, ttl=0.01)
+    time.sleep(0.02)
+    assert store.purge_expired() == 1
+    assert store.get("3", AI_CONSULTATION) == 30
+    store.clear("3")
+    assert store.get("3", AI_CONSULTATION) is None
+
+
+def test_memory_store_pop_hands_state_to_one_caller():
+    store = MemoryStateStore()
+    for attempt in range(200):
+        store.set("1", TEXT_ANSWER, attempt)
+        barrier = threading.Barrier(4)
+        popped = []
+
+        def pop():
+            barrier.wait()
+            popped.append(store.pop("1", TEXT_ANSWER))
+
+        threads = [threading.Thread(target=pop) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert [value for value in popped if value is not None] == [attempt]
+
+
+def test_sql_store_is_shared_between_processes(tmp_path):
+    url = f"sqlite:///{tmp_path / 'states.db'}"
+    first, second = DatabaseManager(url), DatabaseManager(url)
+    first.create_tables()
+    first.migrate()
+
+    store = create_state_store(first, backend='sql')
+    other = create_state_store(second, backend='sql')
+    assert isinstance(store, SQLStateStore)
+
+    store.set("42", TEXT_ANSWER, 7)
+    store.set("42", TEXT_ANSWER, 8)
+    store.set("42", AI_CONSULTATION, 9)
+    assert other.get("42", TEXT_ANSWER) == 8
+
+    # Состояние забирает только один процесс
+    assert other.pop("42", TEXT_ANSWER) == 8
+    assert store.pop("42", TEXT_ANSWER) is None
+
+    store.set("43", TEXT_ANSWER, 1, ttl=0.01)
+    time.sleep(0.02)
+    assert other.get("43", TEXT_ANSWER) is None
+    assert store.purge_expired() == 1
+
+    other.clear("42")
+    with first.session_scope() as session:
+        assert session.query(BotState).count() == 0
+
+    first.dispose()
+    second.dispose()
+
+
+def test_sql_store_of_async_manager_uses_sqlite_profile(tmp_path):
+    db = AsyncDatabaseManager(f"sqlite:///{tmp_path / 'states.db'}")
+    asyncio.run(db.create_tables())
+
+    store = create_state_store(db, backend='sql')
+    # Тот же профиль, что у DatabaseManager: запись ждет блокировку вместо "database is locked"
+    with store.session_factory() as session:
+        assert session.execute(text("PRAGMA journal_mode")).scalar() == 'wal'
+        assert session.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    assert create_state_store(db, backend='sql').session_factory is store.session_factory
+    asyncio.run(db.dispose())
@@ -0,0 +1,116 @@
+# tests/test_streaming_reply.py
+from types import SimpleNamespace
+
+import pytest
+from telebot.apihelper import ApiTelegramException
+
+from modules.send_scheduler import SendScheduler
+from modules.streaming_reply import StreamingReply
+
+
+class FakeBot:
+    """Запоминает отправленные сообщения и правки; Markdown с незакрытой ** не принимает"""
+
+    def __init__(self):
+        self.messages = {}
+        self.modes = {}
+        self.edits = []
+
+    def send_message(self, chat_id, text, parse_mode=None):
+        message_id = len(self.messages) + 1
+        self.messages[message_id] = text
+        self.modes[message_id] = parse_mode
+        return SimpleNamespace(chat=SimpleNamespace(id=chat_id), message_id=message_id)
+
+    def edit_message_text(self, text, chat_id, message_id, parse_mode=None):
+        if parse_mode and text.count('**') % 2:
+            raise ApiTelegramException('editMessageText', None, {
+                'ok': False, 'error_code': 400, 'description': "Bad Request: can't parse entities"
+            })
+        if (self.messages[message_id], self.modes[message_id]) == (text, parse_mode):
+            raise ApiTelegramException('editMessageText', None, {
+                'ok': False, 'error_code': 400, 'description': 'Bad Request: message is not modified'
+            })
+        self.messages[message_id] = text
+        self.modes[message_id] = parse_mode
+        self.edits.append((message_id, parse_mode))
+
+
+@pytest.fixture
+def sender():
+    scheduler = SendScheduler(global_rate=1000, chat_rate=1000, chat_burst=1000)
+    yield scheduler
+    scheduler.close()
+
+
+def test_stream_edits_placeholder_progressively(sender):
+    bot = FakeBot()
+    placeholder = sender.submit(1, bot.send_message, 1, "🤔 Обращаюсь к GigaChat...")
+    reply = StreamingReply(sender, bot, 1, placeholder, edit_interval=0)
+
+    for piece in ["💡 **Консультация:**\n\n", "Депозит ", "надежнее", ", ОФЗ доходнее."]:
+        reply.append(piece)
+        sender.flush(timeout=5)
+    assert reply.first_content_at is not None
+
+    text = reply.finish(parse_mode='Markdown')
+    sender.flush(timeout=5)
+
+    assert text == "💡 **Консультация:**\n\nДепозит надежнее, ОФЗ доходнее."
+    assert bot.messages == {1: text}
+    assert len(bot.edits) >= 3 and bot.edits[-1] == (1, 'Markdown')
+
+
+def test_stream_splits_long_answer_into_messages(sender):
+    bot = FakeBot()
+    placeholder = sender.submit(1, bot.send_message, 1, "...")
+    reply = StreamingReply(sender, bot, 1, placeholder, edit_interval=0)
+
+    paragraph = "а" * 3000
+    for _ in range(3):
+        reply.append(paragraph + "\n\n")
+        sender.flush(timeout=5)
+    reply.append("**незакрытая разметка")
+    reply.finish(parse_mode='Markdown')
+    sender.flush(timeout=5)
+
+    assert len(bot.messages) == 3
+    assert bot.messages[1] == paragraph
+    assert bot.messages[2].startswith("**Продолжение:**")
+    assert bot.messages[3].endswith("**незакрытая разметка")
+
+
+def test_edits_are_throttled(sender):
+    bot = FakeBot()
+    placeholder = sender.submit(1, bot.send_message, 1, "...")
+    reply = StreamingReply(sender, bot, 1, placeholder, edit_interval=60)
+
+    for i in range(50):
+        reply.append(f"{i} ")
+    reply.finish()
+    sender.flush(timeout=5)
+
+    # Первая часть показана сразу, остальное - итоговой правкой
+    assert len(bot.edits) == 2
+
+
+def test_gigachat_stream_pieces_and_fallback(monkeypatch):
+    from modules.gigachat_handler import GigaChatHandler
+
+    monkeypatch.setenv('GIGACHAT_CREDENTIALS', 'test')
+    handler = GigaChatHandler()
+
+    def chunk(content):
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+    handler.giga = SimpleNamespace(token="t", get_token=lambda: None,
+                                   stream=lambda prompt: iter([chunk("Депозит"), chunk(""), chunk(" надежнее")]))
+    assert list(handler.stream_financial_advice("Что выбрать?", {})) == ["Депозит", " надежнее"]
+
+    def broken(prompt):
+        raise ConnectionError("нет сети")
+        yield
+
+    handler.giga = SimpleNamespace(token="t", get_token=lambda: None, stream=broken)
+    pieces = list(handler.stream_financial_advice("Что выбрать?", {}))
+    assert len(pieces) == 1 and "Консультация временно недоступна" in pieces[0]
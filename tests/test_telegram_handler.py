@@ -0,0 +1,147 @@
+# tests/test_telegram_handler.py
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+import telebot
+from telebot import types
+
+from modules import bot_messages as texts
+from modules.database import AIConsultation
+from modules.gigachat_handler import GigaChatHandler
+from modules.llm_executor import LLMExecutor
+from modules.similarity_index import answer_from_history
+from modules.state_store import AI_CONSULTATION
+from modules.telegram_handler import TelegramHandler
+
+
+class RecordingBot:
+    """Вместо Telegram API запоминает отправленные сообщения и правки"""
+
+    def __init__(self):
+        self.messages = {}
+        self.sent = []
+        self.edits = []
+
+    def send_message(self, chat_id, text, parse_mode=None, reply_markup=None):
+        message_id = len(self.messages) + 1
+        self.messages[message_id] = text
+        self.sent.append(text)
+        return SimpleNamespace(chat=SimpleNamespace(id=chat_id), message_id=message_id)
+
+    def edit_message_text(self, text, chat_id, message_id, parse_mode=None):
+        self.messages[message_id] = text
+        self.edits.append(text)
+
+    def delete_message(self, chat_id, message_id):
+        self.messages.pop(message_id, None)
+
+
+def chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    monkeypatch.setenv('TELEGRAM_BOT_TOKEN', '123456:TEST')
+    monkeypatch.setenv('GIGACHAT_CREDENTIALS', 'test')
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'bot.db'}")
+    monkeypatch.setenv('SEND_CHAT_RATE', '1000')
+    monkeypatch.setenv('SEND_CHAT_BURST', '1000')
+    monkeypatch.setenv('SEND_GLOBAL_RATE', '1000')
+    monkeypatch.setattr(GigaChatHandler, '_shared', None)
+
+    handler = TelegramHandler()
+    handler.db.create_tables()
+    recorder = RecordingBot()
+    for name in ('send_message', 'edit_message_text', 'delete_message'):
+        monkeypatch.setattr(handler.bot, name, getattr(recorder, name))
+    handler.recorder = recorder
+    yield handler
+    handler.llm.shutdown()
+    handler.sender.close()
+    handler.db.dispose()
+    GigaChatHandler._shared = None
+
+
+def text_update(update_id, text, user_id=42):
+    return types.Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 1700000000,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Тест'},
+            'text': text,
+        },
+    })
+
+
+def process(handler, update):
+    # Обработчики вызываются сразу, без очередей LaneTeleBot
+    telebot.TeleBot.process_new_updates(handler.bot, [update])
+
+
+def start_consultation(handler):
+    question_id = handler.db.add_financial_question(
+        "Вопрос", "Ставка ЦБ: 16%", "Депозит", "ОФЗ", "Гарантия АСВ", "Доходность 13%"
+    )
+    interview = handler.db.start_interview("42", "tester")
+    return interview, question_id
+
+
+def test_interrupted_stream_is_marked_incomplete_and_not_reused(handler):
+    interview, question_id = start_consultation(handler)
+
+    def broken_stream(prompt):
+        yield chunk("Депозит")
+        yield chunk(" надежнее")
+        raise ConnectionError("соединение разорвано")
+
+    GigaChatHandler.shared().giga = SimpleNamespace(token="t", get_token=lambda: None, stream=broken_stream)
+    handler.run_consultation(42, "42", interview, question_id, "Что выбрать?")
+    handler.sender.flush(5)
+
+    recorder = handler.recorder
+    # Первая правка заглушки уже содержит текст ответа, а не только заголовок
+    assert recorder.edits[0] == texts.consultation_text("Депозит")
+    answer = recorder.messages[1]
+    assert answer.startswith(texts.consultation_text("Депозит надежнее"))
+    assert answer.endswith(texts.INCOMPLETE_ANSWER_TEXT)
+
+    with handler.db.session_scope() as session:
+        saved = session.query(AIConsultation.ai_response).scalar()
+    assert texts.INCOMPLETE_ANSWER_TEXT in saved and answer_from_history(saved) is None
+    assert handler.db.consultation_cache.metrics()['stores'] == 0
+
+
+def test_messages_while_consultation_is_queued_do_not_create_more(handler, monkeypatch):
+    interview, question_id = start_consultation(handler)
+    handler.llm.shutdown()
+    handler.llm = LLMExecutor(max_concurrency=1, max_queue=1)
+    release = threading.Event()
+    handler.llm.submit(release.wait, 5)  # все места GigaChat заняты
+    while handler.llm.metrics()['running'] == 0:
+        time.sleep(0.01)
+    consultations = []
+    monkeypatch.setattr(handler, 'run_consultation', lambda *args: consultations.append(args))
+
+    handler.states.set("42", AI_CONSULTATION, question_id)
+    process(handler, text_update(1, "Что выгоднее?"))
+    process(handler, text_update(2, "Ну что там?"))
+    handler.sender.flush(5)
+
+    assert handler.llm.metrics()['waiting'] == 1
+    assert handler.recorder.sent == [texts.queue_position_text(1), texts.UNKNOWN_MESSAGE_TEXT]
+
+    # Очередь заполнена: вопрос не принят, и ожидание вопроса возвращается
+    handler.states.set("42", AI_CONSULTATION, question_id)
+    process(handler, text_update(3, "Что выгоднее сейчас?"))
+    handler.sender.flush(5)
+    assert handler.recorder.sent[-1] == texts.LLM_BUSY_TEXT
+    assert handler.states.get("42", AI_CONSULTATION) == question_id
+
+    release.set()
+    handler.llm.shutdown()
+    assert [args[4] for args in consultations] == ["Что выгоднее?"]
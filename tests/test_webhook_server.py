@@ -0,0 +1,81 @@
+# tests/test_webhook_server.py
+import json
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+import telebot
+
+from modules.webhook_server import SECRET_HEADER, WebhookServer
+
+UPDATE = {
+    'update_id': 1001,
+    'message': {
+        'message_id': 7,
+        'date': 1700000000,
+        'chat': {'id': 42, 'type': 'private'},
+        'from': {'id': 42, 'is_bot': False, 'first_name': 'Тест'},
+        'text': '/start',
+    },
+}
+
+
+@pytest.fixture
+def webhook():
+    bot = telebot.TeleBot("123456:TEST", threaded=False)
+    handled = []
+    done = threading.Event()
+
+    @bot.message_handler(commands=['start'])
+    def start(message):
+        handled.append((message.chat.id, message.text))
+        done.set()
+
+    server = WebhookServer(bot, secret_token="s3cret", host='127.0.0.1', port=0, workers=2, max_pending=4)
+    server.serve_in_background()
+    yield server, handled, done
+    server.stop()
+
+
+def post(server, body, secret="s3cret", path='/telegram/webhook'):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{server.port}{path}",
+        data=body if isinstance(body, bytes) else json.dumps(body).encode('utf-8'),
+        headers={'Content-Type': 'application/json', SECRET_HEADER: secret}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def test_webhook_dispatches_update_to_handlers(webhook):
+    server, handled, done = webhook
+    assert post(server, UPDATE) == 200
+    assert done.wait(5)
+    assert handled == [(42, '/start')]
+
+
+def test_slow_client_does_not_block_other_updates(webhook):
+    server, handled, done = webhook
+    # Клиент открыл соединение и не присылает запрос
+    with socket.create_connection(('127.0.0.1', server.port)) as slow:
+        slow.sendall(b"POST /telegram/webhook HTTP/1.1\r\n")
+        assert post(server, UPDATE) == 200
+        assert done.wait(5)
+
+
+def test_webhook_rejects_bad_requests(webhook):
+    server, handled, _ = webhook
+    assert post(server, UPDATE, secret="wrong") == 403
+    assert post(server, UPDATE, path='/other') == 404
+    assert post(server, b"not json") == 400
+    assert handled == []
+
+
+def test_webhook_requires_secret():
+    with pytest.raises(ValueError):
+        WebhookServer(telebot.TeleBot("123456:TEST"), secret_token=None, port=0)
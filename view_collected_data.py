@@ -9,7 +9,7 @@ def view_all_data():
     print("=" * 50)
     
     db = DatabaseManager()
-    session = db.get_session()
+    session = db.get_read_session()
     moscow_tz = pytz.timezone('Europe/Moscow')
     
     def utc_to_moscow(utc_dt):